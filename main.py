@@ -1,12 +1,28 @@
+import argparse
 import datetime as dt
 from python.roi import ROI
 from python.log import log
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pancake Screener')
+    parser.add_argument('--backfill', action='store_true',
+                        help='Only rebuild the missing pool information files of the past days')
+    parser.add_argument('--sample', action='store_true',
+                        help='Only fetch the pools and add them to the intraday snapshots')
+    parser.add_argument('--migrate-archive', action='store_true',
+                        help='Only copy the stored pool information CSV files to the Parquet archive')
+    arguments = parser.parse_args()
     start_time = dt.datetime.now()
     log.info('Main Called')
     screener = ROI(log, debug=False)
-    screener.run()
+    if arguments.sample:
+        screener.sample()
+    elif arguments.migrate_archive:
+        screener.migrate_history()
+    elif arguments.backfill:
+        screener.backfill_history()
+    else:
+        screener.run()
     end_time = dt.datetime.now()
     elapsed = (end_time - start_time).total_seconds()
     log.info(f'Main Finished after {elapsed} seconds')
@@ -0,0 +1,307 @@
+import asyncio
+import configparser
+import itertools
+import time
+from logging import Logger
+import aiohttp
+import pandas as pd
+from web3 import Web3
+from web3.contract import ContractFunction
+from python.codec import ContractCodec, PreparedCall
+from python.metadata_cache import MetadataCache
+from python.multicall import Multicall, decode_function_result
+from python.pool_registry import PoolRegistry
+from python.pool_rows import PoolRowBuffer
+from python.price_graph import PriceGraph
+from python.rate_limiter import is_throttled_error, is_throttled_response
+from python.utils import PancakeSwapBlockchain, read_json
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+
+class AsyncPancakeSwapBlockchain(PancakeSwapBlockchain):
+    # Async variant of PancakeSwapBlockchain
+    # The per pool loops are run as asyncio tasks over one aiohttp session,
+    # a semaphore keeps the number of in flight requests under [async] concurrency.
+    # The public methods stay synchronous and return the same DataFrames, so ROI can use it as a drop-in
+
+    def __init__(self, logger: Logger, debug: bool, metadata_cache: MetadataCache = None,
+                 pool_registry: PoolRegistry = None):
+        super().__init__(logger, debug, metadata_cache, pool_registry)
+        self.__log = logger
+        self.__node_address = self.node_addresses[0]
+        self.__concurrency = int(config.get('async', 'concurrency'))
+        self.__w3 = Web3()  # Only used for encoding and decoding, requests are made with aiohttp
+        self.__pancake_masterChef = self.__w3.toChecksumAddress(config.get('settings', 'pancake_masterChef'))
+        # Calls made for every pool or token are encoded and decoded with precompiled codecs
+        self.__pair_codec = ContractCodec(self.__w3, self.pair_abi)
+        self.__token_codec = ContractCodec(self.__w3, self.token_abi)
+        self.__master_chef_codec = ContractCodec(self.__w3, read_json('ABI/master_chef_v2.json'))
+        self.__use_multicall = config.getboolean('multicall', 'enabled')
+        self.__multicall_batch_size = int(config.get('multicall', 'batch_size'))
+        self.__multicall = Multicall(self.__w3, logger, self.__w3.eth.contract(
+            abi=read_json('ABI/multicall.json'),
+            address=self.__w3.toChecksumAddress(config.get('multicall', 'address'))))
+        self.__request_counter = itertools.count()
+        self.__session = None
+        self.__semaphore = None
+        self.__rate_limiter = self._create_rate_limiter(self.__concurrency)  # Replaces the semaphore when enabled
+        self.__in_flight = {}
+
+    def _fetch_pool_information_using_indices(self, indices: list) -> pd.DataFrame:
+        # The multicall batches, or the per pool reads without multicall, are run as tasks and their rows written
+        # to the same partial file as PancakeSwapBlockchain, so a run after a crash only fetches the missing pools.
+        # The lens call needs a state override, it is read by PancakeSwapBlockchain with its fallback to multicall.
+        if config.getboolean('lens', 'enabled'):
+            return super()._fetch_pool_information_using_indices(indices)
+        pool_rows = self._create_pool_row_buffer()
+        requested_indices = indices
+        if pool_rows.load():
+            fetched_indices = pool_rows.get_indices()
+            indices = [index for index in indices if index not in fetched_indices]
+        if self.__use_multicall:
+            batches = [indices[start:start + self.__multicall_batch_size]
+                       for start in range(0, len(indices), self.__multicall_batch_size)]
+            asyncio.run(self.__run(self.__fetch_pool_information_using_multicall(batches, pool_rows)))
+        else:
+            asyncio.run(self.__run(self.__fetch_pool_information(indices, pool_rows)))
+        pool_rows.flush()
+        pool_information = pool_rows.to_dataframe()
+        pool_rows.remove()
+        return pool_information[pool_information['index'].isin(requested_indices)].reset_index(drop=True)
+
+    def _calculate_liquidity_balances(self, rows: list, price_graph: PriceGraph) -> list:
+        # The pools are calculated as tasks, PancakeSwapBlockchain reads the failed ones again and reports the rest
+        return asyncio.run(self.__run(self.__calculate_liquidity_balances(rows, price_graph)))
+
+    async def __run(self, awaitable):
+        # Opens the session and semaphore inside the running event loop
+        self.__semaphore = asyncio.Semaphore(self.__concurrency)
+        self.__in_flight = {}
+        async with aiohttp.ClientSession() as session:
+            self.__session = session
+            return await awaitable
+
+    async def __call(self, function: ContractFunction):
+        # function is a PreparedCall of a codec or a web3 ContractFunction
+        data = function.data if isinstance(function, PreparedCall) else function._encode_transaction_data()
+        transaction = {'to': function.address, 'data': data}
+        block_identifier = self.block_identifier if self.block_identifier == 'latest' else hex(self.block_identifier)
+        key = self.block_call_cache.get_key(transaction, block_identifier)
+        if key is None:
+            body = await self.__request(transaction, block_identifier)
+        else:
+            body = self.block_call_cache.get(key)
+            if body is None:
+                # Tasks reading the same contract data at the same block share one request
+                if key not in self.__in_flight:
+                    self.__in_flight[key] = asyncio.ensure_future(self.__request(transaction, block_identifier))
+                try:
+                    body = await self.__in_flight[key]
+                finally:
+                    self.__in_flight.pop(key, None)
+                self.block_call_cache.set(key, body)  # Same response shape as the web3 middleware stores
+        return decode_function_result(self.__w3, function, Web3.toBytes(hexstr=body['result']))
+
+    async def __request(self, transaction: dict, block_identifier: str) -> dict:
+        payload = {
+            'jsonrpc': '2.0',
+            'id': next(self.__request_counter),
+            'method': 'eth_call',
+            'params': [transaction, block_identifier],
+        }
+        if self.__rate_limiter is None:
+            async with self.__semaphore:
+                body = await self.__post(payload)
+        else:
+            attempt = 0
+            while True:
+                await self.__rate_limiter.acquire_async()
+                start = time.monotonic()
+                body, error = None, None
+                try:
+                    body = await self.__post(payload)
+                except Exception as e:
+                    error = e
+                throttled = is_throttled_error(error) if error is not None else is_throttled_response(body)
+                await self.__rate_limiter.release_async(time.monotonic() - start, throttled)
+                if not throttled or attempt >= self.__rate_limiter.get_retries():
+                    break
+                await asyncio.sleep(self.__rate_limiter.get_retry_delay(attempt))  # eth_call is safe to send again
+                attempt += 1
+            if error is not None:
+                raise error
+        if 'error' in body:
+            raise ValueError(body['error'])
+        return body
+
+    async def __post(self, payload: dict) -> dict:
+        if self.endpoint_pool is not None:
+            return await self.endpoint_pool.post_async(self.__session, payload)
+        async with self.__session.post(self.__node_address, json=payload) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def __fetch_pool_information(self, indices: list, pool_rows: PoolRowBuffer):
+        # Rows are added as their task completes, so the partial file follows the reads
+        for task in asyncio.as_completed([self.__get_pool_information_using_index(index) for index in indices]):
+            row = await task
+            if row:
+                pool_rows.append(row)
+
+    async def __fetch_pool_information_using_multicall(self, batches: list, pool_rows: PoolRowBuffer):
+        for task in asyncio.as_completed([self.__get_pool_information_using_multicall(batch) for batch in batches]):
+            pool_rows.extend(await task)
+
+    async def __aggregate(self, functions: list) -> list:
+        # Multicall.aggregate over the async session, None for every call when the batch fails
+        if not functions:
+            return []
+        try:
+            return self.__multicall.decode(functions, await self.__call(self.__multicall.prepare(functions)))
+        except Exception as e:
+            print('Error in Multicall aggregate: {e}'.format(e=e))
+            self.__log.info('Error in Multicall aggregate: {e}'.format(e=e))
+            return [None] * len(functions)
+
+    async def __get_pool_information_using_multicall(self, indices: list) -> list:
+        # Same rows as PancakeSwapBlockchain reads with multicall: lpToken + poolInfo, token0 + token1 of the pairs
+        # not cached, symbol + decimals of the tokens not cached, one aggregated call each
+        try:
+            functions = []
+            for index in indices:
+                functions.append(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'lpToken', index))
+                functions.append(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'poolInfo', index))
+            results = await self.__aggregate(functions)
+            pools = []
+            for position, index in enumerate(indices):
+                pool_address, pool_information = results[2 * position], results[2 * position + 1]
+                if pool_address is None or pool_information is None:
+                    print('Error in function __get_pool_information_using_multicall: could not read pool '
+                          '{index}'.format(index=index))
+                    self.__log.info('Error in function __get_pool_information_using_multicall: could not read pool '
+                                    '{index}'.format(index=index))
+                    continue
+                pools.append({'index': index, 'lpToken': pool_address,
+                              'allocPoint': pool_information[2],  # ALLOCATED POINTS
+                              'isRegular': pool_information[4]})  # TYPE OF POOL
+
+            uncached_pools = [pool for pool in pools if self.metadata_cache.get_pair_tokens(pool['lpToken']) is None]
+            functions = []
+            for pool in uncached_pools:
+                functions.append(self.__pair_codec.prepare(pool['lpToken'], 'token0'))
+                functions.append(self.__pair_codec.prepare(pool['lpToken'], 'token1'))
+            results = await self.__aggregate(functions)
+            for position, pool in enumerate(uncached_pools):
+                token0, token1 = results[2 * position], results[2 * position + 1]
+                if token0 is not None and token1 is not None:
+                    self.metadata_cache.set_pair_tokens(pool['lpToken'], token0, token1)
+            valid_pools = []
+            for pool in pools:
+                tokens_list = self.metadata_cache.get_pair_tokens(pool['lpToken'])
+                if tokens_list is None:  # Not a pair contract
+                    continue
+                pool['token0'], pool['token1'] = tokens_list
+                valid_pools.append(pool)
+
+            tokens = list(dict.fromkeys([pool['token0'] for pool in valid_pools] +
+                                        [pool['token1'] for pool in valid_pools]))
+            uncached_tokens = [token for token in tokens if self.metadata_cache.get_token(token) is None]
+            functions = []
+            for token in uncached_tokens:
+                functions.append(self.__token_codec.prepare(token, 'symbol'))
+                functions.append(self.__token_codec.prepare(token, 'decimals'))
+            results = await self.__aggregate(functions)
+            symbols = {}
+            for position, token in enumerate(uncached_tokens):
+                symbol, decimals = results[2 * position], results[2 * position + 1]
+                if symbol is not None and decimals is not None:
+                    self.metadata_cache.set_token(token, symbol, decimals)
+                symbols[token] = symbol
+            for token in tokens:
+                if self.metadata_cache.get_token(token) is not None:
+                    symbols[token] = self.metadata_cache.get_token(token)['symbol']
+            return [{
+                'index': pool['index'],
+                'lpToken': pool['lpToken'],
+                'allocPoint': pool['allocPoint'],
+                'isRegular': pool['isRegular'],
+                'token0': pool['token0'],
+                'token0_name': symbols[pool['token0']],
+                'token1': pool['token1'],
+                'token1_name': symbols[pool['token1']],
+            } for pool in valid_pools]
+        except Exception as e:
+            print('Error in function __get_pool_information_using_multicall: {e}'.format(e=e))
+            self.__log.info('Error in function __get_pool_information_using_multicall: {e}'.format(e=e))
+            return []
+
+    async def __get_pool_information_using_index(self, index: int) -> dict:
+        try:
+            pool_address = await self.__call(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'lpToken',
+                                                                              index))
+            pool_information, (token0, token1) = await asyncio.gather(
+                self.__call(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'poolInfo', index)),
+                self.__get_tokens_addresses(pool_address))
+            token0_symbol, token1_symbol = await asyncio.gather(self.__get_token_symbol(token0),
+                                                                self.__get_token_symbol(token1))
+            return {
+                'index': index,
+                'lpToken': pool_address,
+                'allocPoint': pool_information[2],  # ALLOCATED POINTS
+                'isRegular': pool_information[4],  # TYPE OF POOL
+                'token0': token0,
+                'token0_name': token0_symbol,
+                'token1': token1,
+                'token1_name': token1_symbol,
+            }
+        except Exception as e:
+            print('Error in function __get_pool_information_using_index: {e}'.format(e=e))
+            self.__log.info('Error in function __get_pool_information_using_index: {e}'.format(e=e))
+            return {}
+
+    async def __get_tokens_addresses(self, address: str) -> list:
+        tokens_list = self.metadata_cache.get_pair_tokens(address)  # Tokens of a pair never change
+        if tokens_list is None:
+            tokens_list = await asyncio.gather(self.__call(self.__pair_codec.prepare(address, 'token0')),
+                                               self.__call(self.__pair_codec.prepare(address, 'token1')))
+            self.metadata_cache.set_pair_tokens(address, tokens_list[0], tokens_list[1])
+        return tokens_list
+
+    async def __get_token_metadata(self, address: str) -> dict:
+        token_metadata = self.metadata_cache.get_token(address)  # Symbol and decimals of a token never change
+        if token_metadata is None:
+            token_symbol, token_decimals = await asyncio.gather(
+                self.__call(self.__token_codec.prepare(address, 'symbol')),
+                self.__call(self.__token_codec.prepare(address, 'decimals')))
+            self.metadata_cache.set_token(address, token_symbol, token_decimals)
+            token_metadata = {'symbol': token_symbol, 'decimals': token_decimals}
+        return token_metadata
+
+    async def __get_token_symbol(self, address: str) -> str:
+        try:
+            return (await self.__get_token_metadata(address))['symbol']
+        except Exception as e:
+            print('Error in function __get_token_symbol: {e}'.format(e=e))
+            self.__log.info('Error in function __get_token_symbol: {e}'.format(e=e))
+
+    async def __calculate_liquidity_balances(self, rows: list, price_graph: PriceGraph) -> list:
+        return await asyncio.gather(*[self.__calculate_liquidity_balance_of_pool(row, price_graph) for row in rows])
+
+    async def __calculate_liquidity_balance_of_pool(self, row: pd.Series, price_graph: PriceGraph) -> dict:
+        try:
+            pool_address = self.__w3.toChecksumAddress(row['lpToken'])
+            TVL = price_graph.get_pair_value(pool_address)  # Pool reserves valued with the price graph
+            if TVL is None:
+                raise ValueError('reserves of pool {pool} could not be fetched'.format(pool=pool_address))
+            max_supply, masterchef_balance = await asyncio.gather(
+                self.__call(self.__pair_codec.prepare(pool_address, 'totalSupply')),
+                self.__call(self.__pair_codec.prepare(pool_address, 'balanceOf', self.__pancake_masterChef)))
+            Farm_Liquidity = (TVL / max_supply) * masterchef_balance  # Farming Pool Liquidity
+            return {'TVL': TVL, 'Farm_Liquidity': Farm_Liquidity}
+        except Exception as e:
+            print('Error finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
+            self.__log.info(
+                'Error  finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
+            return {}
@@ -0,0 +1,115 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from web3 import HTTPProvider
+from web3._utils.request import make_post_request
+from web3.types import RPCEndpoint, RPCResponse
+from python.endpoint_pool import EndpointPool
+
+
+class _PendingRequest:
+    # One JSON-RPC request waiting in the batch queue for its response
+
+    def __init__(self, method: RPCEndpoint, params: Any):
+        self.method = method
+        self.params = params
+        self.response = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchHTTPProvider(HTTPProvider):
+    # HTTP provider which collects requests made at the same time from different threads
+    # and sends them to the node as one JSON-RPC batch array.
+    # A request is sent right away when nothing else is queued or in flight, so sequential calls do not wait.
+    # Otherwise requests are arriving at the same time and a batch is sent when it reaches max_batch_size or when
+    # flush_interval seconds passed since its first request. Up to max_in_flight batches are sent at the same time.
+    # Responses are matched back to their callers using the JSON-RPC id.
+    # With an endpoint_pool the batches are sent through the pool instead of to endpoint_uri.
+
+    def __init__(self, endpoint_uri: str, max_batch_size: int, flush_interval: float, request_kwargs: dict = None,
+                 endpoint_pool: EndpointPool = None, max_in_flight: int = 4):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self.__endpoint_pool = endpoint_pool
+        self.__max_batch_size = max(1, max_batch_size)
+        self.__flush_interval = flush_interval
+        self.__queue = queue.Queue()
+        self.__worker = None
+        self.__worker_lock = threading.Lock()
+        self.__senders = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix='BatchHTTPProvider')
+        self.__in_flight = 0  # Batches submitted to the senders and not answered yet
+        self.__in_flight_lock = threading.Lock()
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        self.__start_worker()
+        pending = _PendingRequest(method, params)
+        self.__queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    def __start_worker(self):
+        with self.__worker_lock:
+            if self.__worker is None or not self.__worker.is_alive():
+                self.__worker = threading.Thread(target=self.__run, name='BatchHTTPProvider', daemon=True)
+                self.__worker.start()
+
+    def __run(self):
+        while True:
+            batch = [self.__queue.get()]
+            deadline = time.monotonic() + self.__flush_interval
+            while len(batch) < self.__max_batch_size:
+                try:
+                    batch.append(self.__queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (len(batch) == 1 and self.__in_flight == 0):
+                    break  # A lone request is not held back
+                try:
+                    batch.append(self.__queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            with self.__in_flight_lock:
+                self.__in_flight += 1
+            self.__senders.submit(self.__send, batch)
+
+    def __send(self, batch: list):
+        try:
+            requests = [{'jsonrpc': '2.0', 'method': pending.method, 'params': pending.params or [],
+                         'id': next(self.request_counter)} for pending in batch]
+            if len(requests) == 1:  # No need for a batch array for a single request
+                request_data = json.dumps(requests[0]).encode()
+            else:
+                request_data = json.dumps(requests).encode()
+            if self.__endpoint_pool is not None:
+                raw_response = self.__endpoint_pool.post(request_data, self.get_request_kwargs())
+            else:
+                raw_response = make_post_request(self.endpoint_uri, request_data, **self.get_request_kwargs())
+            responses = self.decode_rpc_response(raw_response)
+            if isinstance(responses, dict):
+                # Either the single request response or an error for the whole batch
+                if len(requests) == 1 or 'id' not in responses or responses['id'] is None:
+                    responses = [dict(responses, id=request['id']) for request in requests]
+                else:
+                    responses = [responses]
+            responses_by_id = {response.get('id'): response for response in responses}
+            for pending, request in zip(batch, requests):
+                pending.response = responses_by_id.get(request['id'], {
+                    'jsonrpc': '2.0',
+                    'id': request['id'],
+                    'error': {'code': -32603, 'message': 'No response for request in JSON-RPC batch'},
+                })
+        except Exception as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            with self.__in_flight_lock:
+                self.__in_flight -= 1
+            for pending in batch:
+                pending.done.set()
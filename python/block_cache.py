@@ -0,0 +1,51 @@
+import json
+import threading
+from typing import Any, Callable
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+BLOCK_TAGS = ('latest', 'pending', 'earliest')
+
+
+class BlockCallCache:
+    # Cache of eth_call responses keyed by (block, contract, calldata)
+    # The state of a contract at a fixed block never changes, so when all reads are pinned to one block
+    # repeated reads e.g. getReserves of the same USDT pair for many pools are only sent to the node once.
+    # Calls made against a block tag like 'latest' are never cached.
+
+    def __init__(self):
+        self.__responses = {}
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def get_key(transaction: dict, block_identifier: Any) -> tuple:
+        if block_identifier is None or block_identifier in BLOCK_TAGS:
+            return None
+        if isinstance(block_identifier, str):
+            block_identifier = int(block_identifier, 16)
+        return (block_identifier, str(transaction.get('to', '')).lower(),
+                json.dumps({key: value for key, value in transaction.items() if key != 'to'},
+                           sort_keys=True, default=str))
+
+    def get(self, key: tuple) -> Any:
+        return self.__responses.get(key)
+
+    def set(self, key: tuple, response: Any):
+        with self.__lock:
+            self.__responses[key] = response
+
+    def middleware(self, make_request: Callable[[RPCEndpoint, Any], Any], w3: Web3) -> Callable:
+        # web3 middleware which serves eth_call from the cache when the call is pinned to a block
+        def block_call_cache_middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if method != 'eth_call' or len(params) != 2:  # Calls with a state override are never cached
+                return make_request(method, params)
+            key = self.get_key(params[0], params[1])
+            if key is None:
+                return make_request(method, params)
+            response = self.get(key)
+            if response is None:
+                response = make_request(method, params)
+                if 'error' not in response:
+                    self.set(key, response)
+            return response
+        return block_call_cache_middleware
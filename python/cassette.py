@@ -0,0 +1,163 @@
+import argparse
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Logger
+import requests
+
+CASSETTE_FILE = './Data Set/rpc_cassette.json.gz'
+REPLAY_MISS_CODE = -32000
+
+
+class Cassette:
+    # JSON-RPC responses of a run, keyed by method and params and saved as gzip compressed JSON
+    # The same request can get different answers during a run (e.g. eth_blockNumber), they are replayed in order
+    # and the last one is repeated once they are used up.
+
+    def __init__(self, logger: Logger, path: str = CASSETTE_FILE):
+        self.__log = logger
+        self.__path = path
+        self.__responses = {}  # key -> list of responses without id
+        self.__positions = {}  # key -> next response to replay
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def get_key(request: dict) -> str:
+        return json.dumps([request.get('method'), request.get('params', [])], sort_keys=True, separators=(',', ':'))
+
+    def load(self):
+        with gzip.open(self.__path, 'rt') as f:
+            self.__responses = json.load(f)
+        self.__positions = {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.__path), exist_ok=True)
+            with self.__lock, gzip.open(self.__path, 'wt') as f:
+                json.dump(self.__responses, f, separators=(',', ':'))
+            self.__log.info('Saved {n} RPC requests to {path}'.format(n=len(self.__responses), path=self.__path))
+        except Exception as e:
+            print('Error saving cassette {e}'.format(e=e))
+            self.__log.info('Error saving cassette {e}'.format(e=e))
+
+    def record(self, request: dict, response: dict):
+        with self.__lock:
+            self.__responses.setdefault(self.get_key(request), []).append(
+                {key: value for key, value in response.items() if key != 'id'})
+
+    def replay(self, request: dict) -> dict:
+        key = self.get_key(request)
+        with self.__lock:
+            responses = self.__responses.get(key)
+            if not responses:
+                response = {'jsonrpc': '2.0', 'error': {'code': REPLAY_MISS_CODE,
+                                                        'message': 'Request not in cassette: {key}'.format(key=key)}}
+            else:
+                position = self.__positions.get(key, 0)
+                response = responses[min(position, len(responses) - 1)]
+                self.__positions[key] = position + 1
+        return dict(response, id=request.get('id'))
+
+
+class _CassetteRequestHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        try:
+            response = self.server.cassette_server.handle(body)
+        except Exception as e:
+            # The node failed or throttled while recording, the client sees it as a failed request and retries
+            self.send_error(502, str(e))
+            return
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args):
+        pass  # No access log on stderr for every request
+
+
+class CassetteServer:
+    # Local HTTP stand-in for the node, node_address is pointed at it for the whole run
+    # record: every request (single or batch) is forwarded to upstream_uri and its response kept in the cassette
+    # replay: every request is answered from the cassette after latency seconds, no network needed,
+    # so the same run can be repeated and timed against the exact same chain data
+
+    def __init__(self, logger: Logger, cassette: Cassette, mode: str, upstream_uri: str = None,
+                 latency: float = 0.0, port: int = 0):
+        self.__log = logger
+        self.__cassette = cassette
+        self.__mode = mode
+        self.__upstream_uri = upstream_uri
+        self.__latency = latency
+        self.__session = requests.Session()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), _CassetteRequestHandler)
+        self.__server.daemon_threads = True
+        self.__server.cassette_server = self
+
+    def start(self) -> str:
+        threading.Thread(target=self.__server.serve_forever, name='CassetteServer', daemon=True).start()
+        uri = 'http://127.0.0.1:{port}'.format(port=self.__server.server_port)
+        self.__log.info('Cassette {mode} server listening on {uri}'.format(mode=self.__mode, uri=uri))
+        return uri
+
+    def stop(self):
+        self.__server.shutdown()
+
+    def handle(self, body):
+        if self.__mode == 'record':
+            upstream_response = self.__session.post(self.__upstream_uri, json=body, timeout=60)
+            upstream_response.raise_for_status()
+            response = upstream_response.json()
+            responses = response if isinstance(response, list) else [response]
+            requests_by_id = {request.get('id'): request for request in (body if isinstance(body, list) else [body])}
+            for item in responses:
+                if isinstance(item, dict) and item.get('id') in requests_by_id:
+                    self.__cassette.record(requests_by_id[item['id']], item)
+            return response
+        if self.__latency:
+            time.sleep(self.__latency)
+        if isinstance(body, list):
+            return [self.__cassette.replay(request) for request in body]
+        return self.__cassette.replay(body)
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_cassette_node_address(logger: Logger, mode: str, path: str, upstream_uri: str, latency: float) -> str:
+    # Starts the cassette server once per process and returns its address
+    with _servers_lock:
+        if (mode, path) not in _servers:
+            cassette = Cassette(logger, path)
+            if mode == 'replay':
+                cassette.load()
+            else:
+                atexit.register(cassette.save)
+            _servers[(mode, path)] = CassetteServer(logger, cassette, mode, upstream_uri, latency).start()
+        return _servers[(mode, path)]
+
+
+if __name__ == '__main__':
+    # Serves a recorded cassette as a node for other tools: python -m python.cassette --port 8545
+    import logging
+    parser = argparse.ArgumentParser(description='Serve a recorded JSON-RPC cassette as a BSC node')
+    parser.add_argument('--path', default=CASSETTE_FILE)
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    arguments = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    replay_cassette = Cassette(logging.getLogger('cassette'), arguments.path)
+    replay_cassette.load()
+    server = CassetteServer(logging.getLogger('cassette'), replay_cassette, 'replay', latency=arguments.latency,
+                            port=arguments.port)
+    print('Replaying {path} on {uri}'.format(path=arguments.path, uri=server.start()))
+    threading.Event().wait()
@@ -0,0 +1,99 @@
+from typing import Any
+from eth_abi import encode_abi, decode_abi
+from eth_utils import function_abi_to_4byte_selector, to_checksum_address
+from web3 import Web3
+from web3.exceptions import BadFunctionCallOutput
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+
+class _FunctionCodec:
+    # Selector and argument / return types of one contract function, worked out once from the ABI
+
+    def __init__(self, function_abi: dict):
+        self.name = function_abi['name']
+        self.selector = function_abi_to_4byte_selector(function_abi)
+        self.input_types = get_abi_input_types(function_abi)
+        self.output_types = get_abi_output_types(function_abi)
+        self.address_outputs = [position for position, output_type in enumerate(self.output_types)
+                                if output_type == 'address']
+
+    def encode(self, args: tuple) -> str:
+        return '0x' + (self.selector + encode_abi(self.input_types, args)).hex()
+
+    def decode(self, return_data: bytes) -> Any:
+        # Same values as ContractFunction.call(), checksum addresses and a list for several outputs
+        decoded = list(decode_abi(self.output_types, return_data))
+        for position in self.address_outputs:
+            decoded[position] = to_checksum_address(decoded[position])
+        if len(decoded) == 1:
+            return decoded[0]
+        return decoded
+
+
+class PreparedCall:
+    # A read only call with its calldata already encoded, used in place of a web3 ContractFunction
+    # e.g. pair_codec.prepare(pair_address, 'getReserves') instead of
+    # w3.eth.contract(address=pair_address, abi=pair_abi).functions.getReserves()
+
+    def __init__(self, w3: Web3, address: str, function_codec: _FunctionCodec, data: str):
+        self.__w3 = w3
+        self.__function_codec = function_codec
+        self.address = address
+        self.fn_name = function_codec.name
+        self.data = data
+
+    def decode(self, return_data: bytes) -> Any:
+        return self.__function_codec.decode(return_data)
+
+    def call(self, block_identifier='latest') -> Any:
+        return_data = self.__w3.eth.call({'to': self.address, 'data': self.data}, block_identifier)
+        if not return_data:  # Same as web3, nothing returned means no contract at the address
+            raise BadFunctionCallOutput('Could not call {fn} on {address}, no data returned'.format(
+                fn=self.fn_name, address=self.address))
+        return self.decode(return_data)
+
+
+class ContractCodec:
+    # Precompiled encoders and decoders of every function of an ABI
+    # Building a web3 contract object and a ContractFunction for every call parses the ABI again each time,
+    # a codec is built once per ABI and only encodes the arguments of each call.
+
+    def __init__(self, w3: Web3, abi: list):
+        self.__w3 = w3
+        self.__functions = {function_abi['name']: _FunctionCodec(function_abi) for function_abi in abi
+                            if function_abi.get('type') == 'function'}
+        self.__no_argument_data = {name: function_codec.encode(())
+                                   for name, function_codec in self.__functions.items()
+                                   if not function_codec.input_types}
+
+    def prepare(self, address: str, fn_name: str, *args) -> PreparedCall:
+        function_codec = self.__functions[fn_name]
+        data = self.__no_argument_data[fn_name] if not args else function_codec.encode(args)
+        return PreparedCall(self.__w3, address, function_codec, data)
+
+
+if __name__ == '__main__':
+    # Micro benchmark of the client side cost of one call, no node needed: python -m python.codec
+    import json
+    import timeit
+    from python.multicall import decode_function_result
+
+    w3 = Web3()
+    pair_abi = json.load(open('ABI/pairABI.json'))
+    pair_address = Web3.toChecksumAddress('0xa39af17ce4a8eb807e076805da1e2b8ea7d0755b')
+    return_data = encode_abi(['uint112', 'uint112', 'uint32'], [2 * 10 ** 24, 4 * 10 ** 24, 1])
+    pair_codec = ContractCodec(w3, pair_abi)
+
+    def web3_call():
+        function = w3.eth.contract(address=pair_address, abi=pair_abi).functions.getReserves()
+        function._encode_transaction_data()
+        return decode_function_result(w3, function, return_data)
+
+    def codec_call():
+        return pair_codec.prepare(pair_address, 'getReserves').decode(return_data)
+
+    assert web3_call() == codec_call()
+    for name, function in [('web3 contract', web3_call), ('precompiled codec', codec_call)]:
+        runs = 2000
+        seconds = min(timeit.repeat(function, number=runs, repeat=3))
+        print('{name}: {us:.1f} us per getReserves call'.format(name=name, us=seconds / runs * 10 ** 6))
@@ -0,0 +1,35 @@
+import numpy as np
+
+DAILY_BLOCKS = 28800
+DAYS_IN_YEAR = 365
+
+# Earnings of every pool for every balance at once, as pools (rows) x balances (columns) matrices
+# The balance is added to the liquidity of the pool, so a bigger deposit dilutes its own share of the rewards.
+
+
+def daily_basic_earning_rate(fees, tvl, balances) -> np.ndarray:
+    # Daily LP fee earning in %: fee of the last 24h / (TVL + balance) * 100, 0 when there is no fee or liquidity
+    fees = np.asarray(fees, dtype=float)[:, None]
+    liquidity = np.asarray(tvl, dtype=float)[:, None] + np.asarray(balances, dtype=float)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = fees / liquidity * 100
+    return np.where((fees > 0) & (liquidity > 0), rate, 0.0)
+
+
+def mining_apr(cake_price: float, cake_per_block, allocation_points, total_points, farm_liquidity,
+               balances) -> np.ndarray:
+    # Yearly mining reward in %:
+    # CAKE PRICE * (ALLOCATED POINT / TOTAL POINT) * REWARD * Daily_Blocks * Days_In_Year / (Farm Liquidity + BALANCE)
+    # * 100, cake_per_block and total_points are the ones of the type (regular or special) of every pool
+    with np.errstate(divide='ignore', invalid='ignore'):
+        yearly_reward = cake_price * np.asarray(allocation_points, dtype=float) / \
+            np.asarray(total_points, dtype=float) * np.asarray(cake_per_block, dtype=float) * \
+            DAILY_BLOCKS * DAYS_IN_YEAR
+        liquidity = np.asarray(farm_liquidity, dtype=float)[:, None] + np.asarray(balances, dtype=float)[None, :]
+        apr = yearly_reward[:, None] / liquidity * 100
+    return np.where(np.isfinite(apr), apr, 0.0)
+
+
+def daily_reward_in_dollars(rates, balances) -> np.ndarray:
+    # Daily reward in $ of every balance from daily rates in %
+    return np.asarray(rates, dtype=float) * np.asarray(balances, dtype=float)[None, :] / 100
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logging import Logger
+from typing import Any
+import aiohttp
+from web3 import HTTPProvider
+from web3._utils.request import make_post_request
+from web3.types import RPCEndpoint, RPCResponse
+
+LATENCY_SAMPLES = 100  # Latencies kept per endpoint for the percentile
+ERROR_RATE_DECAY = 0.1  # Weight of the newest request in the moving error rate
+
+
+class _EndpointStats:
+    # Latency and error history of one node
+
+    def __init__(self, endpoint_uri: str):
+        self.endpoint_uri = endpoint_uri
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.error_rate = 0.0
+        self.cooldown_until = 0.0
+
+    def get_percentile(self, percentile: float) -> float:
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+
+class EndpointPool:
+    # Spreads the requests over several nodes
+    # 1. every request goes to the healthiest node, the one with the lowest median latency weighted by its error rate
+    # 2. when a request takes longer than the p95 latency of its node the same request is sent to the next node
+    #    and the first answer wins (hedged request), only safe because every call made here is read only
+    # 3. a node which fails is put on cooldown and the request is sent to the next node (failover)
+
+    def __init__(self, endpoint_uris: list, logger: Logger, hedge_percentile: float, hedge_min_samples: int,
+                 hedge_delay: float, failure_cooldown: float, max_workers: int):
+        self.__log = logger
+        self.__endpoints = [_EndpointStats(endpoint_uri) for endpoint_uri in endpoint_uris]
+        self.__hedge_percentile = hedge_percentile
+        self.__hedge_min_samples = hedge_min_samples
+        self.__hedge_delay = hedge_delay  # Used until a node has hedge_min_samples latencies
+        self.__failure_cooldown = failure_cooldown
+        self.__lock = threading.Lock()
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='EndpointPool')
+
+    def get_endpoint_uris(self) -> list:
+        return [endpoint.endpoint_uri for endpoint in self.__endpoints]
+
+    def post(self, request_data: bytes, request_kwargs: dict) -> bytes:
+        # Sends the request and returns the raw response of the first node which answers
+        def send(endpoint: _EndpointStats) -> bytes:
+            start = time.monotonic()
+            try:
+                response = make_post_request(endpoint.endpoint_uri, request_data, **request_kwargs)
+            except Exception:
+                self.__record_failure(endpoint)
+                raise
+            self.__record_success(endpoint, time.monotonic() - start)
+            return response
+
+        endpoints = self.__get_ranked_endpoints()
+        futures = {self.__executor.submit(send, endpoints[0]): endpoints[0]}
+        next_endpoint = 1
+        error = None
+        while futures:
+            done, pending = wait(futures, timeout=self.__get_hedge_delay(futures[next(iter(futures))]),
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.pop(future)
+                if future.exception() is None:
+                    return future.result()  # The slower requests finish in the background and only update stats
+                error = future.exception()
+            # Hedge when the request is slow, failover when it failed
+            if next_endpoint < len(endpoints) and (not done or not futures):
+                futures[self.__executor.submit(send, endpoints[next_endpoint])] = endpoints[next_endpoint]
+                next_endpoint += 1
+        raise error
+
+    async def post_async(self, session: aiohttp.ClientSession, payload: dict) -> dict:
+        # Same as post for the asyncio client, returns the decoded JSON response
+        async def send(endpoint: _EndpointStats) -> dict:
+            start = time.monotonic()
+            try:
+                async with session.post(endpoint.endpoint_uri, json=payload) as response:
+                    response.raise_for_status()
+                    body = await response.json(content_type=None)
+            except Exception:
+                self.__record_failure(endpoint)
+                raise
+            self.__record_success(endpoint, time.monotonic() - start)
+            return body
+
+        endpoints = self.__get_ranked_endpoints()
+        tasks = {asyncio.ensure_future(send(endpoints[0])): endpoints[0]}
+        next_endpoint = 1
+        error = None
+        try:
+            while tasks:
+                done, pending = await asyncio.wait(tasks, timeout=self.__get_hedge_delay(tasks[next(iter(tasks))]),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if next_endpoint < len(endpoints) and (not done or not tasks):
+                    tasks[asyncio.ensure_future(send(endpoints[next_endpoint]))] = endpoints[next_endpoint]
+                    next_endpoint += 1
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()  # The session is closed with the event loop, so the slower requests are dropped
+
+    def __get_ranked_endpoints(self) -> list:
+        now = time.monotonic()
+        with self.__lock:
+            def score(endpoint: _EndpointStats) -> tuple:
+                latency = sorted(endpoint.latencies)[len(endpoint.latencies) // 2] if endpoint.latencies else 0
+                return endpoint.cooldown_until > now, latency * (1 + 10 * endpoint.error_rate)
+            return sorted(self.__endpoints, key=score)
+
+    def __get_hedge_delay(self, endpoint: _EndpointStats) -> float:
+        with self.__lock:
+            if len(endpoint.latencies) < self.__hedge_min_samples:
+                return self.__hedge_delay
+            return endpoint.get_percentile(self.__hedge_percentile)
+
+    def __record_success(self, endpoint: _EndpointStats, latency: float):
+        with self.__lock:
+            endpoint.latencies.append(latency)
+            endpoint.error_rate *= 1 - ERROR_RATE_DECAY
+
+    def __record_failure(self, endpoint: _EndpointStats):
+        with self.__lock:
+            endpoint.error_rate = endpoint.error_rate * (1 - ERROR_RATE_DECAY) + ERROR_RATE_DECAY
+            endpoint.cooldown_until = time.monotonic() + self.__failure_cooldown
+        print('Request to {node} failed, using the next node'.format(node=endpoint.endpoint_uri))
+        self.__log.info('Request to {node} failed, using the next node'.format(node=endpoint.endpoint_uri))
+
+
+class PooledHTTPProvider(HTTPProvider):
+    # HTTP provider which sends every request through an EndpointPool instead of a single node
+
+    def __init__(self, endpoint_pool: EndpointPool, request_kwargs: dict = None):
+        super().__init__(endpoint_pool.get_endpoint_uris()[0], request_kwargs=request_kwargs)
+        self.__endpoint_pool = endpoint_pool
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        request_data = self.encode_rpc_request(method, params)
+        raw_response = self.__endpoint_pool.post(request_data, self.get_request_kwargs())
+        return self.decode_rpc_response(raw_response)
@@ -0,0 +1,92 @@
+import os
+from datetime import date, timedelta
+from logging import Logger
+import pandas as pd
+from python.pool_archive import PoolArchive
+
+HISTORY_DIRECTORY = './Data Set'
+
+
+class PoolHistoryStore:
+    # Pool information files of the past days, read once per run and indexed by (lpToken, day)
+    # day is the number of days before today, today is the pool information of the run and is never read from disk.
+    # The average of a pool covers today and the days before it without a gap, so a pool added 3 days ago is
+    # averaged over 3 days, and the days without the column are skipped (e.g. backfilled days have no volume).
+    # With an archive, the days are read from its Parquet partitions and the CSV files are only read for the days
+    # missing from it, every saved day is written to both.
+
+    def __init__(self, logger: Logger, directory: str = HISTORY_DIRECTORY, archive: PoolArchive = None):
+        self.__log = logger
+        self.__directory = directory
+        self.__archive = archive
+        self.__history = pd.DataFrame(columns=['lpToken', 'day'])
+
+    @staticmethod
+    def get_file_name(day: date) -> str:
+        return 'pool_information {month:02d}.{day}.{year}.csv'.format(month=day.month, day=day.day, year=day.year)
+
+    def get_path(self, day: date) -> str:
+        # Files of October to December used to be named with a 3 digit month (010), they are still read
+        legacy_path = os.path.join(self.__directory, 'pool_information 0{month}.{day}.{year}.csv'.format(
+            month=day.month, day=day.day, year=day.year))
+        path = os.path.join(self.__directory, self.get_file_name(day))
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            return legacy_path
+        return path
+
+    def exists(self, day: date) -> bool:
+        return os.path.exists(self.get_path(day)) or (self.__archive is not None and self.__archive.exists(day))
+
+    def save(self, day: date, pool_df: pd.DataFrame):
+        pool_df.to_csv(self.get_path(day))
+        if self.__archive is not None:
+            self.__archive.write(day, pool_df)
+
+    def load(self, days: int):
+        # Reads the files of the days days before today
+        frames = []
+        archived_days = set()
+        if self.__archive is not None:
+            try:
+                archived = self.__archive.read(date.today() - timedelta(days=days), date.today() - timedelta(days=1))
+                if not archived.empty:
+                    archived['day'] = [(date.today() - day).days for day in archived.pop('date')]
+                    archived_days = set(archived['day'])
+                    frames.append(archived)
+            except Exception as e:
+                print('Error reading the archive {e}'.format(e=e))
+                self.__log.info('Error reading the archive {e}'.format(e=e))
+        for day in range(1, days + 1):
+            path = self.get_path(date.today() - timedelta(days=day))
+            if day in archived_days or not os.path.exists(path):
+                continue
+            try:
+                frames.append(pd.read_csv(path).assign(day=day))
+            except Exception as e:
+                print('Error reading {path} {e}'.format(path=path, e=e))
+                self.__log.info('Error reading {path} {e}'.format(path=path, e=e))
+        if frames:
+            self.__history = pd.concat(frames, ignore_index=True)
+        self.__log.info('Loaded pool information of {n} past days'.format(
+            n=len(frames) - (1 if archived_days else 0) + len(archived_days)))
+
+    def get_averages(self, today: pd.DataFrame, column_headers: list) -> pd.DataFrame:
+        # Average of every column for every pool of today and the stored days, indexed by lpToken
+        today_rows = today[['lpToken'] + [column for column in column_headers if column in today.columns]]
+        history = pd.concat([today_rows.assign(day=0), self.__history], ignore_index=True)
+        history = history.drop_duplicates(['lpToken', 'day']).set_index(['lpToken', 'day']).sort_index()
+        # A pool counts up to the first day it is missing
+        present = pd.Series(1, index=history.index).unstack('day', fill_value=0)
+        present = present.reindex(columns=range(0, int(present.columns.max()) + 1), fill_value=0).cumprod(axis=1)
+        present = present.stack()
+        history = history.loc[present[present == 1].index]
+        values = pd.DataFrame(index=history.index)
+        for column in column_headers:
+            if column not in history.columns:
+                values[column] = float('nan')
+            elif history[column].dtype == object:
+                values[column] = pd.to_numeric(history[column].astype(str).str.replace('%', '', regex=False),
+                                               errors='coerce')
+            else:
+                values[column] = history[column].astype(float)
+        return values.groupby(level='lpToken').mean()
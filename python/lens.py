@@ -0,0 +1,172 @@
+from logging import Logger
+from web3 import Web3
+from python.block_cache import BlockCallCache
+from python.codec import ContractCodec, PreparedCall
+
+LITERAL_TARGET = 0xffff  # Target of a lens call given as an address, otherwise it is the index of an earlier result
+ADDRESS_MASK = 2 ** 160 - 1
+
+# Memory slots used by the lens program, the result table starts at TABLE
+P, OUT, I, N, ADDR, LEN, WORD, TABLE = 0x00, 0x20, 0x40, 0x60, 0x80, 0xa0, 0xc0, 0x100
+
+OPCODES = {
+    'ADD': 0x01, 'MUL': 0x02, 'SUB': 0x03, 'LT': 0x10, 'EQ': 0x14, 'ISZERO': 0x15, 'AND': 0x16, 'SHL': 0x1b,
+    'SHR': 0x1c, 'CALLDATALOAD': 0x35, 'CALLDATACOPY': 0x37, 'RETURNDATASIZE': 0x3d, 'RETURNDATACOPY': 0x3e,
+    'POP': 0x50, 'MLOAD': 0x51, 'MSTORE': 0x52, 'JUMP': 0x56, 'JUMPI': 0x57, 'GAS': 0x5a, 'JUMPDEST': 0x5b,
+    'DUP1': 0x80, 'SWAP1': 0x90, 'STATICCALL': 0xfa, 'RETURN': 0xf3,
+}
+
+# The lens runs a list of calls in one eth_call. Its calldata is
+#   number of calls (2 bytes) then for every call
+#   target (2 bytes: 0xffff or the index of an earlier call) | address (20 bytes) | length (2 bytes) | calldata
+# A call with an index as target is sent to the address in the first word returned by that call,
+# e.g. token0() to the lpToken returned by MasterChef, so all the reads of a pool need one request.
+# It returns for every call the length of its return data (32 bytes) then the return data, 0 if the call failed.
+# Memory: [P, OUT, I, N, ADDR, LEN, WORD] variables, then the offset of the return data of every call, then the output
+LENS_PROGRAM = [
+    0, 'CALLDATALOAD', 240, 'SHR',  # n
+    'DUP1', N, 'MSTORE',
+    5, 'SHL', TABLE, 'ADD',  # base of the output, kept at the bottom of the stack
+    'DUP1', OUT, 'MSTORE',
+    2, P, 'MSTORE',
+    0, I, 'MSTORE',
+    ('label', 'loop'),
+    N, 'MLOAD', I, 'MLOAD', 'LT', 'ISZERO', ('push', 'end'), 'JUMPI',  # while i < n
+    P, 'MLOAD', 'CALLDATALOAD', WORD, 'MSTORE',
+    0xffff, WORD, 'MLOAD', 64, 'SHR', 'AND', LEN, 'MSTORE',
+    ADDRESS_MASK, WORD, 'MLOAD', 80, 'SHR', 'AND', ADDR, 'MSTORE',
+    WORD, 'MLOAD', 240, 'SHR',  # target
+    'DUP1', LITERAL_TARGET, 'EQ', ('push', 'literal'), 'JUMPI',
+    5, 'SHL', TABLE, 'ADD', 'MLOAD',  # offset of the return data of the earlier call
+    'DUP1', 'MLOAD', ADDRESS_MASK, 'AND',  # its first word as address
+    'SWAP1', 32, 'SWAP1', 'SUB', 'MLOAD',  # its length
+    32, 'SWAP1', 'LT', 'ISZERO', 'MUL',  # address 0 when it returned less than a word, the call then returns nothing
+    ADDR, 'MSTORE',
+    ('push', 'call'), 'JUMP',
+    ('label', 'literal'),
+    'POP',
+    ('label', 'call'),
+    24, P, 'MLOAD', 'ADD', P, 'MSTORE',
+    32, OUT, 'MLOAD', 'ADD', I, 'MLOAD', 5, 'SHL', TABLE, 'ADD', 'MSTORE',  # table[i] = out + 32
+    LEN, 'MLOAD', P, 'MLOAD', 32, OUT, 'MLOAD', 'ADD', 'CALLDATACOPY',
+    0, 0, LEN, 'MLOAD', 32, OUT, 'MLOAD', 'ADD', ADDR, 'MLOAD', 'GAS', 'STATICCALL',
+    'RETURNDATASIZE', 'MUL',  # length of the return data, 0 if the call failed
+    'DUP1', 0, 32, OUT, 'MLOAD', 'ADD', 'RETURNDATACOPY',
+    'DUP1', OUT, 'MLOAD', 'MSTORE',
+    32, 'ADD', OUT, 'MLOAD', 'ADD', OUT, 'MSTORE',
+    LEN, 'MLOAD', P, 'MLOAD', 'ADD', P, 'MSTORE',
+    1, I, 'MLOAD', 'ADD', I, 'MSTORE',
+    ('push', 'loop'), 'JUMP',
+    ('label', 'end'),
+    'DUP1', OUT, 'MLOAD', 'SUB', 'SWAP1', 'RETURN',
+]
+
+
+def assemble(program: list) -> bytes:
+    # Numbers are pushed with the smallest PUSH, label addresses always with PUSH2
+    def encode(item, labels: dict) -> bytes:
+        if isinstance(item, str):
+            return bytes([OPCODES[item]])
+        if isinstance(item, int):
+            value = item.to_bytes(max(1, (item.bit_length() + 7) // 8), 'big')
+            return bytes([0x5f + len(value)]) + value
+        if item[0] == 'label':
+            return bytes([OPCODES['JUMPDEST']])
+        return bytes([0x61]) + labels.get(item[1], 0).to_bytes(2, 'big')
+
+    labels = {}
+    position = 0
+    for item in program:
+        if isinstance(item, tuple) and item[0] == 'label':
+            labels[item[1]] = position
+        position += len(encode(item, labels))
+    return b''.join(encode(item, labels) for item in program)
+
+
+LENS_CODE = '0x' + assemble(LENS_PROGRAM).hex()
+
+
+class PoolLens:
+    # Reads everything about a batch of MasterChef pools in a single eth_call
+    # The lens code is never deployed, it is put at lens_address for the duration of the call with a state override.
+    # Nodes which do not support state overrides return an error, the caller then uses the normal path.
+    # Every result is also put in the block call cache, so e.g. totalSupply of a pool read later in the run at the
+    # same block does not go to the node again.
+
+    def __init__(self, w3: Web3, logger: Logger, lens_address: str, master_chef_address: str,
+                 master_chef_codec: ContractCodec, pair_codec: ContractCodec, token_codec: ContractCodec,
+                 block_call_cache: BlockCallCache):
+        self.__w3 = w3
+        self.__log = logger
+        self.__lens_address = lens_address
+        self.__master_chef_address = master_chef_address
+        self.__master_chef_codec = master_chef_codec
+        self.__pair_codec = pair_codec
+        self.__token_codec = token_codec
+        self.__block_call_cache = block_call_cache
+
+    def read_pools(self, indices: list, block_identifier='latest') -> list:
+        # Returns one dict per index with lpToken, poolInfo, token0, token1, getReserves, totalSupply,
+        # balanceOf (of the MasterChef) and symbol / decimals of both tokens, None for the values which
+        # could not be read. Raises if the node does not support the lens call.
+        calls = []
+        for index in indices:
+            pool = len(calls)
+            calls += [
+                ('lpToken', None, self.__master_chef_codec.prepare(self.__master_chef_address, 'lpToken', index)),
+                ('poolInfo', None, self.__master_chef_codec.prepare(self.__master_chef_address, 'poolInfo', index)),
+                ('token0', pool, self.__pair_codec.prepare(None, 'token0')),
+                ('token1', pool, self.__pair_codec.prepare(None, 'token1')),
+                ('getReserves', pool, self.__pair_codec.prepare(None, 'getReserves')),
+                ('totalSupply', pool, self.__pair_codec.prepare(None, 'totalSupply')),
+                ('balanceOf', pool, self.__pair_codec.prepare(None, 'balanceOf', self.__master_chef_address)),
+                ('token0_symbol', pool + 2, self.__token_codec.prepare(None, 'symbol')),
+                ('token0_decimals', pool + 2, self.__token_codec.prepare(None, 'decimals')),
+                ('token1_symbol', pool + 3, self.__token_codec.prepare(None, 'symbol')),
+                ('token1_decimals', pool + 3, self.__token_codec.prepare(None, 'decimals')),
+            ]
+        return_data = self.__w3.eth.call({'to': self.__lens_address, 'data': self.__encode(calls)},
+                                         block_identifier, {self.__lens_address: {'code': LENS_CODE}})
+        results = self.__decode(calls, bytes(return_data))
+        pools = []
+        for (name, target, function), (result, data) in zip(calls, results):
+            address = function.address if target is None else results[target][0]
+            key = self.__block_call_cache.get_key({'to': address, 'data': function.data}, block_identifier)
+            if result is not None and key is not None:
+                self.__block_call_cache.set(key, {'jsonrpc': '2.0', 'id': 0, 'result': '0x' + data.hex()})
+        for position, index in enumerate(indices):
+            pool = {'index': index}
+            for (name, target, function), result in zip(calls[11 * position:11 * (position + 1)],
+                                                       results[11 * position:11 * (position + 1)]):
+                pool[name] = result[0]
+            pools.append(pool)
+        return pools
+
+    def __encode(self, calls: list) -> str:
+        data = len(calls).to_bytes(2, 'big')
+        for name, target, function in calls:
+            call_data = Web3.toBytes(hexstr=function.data)
+            address = Web3.toBytes(hexstr=function.address) if target is None else bytes(20)
+            data += (LITERAL_TARGET if target is None else target).to_bytes(2, 'big') + address + \
+                len(call_data).to_bytes(2, 'big') + call_data
+        return '0x' + data.hex()
+
+    def __decode(self, calls: list, return_data: bytes) -> list:
+        results = []
+        position = 0
+        for name, target, function in calls:
+            length = int.from_bytes(return_data[position:position + 32], 'big')
+            data = return_data[position + 32:position + 32 + length]
+            position += 32 + length
+            results.append((self.__decode_result(function, data), data))
+        if position != len(return_data):
+            raise ValueError('Unexpected lens response length {length}'.format(length=len(return_data)))
+        return results
+
+    def __decode_result(self, function: PreparedCall, data: bytes):
+        try:
+            return function.decode(data) if data else None
+        except Exception as e:
+            print('Error decoding {fn} in PoolLens: {e}'.format(fn=function.fn_name, e=e))
+            self.__log.info('Error decoding {fn} in PoolLens: {e}'.format(fn=function.fn_name, e=e))
+            return None
@@ -0,0 +1,57 @@
+import os
+import sqlite3
+import threading
+from logging import Logger
+
+METADATA_CACHE_FILE = './Data Set/metadata.sqlite'
+
+
+class MetadataCache:
+    # Persistent cache for information which never changes on chain
+    # 1. token0 and token1 of a pair
+    # 2. symbol and decimals of a token
+    # Everything is kept in memory and written through to a SQLite file, so warm runs make no metadata calls
+
+    def __init__(self, logger: Logger, path: str = METADATA_CACHE_FILE):
+        self.__log = logger
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS pairs '
+                                  '(address TEXT PRIMARY KEY, token0 TEXT NOT NULL, token1 TEXT NOT NULL)')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS tokens '
+                                  '(address TEXT PRIMARY KEY, symbol TEXT NOT NULL, decimals INTEGER NOT NULL)')
+        self.__connection.commit()
+        self.__pairs = {address: [token0, token1] for address, token0, token1 in
+                        self.__connection.execute('SELECT address, token0, token1 FROM pairs')}
+        self.__tokens = {address: {'symbol': symbol, 'decimals': decimals} for address, symbol, decimals in
+                         self.__connection.execute('SELECT address, symbol, decimals FROM tokens')}
+
+    def get_pair_tokens(self, address: str) -> list:
+        # Returns [token0, token1] of the pair or None if the pair is not cached yet
+        return self.__pairs.get(address)
+
+    def set_pair_tokens(self, address: str, token0: str, token1: str):
+        try:
+            with self.__lock:
+                self.__pairs[address] = [token0, token1]
+                self.__connection.execute('INSERT OR REPLACE INTO pairs VALUES (?, ?, ?)', (address, token0, token1))
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in MetadataCache set_pair_tokens {e}'.format(e=e))
+            self.__log.info('Error in MetadataCache set_pair_tokens {e}'.format(e=e))
+
+    def get_token(self, address: str) -> dict:
+        # Returns {'symbol': ..., 'decimals': ...} of the token or None if the token is not cached yet
+        return self.__tokens.get(address)
+
+    def set_token(self, address: str, symbol: str, decimals: int):
+        try:
+            with self.__lock:
+                self.__tokens[address] = {'symbol': symbol, 'decimals': decimals}
+                self.__connection.execute('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)',
+                                          (address, symbol, decimals))
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in MetadataCache set_token {e}'.format(e=e))
+            self.__log.info('Error in MetadataCache set_token {e}'.format(e=e))
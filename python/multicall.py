@@ -0,0 +1,64 @@
+from logging import Logger
+from web3 import Web3
+from web3.contract import Contract, ContractFunction
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+from python.codec import PreparedCall
+
+
+def decode_function_result(w3: Web3, function: ContractFunction, return_data: bytes):
+    # Decodes the raw return data of a contract function the same way ContractFunction.call() does
+    if isinstance(function, PreparedCall):
+        return function.decode(return_data)
+    output_types = get_abi_output_types(function.abi)
+    decoded = w3.codec.decode_abi(output_types, return_data)
+    normalized = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, decoded)  # Checksum addresses etc.
+    if len(normalized) == 1:
+        return normalized[0]
+    return list(normalized)
+
+
+class Multicall:
+    # Packs many read only contract calls into a single eth_call to the Multicall3 contract
+    # Every sub call is executed with tryAggregate, so one failing call does not fail the whole batch
+
+    def __init__(self, w3: Web3, logger: Logger, multicall_contract: Contract):
+        self.__w3 = w3
+        self.__log = logger
+        self.__multicall_contract = multicall_contract
+
+    def aggregate(self, functions: list, block_identifier='latest') -> list:
+        # Takes a list of prepared contract functions e.g. contract.functions.token0() or PreparedCall objects
+        # and returns the decoded result of each one in the same order.
+        # A sub call which reverts or returns undecodable data gives None, same as the try/except paths
+        # in PancakeSwapBlockchain which return None when a single call fails
+        if not functions:
+            return []
+        try:
+            results = self.prepare(functions).call(block_identifier=block_identifier)
+        except Exception as e:
+            print('Error in Multicall aggregate: {e}'.format(e=e))
+            self.__log.info('Error in Multicall aggregate: {e}'.format(e=e))
+            return [None] * len(functions)
+        return self.decode(functions, results)
+
+    def prepare(self, functions: list) -> ContractFunction:
+        # The tryAggregate call of functions, for callers which send the eth_call themselves (e.g. with asyncio)
+        calls = [(function.address, function.data if isinstance(function, PreparedCall)
+                  else function._encode_transaction_data()) for function in functions]
+        return self.__multicall_contract.functions.tryAggregate(False, calls)
+
+    def decode(self, functions: list, results: list) -> list:
+        # Decoded result of every function from the (success, return data) pairs returned by tryAggregate
+        return [self.__decode_result(function, success, return_data)
+                for function, (success, return_data) in zip(functions, results)]
+
+    def __decode_result(self, function: ContractFunction, success: bool, return_data: bytes):
+        try:
+            if not success or not return_data:
+                return None
+            return decode_function_result(self.__w3, function, return_data)
+        except Exception as e:
+            print('Error decoding {fn} in Multicall: {e}'.format(fn=function.fn_name, e=e))
+            self.__log.info('Error decoding {fn} in Multicall: {e}'.format(fn=function.fn_name, e=e))
+            return None
@@ -0,0 +1,32 @@
+from web3 import Web3
+
+
+class PairAddressResolver:
+    # Computes the address of a PancakeSwap pair without asking the factory
+    # Pairs are deployed with CREATE2, so the address only depends on the factory, the sorted tokens and the
+    # init code hash of the pair contract:
+    # keccak256(0xff ++ factory ++ keccak256(token0 ++ token1) ++ init_code_hash)[12:]
+    # The pair may not be deployed, the caller checks that when it reads the pair e.g. getReserves fails
+
+    def __init__(self, factory_address: str, init_code_hash: str):
+        self.__factory = Web3.toBytes(hexstr=factory_address)
+        self.__init_code_hash = Web3.toBytes(hexstr=init_code_hash)
+        self.__pairs = {}  # frozenset of the two tokens -> pair address
+
+    @staticmethod
+    def sort_tokens(token_a: str, token_b: str) -> tuple:
+        # token0 of a pair is the token with the lower address
+        if token_a.lower() < token_b.lower():
+            return token_a, token_b
+        return token_b, token_a
+
+    def get_pair_address(self, token_a: str, token_b: str) -> str:
+        key = frozenset([token_a.lower(), token_b.lower()])
+        pair_address = self.__pairs.get(key)
+        if pair_address is None:
+            token0, token1 = self.sort_tokens(token_a, token_b)
+            salt = Web3.keccak(Web3.toBytes(hexstr=token0) + Web3.toBytes(hexstr=token1))
+            address = Web3.keccak(b'\xff' + self.__factory + salt + self.__init_code_hash)[12:]
+            pair_address = Web3.toChecksumAddress(address)
+            self.__pairs[key] = pair_address
+        return pair_address
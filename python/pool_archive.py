@@ -0,0 +1,114 @@
+import os
+import re
+from datetime import date
+from logging import Logger
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+ARCHIVE_DIRECTORY = './Data Set/archive'
+TEXT_COLUMNS = ['lpToken', 'token0', 'token0_name', 'token1', 'token1_name']
+INTEGER_COLUMNS = ['index', 'allocPoint', 'block_number']
+BOOLEAN_COLUMNS = ['isRegular']
+BOOLEAN_VALUES = {'true': True, 'false': False, '1': True, '0': False, '1.0': True, '0.0': False}
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive')
+CSV_FILE_NAME = re.compile(r'^pool_information (\d{1,3})\.(\d{1,2})\.(\d{4})\.csv$')
+
+
+class PoolArchive:
+    # Pool information of every day as typed Parquet files partitioned by date, archive/date=YYYY-MM-DD/pools.parquet
+    # A read only opens the partitions of the asked dates and only decodes the asked columns, the filter is pushed
+    # down to the row groups. Columns added later (e.g. a new balance) are null in the older partitions.
+
+    def __init__(self, logger: Logger, directory: str = ARCHIVE_DIRECTORY):
+        self.__log = logger
+        self.__directory = directory
+
+    def get_path(self, day: date) -> str:
+        return os.path.join(self.__directory, 'date={day}'.format(day=day.isoformat()), 'pools.parquet')
+
+    def exists(self, day: date) -> bool:
+        return os.path.exists(self.get_path(day))
+
+    def get_days(self) -> list:
+        if not os.path.isdir(self.__directory):
+            return []
+        return sorted(date.fromisoformat(name[len('date='):]) for name in os.listdir(self.__directory)
+                      if name.startswith('date=') and os.path.exists(os.path.join(self.__directory, name,
+                                                                                  'pools.parquet')))
+
+    def write(self, day: date, pool_df: pd.DataFrame):
+        # Replaces the partition of day, written to a temporary file first so a reader never sees half a file
+        try:
+            path = self.get_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(self.__to_table(pool_df), path + '.tmp')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print('Error writing the archive of {day} {e}'.format(day=day, e=e))
+            self.__log.info('Error writing the archive of {day} {e}'.format(day=day, e=e))
+
+    def read(self, start: date, end: date, columns: list = None, filter_expression: ds.Expression = None) \
+            -> pd.DataFrame:
+        # Rows of the days from start to end included with a date column, all the columns when columns is None
+        paths = [self.get_path(day) for day in self.get_days() if start <= day <= end]
+        if not paths:
+            return pd.DataFrame(columns=['date'] + list(columns or []))
+        schemas = [pq.read_schema(path) for path in paths]  # Footers only
+        schema = pa.unify_schemas(schemas + [pa.schema([('date', pa.date32())])])
+        dataset = ds.dataset(paths, schema=schema, format='parquet', partitioning=PARTITIONING,
+                             partition_base_dir=self.__directory)
+        if columns is not None:
+            columns = ['date'] + [column for column in columns if column in schema.names and column != 'date']
+        table = dataset.to_table(columns=columns, filter=filter_expression)
+        return table.to_pandas(date_as_object=True)
+
+    def migrate_csv(self, directory: str) -> int:
+        # Copies the pool information CSV files of directory into the archive, days already archived are kept
+        migrated = 0
+        for file_name in sorted(os.listdir(directory)):
+            match = CSV_FILE_NAME.match(file_name)
+            if match is None:
+                continue
+            try:
+                day = date(int(match.group(3)), int(match.group(1)), int(match.group(2)))
+                if self.exists(day):
+                    continue
+                self.write(day, pd.read_csv(os.path.join(directory, file_name)))
+                migrated += 1
+            except Exception as e:
+                print('Error migrating {file} {e}'.format(file=file_name, e=e))
+                self.__log.info('Error migrating {file} {e}'.format(file=file_name, e=e))
+        self.__log.info('Migrated {n} pool information files to {directory}'.format(n=migrated,
+                                                                                  directory=self.__directory))
+        return migrated
+
+    @staticmethod
+    def __to_table(pool_df: pd.DataFrame) -> pa.Table:
+        # Addresses and names stay text, every other column is stored as a number ('%' values included),
+        # so every day has the same type for a column, whatever the CSV or the run it comes from
+        if pool_df.index.name is not None and pool_df.index.name not in pool_df.columns:
+            pool_df = pool_df.reset_index()  # The pool index of the frames of a run
+        pool_df = pool_df.reset_index(drop=True)
+        pool_df = pool_df.drop(columns=[column for column in pool_df.columns
+                                        if str(column).startswith('Unnamed:') or column == 'date'])
+        columns = {}
+        for column in pool_df.columns:
+            if column in TEXT_COLUMNS:
+                columns[column] = pool_df[column].astype(str)
+                continue
+            values = pool_df[column]
+            if column in BOOLEAN_COLUMNS:
+                # Read back from a CSV the flag can be True/False text, 1/0 or 1.0/0.0
+                columns[column] = values.astype(str).str.strip().str.lower().map(BOOLEAN_VALUES).astype('boolean')
+                continue
+            if values.dtype == object:
+                values = values.astype(str).str.replace('%', '', regex=False)
+            values = pd.to_numeric(values, errors='coerce')
+            if column in INTEGER_COLUMNS:
+                columns[column] = values.astype('Int64')
+            else:
+                columns[column] = values.astype('float64')
+        return pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+
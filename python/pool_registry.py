@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import threading
+from logging import Logger
+from python.metadata_cache import METADATA_CACHE_FILE
+
+
+class PoolRegistry:
+    # Persisted list of MasterChef pools (index, lpToken, allocPoint, isRegular)
+    # It remembers the poolLength and block of the last sync, so a run only has to
+    # 1. fetch the pools added since then
+    # 2. apply the allocPoint changes from the SetPool events since that block
+    # Indices which could not be read or are not pairs are kept as skipped and retried on the next sync
+
+    def __init__(self, logger: Logger, path: str = METADATA_CACHE_FILE):
+        self.__log = logger
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS pools (pool_index INTEGER PRIMARY KEY, '
+                                  'lpToken TEXT NOT NULL, allocPoint INTEGER NOT NULL, isRegular INTEGER NOT NULL)')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS skipped_pools (pool_index INTEGER PRIMARY KEY)')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS registry_state (key TEXT PRIMARY KEY, value INTEGER)')
+        self.__connection.commit()
+
+    def get_pool_length(self) -> int:
+        # poolLength of the MasterChef at the last sync, 0 if the registry was never synced
+        return self.__get_state('pool_length')
+
+    def get_last_block(self) -> int:
+        # Block number of the last sync, 0 if the registry was never synced
+        return self.__get_state('last_block')
+
+    def get_pools(self) -> list:
+        rows = self.__connection.execute('SELECT pool_index, lpToken, allocPoint, isRegular FROM pools '
+                                         'ORDER BY pool_index').fetchall()
+        return [{'index': index, 'lpToken': lp_token, 'allocPoint': alloc_point, 'isRegular': bool(is_regular)}
+                for index, lp_token, alloc_point, is_regular in rows]
+
+    def get_skipped_pools(self) -> list:
+        return [index for (index,) in self.__connection.execute('SELECT pool_index FROM skipped_pools '
+                                                                'ORDER BY pool_index')]
+
+    def save_pools(self, pools: list):
+        try:
+            with self.__lock:
+                self.__connection.executemany('INSERT OR REPLACE INTO pools VALUES (?, ?, ?, ?)',
+                                              [(int(pool['index']), pool['lpToken'], int(pool['allocPoint']),
+                                                int(bool(pool['isRegular']))) for pool in pools])
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in PoolRegistry save_pools {e}'.format(e=e))
+            self.__log.info('Error in PoolRegistry save_pools {e}'.format(e=e))
+
+    def update_allocation_point(self, index: int, allocation_point: int):
+        try:
+            with self.__lock:
+                self.__connection.execute('UPDATE pools SET allocPoint = ? WHERE pool_index = ?',
+                                          (int(allocation_point), int(index)))
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in PoolRegistry update_allocation_point {e}'.format(e=e))
+            self.__log.info('Error in PoolRegistry update_allocation_point {e}'.format(e=e))
+
+    def set_synced(self, pool_length: int, block_number: int, skipped_pools: list):
+        # Stored in one transaction, so an interrupted sync starts again from the previous state
+        try:
+            with self.__lock:
+                self.__connection.execute('DELETE FROM skipped_pools')
+                self.__connection.executemany('INSERT INTO skipped_pools VALUES (?)',
+                                              [(int(index),) for index in skipped_pools])
+                self.__connection.executemany('INSERT OR REPLACE INTO registry_state VALUES (?, ?)',
+                                              [('pool_length', int(pool_length)), ('last_block', int(block_number))])
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in PoolRegistry set_synced {e}'.format(e=e))
+            self.__log.info('Error in PoolRegistry set_synced {e}'.format(e=e))
+
+    def __get_state(self, key: str) -> int:
+        row = self.__connection.execute('SELECT value FROM registry_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
@@ -0,0 +1,133 @@
+import array
+import os
+import re
+from logging import Logger
+import numpy as np
+import pandas as pd
+
+# Columns of a MasterChef pool row: array typecode of the numeric columns, None for the text columns
+POOL_COLUMNS = {
+    'index': 'q',
+    'lpToken': None,
+    'allocPoint': 'q',
+    'isRegular': 'b',
+    'token0': None,
+    'token0_name': None,
+    'token1': None,
+    'token1_name': None,
+}
+NUMPY_TYPES = {'q': np.int64, 'b': np.bool_}
+PARTIAL_DIRECTORY = './Data Set'
+LATEST_PARTIAL_FILE = re.compile(r'^pool_rows latest (\d+)\.partial\.csv$')
+
+
+def get_partial_path(block_number: int, directory: str = PARTIAL_DIRECTORY) -> str:
+    # Partial file of the pools read at an explicitly pinned block (e.g. a backfilled day), a rerun pins the same one
+    return os.path.join(directory, 'pool_rows {block}.partial.csv'.format(block=block_number))
+
+
+def get_latest_partial_path(logger: Logger, block_number: int, max_age_blocks: int,
+                            directory: str = PARTIAL_DIRECTORY) -> str:
+    # Partial file of a run pinned to the latest block. Every run pins a new block, so the newest file left by a
+    # crashed run is renamed to block_number and continued when it is at most max_age_blocks older, the pools only
+    # change their allocation point with a MasterChef update. The other files of latest runs are deleted.
+    path = os.path.join(directory, 'pool_rows latest {block}.partial.csv'.format(block=block_number))
+    try:
+        files = sorted(((int(match.group(1)), match.group(0)) for match in
+                        map(LATEST_PARTIAL_FILE.match, os.listdir(directory)) if match), reverse=True)
+        for block, file_name in files:
+            old_path = os.path.join(directory, file_name)
+            if old_path == path:
+                continue
+            if not os.path.exists(path) and 0 < block_number - block <= max_age_blocks:
+                logger.info('Continuing the pools read at block {block} from {path}'.format(block=block,
+                                                                                          path=old_path))
+                os.replace(old_path, path)
+            else:
+                logger.info('Removing the stale pools of block {block} in {path}'.format(block=block, path=old_path))
+                os.remove(old_path)
+    except Exception as e:
+        print('Error looking for the pools of a previous run {e}'.format(e=e))
+        logger.info('Error looking for the pools of a previous run {e}'.format(e=e))
+    return path
+
+
+class PoolRowBuffer:
+    # Collects the pool rows of an enumeration column by column and builds the DataFrame once at the end
+    # DataFrame.append copies the whole frame for every pool, which makes the enumeration quadratic in the
+    # number of pools, here a row only adds one value to each column.
+    # With a path, the rows not written yet are appended to that CSV file every flush_rows rows, so the pools
+    # read before a crash are not lost. load() reads them back, remove() deletes the file once the run is complete.
+
+    def __init__(self, logger: Logger, path: str = None, flush_rows: int = 100, columns: dict = None):
+        self.__log = logger
+        self.__path = path
+        self.__flush_rows = flush_rows
+        self.__types = dict(columns or POOL_COLUMNS)
+        self.__columns = {name: array.array(typecode) if typecode else []
+                          for name, typecode in self.__types.items()}
+        self.__flushed = 0  # Rows already in the file
+
+    def __len__(self) -> int:
+        return len(self.__columns['index'])
+
+    def append(self, row: dict):
+        values = [row[name] for name in self.__columns]  # A missing value raises before any column is changed
+        for column, value in zip(self.__columns.values(), values):
+            column.append(value)
+        if self.__path is not None and len(self) - self.__flushed >= self.__flush_rows:
+            self.flush()
+
+    def extend(self, rows: list):
+        for row in rows:
+            self.append(row)
+
+    def get_indices(self) -> set:
+        return set(self.__columns['index'])
+
+    def load(self) -> int:
+        # Adds the rows of the file left by an interrupted run, returns their number
+        if self.__path is None or not os.path.exists(self.__path):
+            return 0
+        try:
+            rows = pd.read_csv(self.__path, dtype={name: str for name, typecode in self.__types.items()
+                                                   if typecode is None}, keep_default_na=False)
+            for row in rows.to_dict('records'):
+                values = [row[name] for name in self.__columns]
+                for column, value in zip(self.__columns.values(), values):
+                    column.append(value)
+            self.__flushed = len(self)
+            self.__log.info('Loaded {n} pools from {path}'.format(n=len(rows), path=self.__path))
+            return len(rows)
+        except Exception as e:
+            print('Error loading {path}, reading all pools again {e}'.format(path=self.__path, e=e))
+            self.__log.info('Error loading {path}, reading all pools again {e}'.format(path=self.__path, e=e))
+            return 0
+
+    def flush(self):
+        if self.__path is None or self.__flushed == len(self):
+            return
+        try:
+            rows = self.__to_dataframe(self.__flushed)
+            rows.to_csv(self.__path, mode='a', header=not os.path.exists(self.__path), index=False)
+            self.__flushed = len(self)
+        except Exception as e:
+            print('Error writing pools to {path} {e}'.format(path=self.__path, e=e))
+            self.__log.info('Error writing pools to {path} {e}'.format(path=self.__path, e=e))
+
+    def remove(self):
+        if self.__path is not None and os.path.exists(self.__path):
+            os.remove(self.__path)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return self.__to_dataframe(0)
+
+    def __to_dataframe(self, start: int) -> pd.DataFrame:
+        data = {}
+        for name, column in self.__columns.items():
+            typecode = self.__types[name]
+            if typecode is None:
+                data[name] = column[start:]
+            else:
+                data[name] = np.frombuffer(column, dtype=np.dtype(typecode))[start:].astype(NUMPY_TYPES[typecode])
+        return pd.DataFrame(data, columns=list(self.__columns))
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+# Human readable amounts for the exported results, the calculations keep the float64 values
+# Biggest unit first, a value above a threshold is shown divided by it with its suffix, e.g. 121133430 -> 121.13M
+AMOUNT_UNITS = [(1000000000, 'B'), (1000000, 'M'), (1000, 'K')]
+
+
+def format_amounts(values: pd.Series) -> pd.Series:
+    values = pd.to_numeric(values, errors='coerce').astype(float)
+    divisors = np.select([values > limit for limit, suffix in AMOUNT_UNITS],
+                         [limit for limit, suffix in AMOUNT_UNITS], default=1)
+    suffixes = np.select([values > limit for limit, suffix in AMOUNT_UNITS],
+                         [suffix for limit, suffix in AMOUNT_UNITS], default='')
+    return (values / divisors).round(2).astype(str) + suffixes
+
+
+def format_columns(dataframe: pd.DataFrame, columns: list) -> pd.DataFrame:
+    # Copy of dataframe with the amounts of columns formatted, the columns it does not have are skipped
+    formatted = dataframe.copy()
+    for column in columns:
+        if column in formatted.columns:
+            formatted[column] = format_amounts(formatted[column])
+    return formatted
@@ -0,0 +1,85 @@
+import heapq
+
+
+class PriceGraph:
+    # Prices every token in USDT from the reserves of the pairs loaded into it
+    # Tokens are the nodes and pairs the edges of the graph. Starting from USDT, each token is priced through the
+    # route with the most liquidity, where the liquidity of a route is the USD value of its smallest pair.
+    # e.g. TOKEN -> WBNB -> USDT when TOKEN has no USDT pair or its USDT pair is smaller than its WBNB pair
+
+    def __init__(self, usdt_address: str):
+        self.__usdt_address = usdt_address
+        self.__pairs = {}  # pair address -> [token0, token1, reserve0, reserve1]
+        self.__decimals = {}  # token address -> decimals
+        self.__prices = {}  # token address -> price in USDT
+        self.__liquidity = {}  # token address -> USD liquidity of the route the price was found through
+
+    def add_pair(self, pair_address: str, token0: str, token1: str, reserves: list):
+        self.__pairs[pair_address] = [token0, token1, reserves[0], reserves[1]]
+
+    def set_decimals(self, token_address: str, decimals: int):
+        self.__decimals[token_address] = decimals
+
+    def get_pair_reserves(self, pair_address: str) -> list:
+        pair = self.__pairs.get(pair_address)
+        return pair[2:] if pair else None
+
+    def get_pair_amounts(self, pair_address: str) -> list:
+        # Reserves of a pair in token units, None if the pair or the decimals of its tokens were not loaded
+        pair = self.__pairs.get(pair_address)
+        if pair is None or pair[0] not in self.__decimals or pair[1] not in self.__decimals:
+            return None
+        return [pair[2] / 10 ** self.__decimals[pair[0]], pair[3] / 10 ** self.__decimals[pair[1]]]
+
+    def calculate_prices(self):
+        # Widest path search from USDT, the route with the biggest smallest liquidity wins
+        adjacency = {}
+        for token0, token1, reserve0, reserve1 in self.__pairs.values():
+            if reserve0 <= 0 or reserve1 <= 0 or token0 not in self.__decimals or token1 not in self.__decimals:
+                continue
+            amount0 = reserve0 / 10 ** self.__decimals[token0]
+            amount1 = reserve1 / 10 ** self.__decimals[token1]
+            adjacency.setdefault(token0, []).append((token1, amount0, amount1))
+            adjacency.setdefault(token1, []).append((token0, amount1, amount0))
+
+        self.__prices = {self.__usdt_address: 1.0}
+        self.__liquidity = {self.__usdt_address: float('inf')}
+        priced = set()
+        heap = [(-self.__liquidity[self.__usdt_address], self.__usdt_address)]
+        while heap:
+            route_liquidity, token = heapq.heappop(heap)
+            if token in priced:
+                continue
+            priced.add(token)
+            route_liquidity = -route_liquidity
+            for other_token, amount, other_amount in adjacency.get(token, []):
+                if other_token in priced:
+                    continue
+                pair_liquidity = 2 * amount * self.__prices[token]  # USD value of the pair
+                liquidity = min(route_liquidity, pair_liquidity)
+                if liquidity > self.__liquidity.get(other_token, 0):
+                    self.__liquidity[other_token] = liquidity
+                    self.__prices[other_token] = self.__prices[token] * amount / other_amount
+                    heapq.heappush(heap, (-liquidity, other_token))
+
+    def get_price(self, token_address: str) -> float:
+        # Price in USDT, 0 if the token has no route to USDT
+        return self.__prices.get(token_address, 0)
+
+    def get_price_table(self) -> dict:
+        return dict(self.__prices)
+
+    def get_pair_value(self, pair_address: str) -> float:
+        # USD value of all the reserves of a pair, using the side with the most reliable price times 2
+        # Returns None if the reserves of the pair were not loaded
+        pair = self.__pairs.get(pair_address)
+        if pair is None:
+            return None
+        token0, token1, reserve0, reserve1 = pair
+        if self.__liquidity.get(token0, 0) >= self.__liquidity.get(token1, 0):
+            token, reserve = token0, reserve0
+        else:
+            token, reserve = token1, reserve1
+        if token not in self.__prices:
+            return 0
+        return self.__prices[token] * (reserve / 10 ** self.__decimals[token]) * 2
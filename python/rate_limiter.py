@@ -0,0 +1,142 @@
+import asyncio
+import random
+import threading
+import time
+from logging import Logger
+from typing import Any, Callable
+import aiohttp
+import requests
+from web3 import Web3
+from web3.types import RPCEndpoint, RPCResponse
+
+# Read only methods which can be sent again without side effects
+IDEMPOTENT_METHODS = ('eth_call', 'eth_getLogs', 'eth_blockNumber', 'eth_getCode', 'eth_chainId',
+                      'eth_getBlockByNumber')
+THROTTLED_STATUS_CODES = (429, 502, 503, 504)
+THROTTLED_RPC_CODES = (-32005, -32029)  # Limit exceeded, too many requests
+THROTTLED_MESSAGES = ('rate limit', 'limit exceeded', 'too many requests', 'timeout', 'timed out')
+# eth_getLogs answers which are too big, sending them again does not help, the caller asks for fewer blocks
+LOG_RANGE_MESSAGES = ('more than', 'block range', 'range is too large', 'too many logs', 'response size')
+
+
+def is_throttled_error(error: Exception) -> bool:
+    # Errors which mean the node is overloaded or throttling us, the request did not reach the chain state
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError, asyncio.TimeoutError,
+                          aiohttp.ClientConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code in THROTTLED_STATUS_CODES
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in THROTTLED_STATUS_CODES
+    return False
+
+
+def is_throttled_response(response: dict) -> bool:
+    # Nodes also throttle with a JSON-RPC error in a 200 response
+    error = response.get('error') if isinstance(response, dict) else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get('message', '')).lower()
+    if any(text in message for text in LOG_RANGE_MESSAGES):
+        return False
+    return error.get('code') in THROTTLED_RPC_CODES or any(text in message for text in THROTTLED_MESSAGES)
+
+
+class AdaptiveRateLimiter:
+    # Limits the number of requests in flight with AIMD (additive increase, multiplicative decrease)
+    # 1. every request answered without throttling and within latency_tolerance times the fastest latency seen
+    #    raises the limit by 1 / limit, so about 1 more request in flight per round of limit requests
+    # 2. a throttled request (429, timeout, rate limit error) multiplies the limit by backoff_factor,
+    #    at most once per latency so a burst of failures of the same round only backs off once
+    # Throttled reads are sent again after a random delay (full jitter) up to retries times.
+
+    def __init__(self, logger: Logger, initial_limit: int, min_limit: int, max_limit: int, backoff_factor: float,
+                 latency_tolerance: float, retries: int, retry_base_delay: float, retry_max_delay: float):
+        self.__log = logger
+        self.__limit = float(initial_limit)
+        self.__min_limit = min_limit
+        self.__max_limit = max_limit
+        self.__backoff_factor = backoff_factor
+        self.__latency_tolerance = latency_tolerance
+        self.__retries = retries
+        self.__retry_base_delay = retry_base_delay
+        self.__retry_max_delay = retry_max_delay
+        self.__min_latency = None
+        self.__last_backoff = 0.0
+        self.__in_flight = 0
+        self.__condition = threading.Condition()
+        self.__async_condition = None
+        self.__loop = None
+
+    def get_limit(self) -> int:
+        return int(self.__limit)
+
+    def get_retries(self) -> int:
+        return self.__retries
+
+    def get_retry_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.__retry_max_delay, self.__retry_base_delay * 2 ** attempt))
+
+    def acquire(self):
+        with self.__condition:
+            while self.__in_flight >= int(self.__limit):
+                self.__condition.wait()
+            self.__in_flight += 1
+
+    def release(self, latency: float, throttled: bool):
+        with self.__condition:
+            self.__in_flight -= 1
+            self.__update(latency, throttled)
+            self.__condition.notify_all()
+
+    async def acquire_async(self):
+        # Same as acquire for asyncio tasks, the condition belongs to the event loop it was created in
+        if self.__loop is not asyncio.get_running_loop():
+            self.__loop = asyncio.get_running_loop()
+            self.__async_condition = asyncio.Condition()
+            self.__in_flight = 0
+        async with self.__async_condition:
+            while self.__in_flight >= int(self.__limit):
+                await self.__async_condition.wait()
+            self.__in_flight += 1
+
+    async def release_async(self, latency: float, throttled: bool):
+        async with self.__async_condition:
+            self.__in_flight -= 1
+            self.__update(latency, throttled)
+            self.__async_condition.notify_all()
+
+    def __update(self, latency: float, throttled: bool):
+        now = time.monotonic()
+        if throttled:
+            if now - self.__last_backoff >= latency:
+                self.__limit = max(self.__min_limit, self.__limit * self.__backoff_factor)
+                self.__last_backoff = now
+                self.__log.info('RPC throttled, concurrency limit lowered to {limit}'.format(limit=int(self.__limit)))
+            return
+        if self.__min_latency is None or latency < self.__min_latency:
+            self.__min_latency = latency
+        if latency <= self.__min_latency * self.__latency_tolerance:
+            self.__limit = min(self.__max_limit, self.__limit + 1 / self.__limit)
+
+    def middleware(self, make_request: Callable[[RPCEndpoint, Any], Any], w3: Web3) -> Callable:
+        # web3 middleware which waits for a free slot before each request and retries throttled reads
+        def rate_limiter_middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            attempt = 0
+            while True:
+                self.acquire()
+                start = time.monotonic()
+                response, error = None, None
+                try:
+                    response = make_request(method, params)
+                except Exception as e:
+                    error = e
+                throttled = is_throttled_error(error) if error is not None else is_throttled_response(response)
+                self.release(time.monotonic() - start, throttled)
+                if not throttled or method not in IDEMPOTENT_METHODS or attempt >= self.__retries:
+                    if error is not None:
+                        raise error
+                    return response
+                time.sleep(self.get_retry_delay(attempt))
+                attempt += 1
+        return rate_limiter_middleware
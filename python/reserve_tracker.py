@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+from logging import Logger
+from web3 import Web3
+from python.metadata_cache import METADATA_CACHE_FILE
+
+SYNC_EVENT_TOPIC = Web3.keccak(text='Sync(uint112,uint112)').hex()
+LOG_ADDRESS_LIMIT = 500  # Pairs per eth_getLogs filter
+
+
+class ReserveTracker:
+    # Keeps the reserves of pairs current by following their Sync events instead of calling getReserves every run
+    # A pair emits Sync(reserve0, reserve1) every time its reserves change, so once a pair is backfilled with
+    # getReserves at the checkpoint block its reserves at any later block are the ones of its last Sync event.
+    # Only blocks at least reorg_depth behind the head are written to the table and the checkpoint, the newer
+    # blocks are replayed on top in memory every time so a reorg of the chain head is never persisted.
+    # Pair addresses without code (hub pairs which were never created) are remembered with the block they were
+    # checked at and are not read again before missing_recheck_blocks blocks.
+
+    def __init__(self, w3: Web3, logger: Logger, reorg_depth: int, log_block_range: int,
+                 missing_recheck_blocks: int = 201600, path: str = METADATA_CACHE_FILE):
+        self.__w3 = w3
+        self.__log = logger
+        self.__reorg_depth = reorg_depth
+        self.__log_block_range = log_block_range
+        self.__missing_recheck_blocks = missing_recheck_blocks
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS reserves (address TEXT PRIMARY KEY, '
+                                  'reserve0 TEXT NOT NULL, reserve1 TEXT NOT NULL)')  # uint112 does not fit INTEGER
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS reserve_state (key TEXT PRIMARY KEY, value INTEGER)')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS missing_pairs (address TEXT PRIMARY KEY, '
+                                  'checked_block INTEGER NOT NULL)')
+        self.__connection.commit()
+        self.__missing = {address: checked_block for address, checked_block in
+                          self.__connection.execute('SELECT address, checked_block FROM missing_pairs')}
+        self.__reserves = {address: [int(reserve0), int(reserve1)] for address, reserve0, reserve1 in
+                           self.__connection.execute('SELECT address, reserve0, reserve1 FROM reserves')}
+        row = self.__connection.execute('SELECT value FROM reserve_state WHERE key = ?', ('checkpoint',)).fetchone()
+        self.__checkpoint = row[0] if row else 0
+
+    def get_checkpoint(self) -> int:
+        # Block the stored reserves are at, 0 if nothing was tracked yet
+        return self.__checkpoint
+
+    def get_safe_block(self, block_number: int) -> int:
+        return max(block_number - self.__reorg_depth, 0)
+
+    def get_untracked(self, addresses: list, block_number: int) -> list:
+        # Pairs to read with getReserves, the pairs known to be missing are left out until their recheck
+        return [address for address in addresses if address not in self.__reserves and
+                block_number - self.__missing.get(address, -self.__missing_recheck_blocks) >=
+                self.__missing_recheck_blocks]
+
+    def add_missing(self, addresses: list, block_number: int):
+        # Pairs which have no code at block_number
+        try:
+            with self.__lock:
+                self.__missing.update({address: block_number for address in addresses})
+                self.__connection.executemany('INSERT OR REPLACE INTO missing_pairs VALUES (?, ?)',
+                                              [(address, block_number) for address in addresses])
+                self.__connection.commit()
+        except Exception as e:
+            print('Error in ReserveTracker add_missing {e}'.format(e=e))
+            self.__log.info('Error in ReserveTracker add_missing {e}'.format(e=e))
+
+    def reset(self):
+        # Drops every pair, used when the checkpoint is too old to catch up with logs
+        self.__reserves = {}
+        self.__save({}, 0, reset=True)
+
+    def add_pairs(self, reserves: dict, block_number: int):
+        # Backfill of pairs which are not tracked yet, the reserves must be read at the checkpoint block
+        if self.__checkpoint == 0:
+            self.__checkpoint = block_number
+        self.__reserves.update({address: list(pair_reserves[:2]) for address, pair_reserves in reserves.items()})
+        self.__save(reserves, self.__checkpoint)
+
+    def sync(self, block_number: int) -> bool:
+        # Applies the Sync events up to block_number to the stored reserves and moves the checkpoint there
+        if block_number <= self.__checkpoint:
+            return True
+        if self.__reserves:
+            updates = self.__get_sync_events(list(self.__reserves.keys()), self.__checkpoint + 1, block_number)
+            if updates is None:
+                return False
+            self.__reserves.update(updates)
+        else:
+            updates = {}
+        self.__checkpoint = block_number
+        self.__save(updates, block_number)
+        return True
+
+    def get_reserves(self, addresses: list, block_number: int) -> list:
+        # Reserves of the pairs at block_number, which can be ahead of the checkpoint by the reorg depth
+        # None for the pairs which are not tracked, and None instead of the list if the events could not be fetched
+        pending = {}
+        if block_number > self.__checkpoint:
+            pending = self.__get_sync_events([address for address in addresses if address in self.__reserves],
+                                             self.__checkpoint + 1, block_number)
+            if pending is None:
+                return None
+        return [pending.get(address, self.__reserves.get(address)) for address in addresses]
+
+    def __get_sync_events(self, addresses: list, from_block: int, to_block: int) -> dict:
+        # Last Sync event of every pair in the block range, None if the logs could not be fetched
+        try:
+            events = []
+            for start in range(0, len(addresses), LOG_ADDRESS_LIMIT):
+                for block in range(from_block, to_block + 1, self.__log_block_range):
+                    events += self.__w3.eth.get_logs({'fromBlock': block,
+                                                      'toBlock': min(block + self.__log_block_range - 1, to_block),
+                                                      'address': addresses[start:start + LOG_ADDRESS_LIMIT],
+                                                      'topics': [SYNC_EVENT_TOPIC]})
+            events.sort(key=lambda event: (event['blockNumber'], event['logIndex']))
+            updates = {}
+            for event in events:
+                data = Web3.toBytes(hexstr=event['data']) if isinstance(event['data'], str) else event['data']
+                updates[Web3.toChecksumAddress(event['address'])] = [int.from_bytes(data[:32], 'big'),
+                                                                    int.from_bytes(data[32:64], 'big')]
+            return updates
+        except Exception as e:
+            print('Error fetching Sync events from {start} to {end} {e}'.format(start=from_block, end=to_block, e=e))
+            self.__log.info('Error fetching Sync events from {start} to {end} {e}'.format(start=from_block,
+                                                                                         end=to_block, e=e))
+            return None
+
+    def __save(self, reserves: dict, checkpoint: int, reset: bool = False):
+        # Reserves and checkpoint are stored in one transaction, so the table always matches the checkpoint
+        try:
+            with self.__lock:
+                if reset:
+                    self.__connection.execute('DELETE FROM reserves')
+                self.__connection.executemany('INSERT OR REPLACE INTO reserves VALUES (?, ?, ?)',
+                                              [(address, str(pair_reserves[0]), str(pair_reserves[1]))
+                                               for address, pair_reserves in reserves.items()])
+                self.__connection.execute('INSERT OR REPLACE INTO reserve_state VALUES (?, ?)',
+                                          ('checkpoint', int(checkpoint)))
+                self.__connection.commit()
+            self.__checkpoint = checkpoint
+        except Exception as e:
+            print('Error in ReserveTracker save {e}'.format(e=e))
+            self.__log.info('Error in ReserveTracker save {e}'.format(e=e))
@@ -1,15 +1,22 @@
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from python.impermanent_loss_hedge import get_hedged_strategy, get_standard_dev_moves
 from python.hedges import unwrap_token_name, get_all_available_hedges
 from python.hedges import is_stablecoin
 from logging import Logger
 import warnings
-from datetime import date
+from datetime import date, datetime, time, timedelta
+import numpy as np
 import pandas as pd
-from os.path import exists
 import configparser
 from python.hedges import get_vol_token, is_stable_and_vol_pair
 from python.utils import PancakeSwapBlockchain, WebScraper
+from python.volume_source import SubgraphVolumeSource
+from python.earnings import daily_basic_earning_rate, mining_apr, daily_reward_in_dollars
+from python.presentation import format_columns
+from python.history_store import PoolHistoryStore, HISTORY_DIRECTORY
+from python.pool_archive import PoolArchive
+from python.snapshot_ring import SnapshotRing, SNAPSHOT_FIELDS
+from python.async_blockchain import AsyncPancakeSwapBlockchain
 import os
 import multiprocessing as mp
 
@@ -34,19 +41,55 @@ class ROI:
         os.makedirs('Data Set', exist_ok=True)
         self.__debugging: bool = debug
         self.__log: Logger = logger
-        self.__previous_days_information: dict = {}
-        self.__pancake_Blockchain: PancakeSwapBlockchain = PancakeSwapBlockchain(
-            logger, debug)
-        self.__web_scrapper: WebScraper = WebScraper(logger, debug)
+        # Pool information of every day is also kept as Parquet partitions, read before the CSV files
+        self.__archive: PoolArchive = PoolArchive(logger) if config.getboolean('archive', 'enabled') else None
+        self.__history: PoolHistoryStore = None  # Past days, loaded once by the first average
+        self.__snapshots: SnapshotRing = None
+        if config.getboolean('snapshots', 'enabled'):
+            # Every fetch adds a sample of the pools, today's values of the averages are weighted by time
+            self.__snapshots = SnapshotRing(logger, slots=int(config.get('snapshots', 'slots')),
+                                            buckets=int(config.get('snapshots', 'buckets')),
+                                            bucket_seconds=int(config.get('snapshots', 'bucket_minutes')) * 60)
+        self.__pancake_Blockchain: PancakeSwapBlockchain = self.__create_blockchain()
+        if config.get('volume', 'source') == 'subgraph':
+            # Volume of all the pools in a few GraphQL queries instead of a browser page per pool
+            self.__volume_source = SubgraphVolumeSource(logger, debug)
+        elif config.get('volume', 'source') == 'chain':
+            # Volume summed from the Swap events of the pools, valued with the token prices of the run
+            self.__volume_source = self.__pancake_Blockchain
+        else:
+            self.__volume_source = WebScraper(logger, debug)
         balance_string = config.get('balance', 'BALANCE')
         balances: list[str] = balance_string.split(',')
         self.__balance: list[float] = list(map(float, balances))
         self.__POOL_LIMIT: int = int(config.get('debug', 'POOL_LIMIT'))
         self.__pool_df: pd.DataFrame = pd.DataFrame()
-        # self.__get_previous_days_information_from_stored_file()
         self.__average_df: pd.DataFrame = pd.DataFrame()
+        self.__formatted_columns: list[str] = []  # Columns of average_df formatted when saved
+        self.__average_mining_reward: np.ndarray = None  # Pools x balances, set by __calculate_average_mining_reward
+        self.__block_number: int = None
+
+    def __create_blockchain(self, shared: PancakeSwapBlockchain = None) -> PancakeSwapBlockchain:
+        # With shared, the new client reads a past day for the backfill. It uses the metadata cache, pool registry,
+        # provider and rate limiter of shared instead of its own, so all the backfill workers together stay under
+        # [rate_limit] max_concurrency, and it does not follow the head of the chain. It makes its calls from worker
+        # threads, an asyncio client per thread would need a rate limiter per event loop.
+        if shared is not None:
+            return PancakeSwapBlockchain(self.__log, self.__debugging, shared.metadata_cache,
+                                         shared.get_pool_registry(), shared.endpoint_pool, shared.get_provider(),
+                                         shared.get_rate_limiter(), follow_chain_head=False)
+        if config.getboolean('async', 'enabled'):
+            # Fetches the pools concurrently, limited by [async] concurrency
+            return AsyncPancakeSwapBlockchain(self.__log, self.__debugging)
+        return PancakeSwapBlockchain(self.__log, self.__debugging)
 
     def run(self):
+        if config.getboolean('backfill', 'enabled'):
+            # Past days without a stored file are rebuilt from the chain, so the averages cover AVERAGE_DAYS days
+            self.backfill_history()
+        if config.getboolean('snapshot', 'enabled'):
+            # Every chain read of this run is made against the same block
+            self.__block_number = self.__pancake_Blockchain.pin_block()
         self.fetch_current_values()
         self.__calculate_basic_earnings()  # Calculation of Basic Earning From LP
         # Calculation of Mining Earning From Staking Farm
@@ -56,13 +99,80 @@ class ROI:
         self.__calculate_impermanent_loss()
         self.__log.info('Calculation Completed')
 
+    def migrate_history(self):
+        # One shot copy of the stored pool information CSV files to the Parquet archive
+        PoolArchive(self.__log).migrate_csv(HISTORY_DIRECTORY)
+
+    def backfill_history(self, days: int = AVERAGE_DAYS - 1):
+        # Rebuilds the pool information file of each of the past days which has none, from the chain state at the
+        # last block of that day (needs an archive node). The days are read in parallel, one blockchain client each.
+        history = PoolHistoryStore(self.__log, archive=self.__archive)
+        missing_days = [index for index in range(1, days + 1)
+                        if not history.exists(date.today() - timedelta(days=index))]
+        if not missing_days:
+            return
+        self.__log.info('Backfilling pool information of {n} past days'.format(n=len(missing_days)))
+        with ThreadPoolExecutor(max_workers=int(config.get('backfill', 'workers'))) as executor:
+            list(executor.map(self.__backfill_day, missing_days))
+
+    def __backfill_day(self, index: int):
+        try:
+            end_of_day = datetime.combine(date.today() - timedelta(days=index - 1), time.min)
+            blockchain = self.__create_blockchain(shared=self.__pancake_Blockchain)
+            block_number = blockchain.get_block_number_at(int(end_of_day.timestamp()) - 1)
+            pool_df = blockchain.fetch_pool_information_at_block(block_number)
+            if pool_df.empty:
+                print('No pool information at block {block}, day {day} not backfilled'.format(
+                    block=block_number, day=index))
+                self.__log.info('No pool information at block {block}, day {day} not backfilled'.format(
+                    block=block_number, day=index))
+                return
+            pool_df['block_number'] = block_number
+            # There is no trading volume in the chain state, the averages of volume_24h skip these days
+            pool_df = self.__add_mining_rewards(pool_df, blockchain.get_platform_token_price(),
+                                                blockchain.get_master_chef_information())
+            history = PoolHistoryStore(self.__log, archive=self.__archive)
+            path = history.get_path(date.today() - timedelta(days=index))
+            history.save(date.today() - timedelta(days=index), pool_df)
+            self.__log.info('Backfilled {file} at block {block}'.format(file=path, block=block_number))
+        except Exception as e:
+            print('Error in __backfill_day {day} {e}'.format(day=index, e=e))
+            self.__log.info('Error in __backfill_day {day} {e}'.format(day=index, e=e))
+
+    def sample(self):
+        # Only fetches the pools and adds them to the snapshot ring, meant to be run many times a day
+        if config.getboolean('snapshot', 'enabled'):
+            self.__block_number = self.__pancake_Blockchain.pin_block()
+        self.__fetch_pool_values()
+
     def fetch_current_values(self):
+        self.__fetch_pool_values()
+        self.__save_pool_info()
+        self.__initialize_average_df()
+
+    def __fetch_pool_values(self):
         self.__pool_df = self.__pancake_Blockchain.fetch_all_pool_information_from_master_chef()
-        self.__pool_df = self.__web_scrapper.fetch_current_trading_balance_for_all_pool(
-            self.__pool_df)
         self.__pool_df = self.__pancake_Blockchain.calculate_current_liquidity_balance(
+            self.__pool_df)  # Also prices the tokens, which the chain volume source uses
+        self.__pool_df = self.__volume_source.fetch_current_trading_balance_for_all_pool(
             self.__pool_df)
-        self.__initialize_average_df()
+        if self.__block_number is not None:
+            self.__pool_df['block_number'] = self.__block_number  # Block the chain values were read at
+        if self.__snapshots is not None:
+            self.__append_snapshot()
+
+    def __append_snapshot(self):
+        try:
+            values = self.__pool_df.set_index('lpToken')[['TVL', 'Farm_Liquidity', 'volume_24h']]
+            reserves = [self.__pancake_Blockchain.get_pair_amounts(pool_address) or [np.nan, np.nan]
+                        for pool_address in values.index]
+            values['reserve0'] = [reserve[0] for reserve in reserves]
+            values['reserve1'] = [reserve[1] for reserve in reserves]
+            values['cake_price'] = self.__pancake_Blockchain.get_platform_token_price()
+            self.__snapshots.append(int(datetime.now().timestamp()), values)
+        except Exception as e:
+            print('Error in __append_snapshot {e}'.format(e=e))
+            self.__log.info('Error in __append_snapshot {e}'.format(e=e))
 
     def __calculate_basic_earnings(self):
         self.__log.info('Calculating Basic Earning')
@@ -89,31 +199,11 @@ class ROI:
     def __calculate_daily_liquidity_mining_reward_rate_per_USD(self):
         # This function finds the daily reward of farming for each dollar for each pool
         try:
-            for i in range(len(self.__balance)):
-                balance_using = str(self.__balance[i])
-
-                self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df, balance_using +
-                                                                              '_daily_mining_reward_in_$',
-                                                                              'float')
-                for x, row in self.__average_df.iterrows():  # Loop Through complete dataframe
-                    try:
-                        # annual_return = self.__balance[i] * row[balance_using + '_annual_mining_reward_in_%'] / 100
-                        value = self.__calculate_average(
-                            row['lpToken'], balance_using + '_Mining_Reward')
-                        daily_return = self.__balance[i] * value / 100
-                        self.__average_df[balance_using +
-                                          '_daily_mining_reward_in_$'][x] = daily_return
-                        # self.__average_df[balance_using + '_annual_mining_reward_in_$'][x] = annual_return
-                    except Exception as e:
-                        self.__average_df[balance_using +
-                                          '_daily_mining_reward_in_$'][x] = 0
-                        # self.__average_df[balance_using + '_annual_mining_reward_in_$'][x] = 0
-                        print(
-                            'Error in forloop calculate_daily_liquidity_mining_reward_rate_per_USD {e}'.format(e=e))
-                        self.__log.info(
-                            'Error in forloop calculate_daily_liquidity_mining_reward_rate_per_USD {e}'.format(e=e))
-                self.convert_values(
-                    balance_using + '_daily_mining_reward_in_$')
+            rewards = daily_reward_in_dollars(self.__average_mining_reward, self.__balance)
+            self.__average_df = self.__set_columns(self.__average_df, {
+                str(balance) + '_daily_mining_reward_in_$': rewards[:, i] for i, balance in enumerate(self.__balance)})
+            for balance in self.__balance:
+                self.__format_on_export(str(balance) + '_daily_mining_reward_in_$')
             self.__save_average_df()
         except Exception as e:
             print(
@@ -135,21 +225,9 @@ class ROI:
     def __calculate_average_total_daily_pool_size(self):
         # This Function finds out the average Liquidity In the Pool for 7 Days
         try:
-            self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df,
-                                                                          'total_liquidity_pool_size_in_$',
-                                                                          'float')
-            for x, row in self.__average_df.iterrows():  # Loop Through All the Pools in average_df
-                try:
-                    value = self.__calculate_average(
-                        row['lpToken'], 'Farm_Liquidity')
-                    self.__average_df['total_liquidity_pool_size_in_$'][
-                        x] = value  # Store The Average value of Farm_Liquidity
-                except Exception as e:
-                    print(
-                        'Error in for loop __calculate_average_total_daily_pool_size {e}'.format(e=e))
-                    self.__log.info(
-                        'Error in for loop __calculate_average_total_daily_pool_size {e}'.format(e=e))
-            self.convert_values('total_liquidity_pool_size_in_$')
+            self.__average_df['total_liquidity_pool_size_in_$'] = \
+                self.__get_average_values(['Farm_Liquidity'])[:, 0]  # Store The Average value of Farm_Liquidity
+            self.__format_on_export('total_liquidity_pool_size_in_$')
 
             self.__save_average_df()
         except Exception as e:
@@ -271,25 +349,12 @@ class ROI:
 
     def __calculate_avg_liquidity_balanace(self):
         # This Function Calculate the Avergae Liquidity Balance Of each pool
-        # It loop through all the pool and find the the average TVL and Store it in average_df and
+        # It finds the average TVL of all the pools at once and Store it in average_df and
         # at the end it stores in file Average.csv
         try:
-            self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df,
-                                                                          'average_daily_liquidity_of_pool_in_$',
-                                                                          'float')
-            for x, row in self.__average_df.iterrows():
-                try:
-                    # Gets the average Value for 7 days for TVL
-                    value = self.__calculate_average(row['lpToken'], 'TVL')
-                    # Storing
-                    self.__average_df['average_daily_liquidity_of_pool_in_$'][x] = value
-                    # the Average daily liquidity
-                except Exception as e:
-                    print('Error in forloop calculate_previous_liquidity_balanace {e}'.format(
-                        e=e))  # In case error, the error is printed
-                    self.__log.info('Error in forloop calculate_previous_liquidity_balanace {e}'.format(
-                        e=e))  # In case error, the error is logged into file
-            self.convert_values('average_daily_liquidity_of_pool_in_$')
+            self.__average_df['average_daily_liquidity_of_pool_in_$'] = \
+                self.__get_average_values(['TVL'])[:, 0]  # Storing the Average daily liquidity
+            self.__format_on_export('average_daily_liquidity_of_pool_in_$')
             self.__save_average_df()
         except Exception as e:
             print(
@@ -311,60 +376,25 @@ class ROI:
             return 0
 
     def __calculate_daily_exchange_fee_rate_per_USD_of_pair(self):
+        # Daily basic earning of every pool for every balance in one pass, from the fees of the last 24h
         try:
-            for i in range(len(self.__balance)):
-                balance_using = str(self.__balance[i])
-                self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df, balance_using
-                                                                              + '_daily_basic_earning_in_$',
-                                                                              'float')
-                self.__pool_df = self.__initialize_new_column_in_dataframe(self.__pool_df, balance_using +
-                                                                           '_daily_basic_earning_in_%',
-                                                                           'float')
-
-                for index, row in self.__pool_df.iterrows():
-                    try:
-                        if index > self.__POOL_LIMIT and self.__debugging:  # if the System is in running in
-                            # debugging mode
-                            break
-                        fee = float(self.__pool_df['lp_reward_fee_24h'][index])
-                        TVL = float(
-                            self.__pool_df['TVL'][index]) + self.__balance[i]
-                        if fee <= 0 or TVL <= 0:
-                            exchange_fee_rate_per_usd = 0
-                        else:
-                            daily_basic_earning = ((fee / TVL) * 100)
-                            annual_basic_earning = (
-                                daily_basic_earning * DAYS_IN_YEAR)
-                        self.__pool_df[balance_using +
-                                       '_daily_basic_earning_in_%'][index] = daily_basic_earning
-                        self.__average_df[balance_using + '_daily_basic_earning_in_$'][index] = self.__balance[i] * (
-                            daily_basic_earning / 100)
-
-                    except Exception as e:
-                        self.__log.info(
-                            'Error in calculate_daily_exchange_fee_rate_per_USD_of_pair {e}'.format(e=e))
-                        print(
-                            'Error in calculate_daily_exchange_fee_rate_per_USD_of_pair {e}'.format(e=e))
-
-            for i in range(len(self.__balance)):
-                balance_using = str(self.__balance[i])
-                self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df, balance_using
-                                                                              + '_daily_basic_earning_in_BPS',
-                                                                              'float')
-                for index, row in self.__pool_df.iterrows():
-                    try:
-
-                        self.__average_df[balance_using + '_daily_basic_earning_in_BPS'][
-                            index] = row[balance_using + '_daily_basic_earning_in_%'] * 100
-                    except Exception as e:
-                        self.__log.info(
-                            'Error in calculate_daily_exchange_fee_rate_per_USD_of_pair {e}'.format(e=e))
-                        print(
-                            'Error in calculate_daily_exchange_fee_rate_per_USD_of_pair {e}'.format(e=e))
-                self.convert_values(
-                    balance_using + '_daily_basic_earning_in_$')
-                self.convert_values(
-                    balance_using + '_daily_basic_earning_in_BPS')
+            rates = daily_basic_earning_rate(pd.to_numeric(self.__pool_df['lp_reward_fee_24h'], errors='coerce'),
+                                             pd.to_numeric(self.__pool_df['TVL'], errors='coerce'), self.__balance)
+            if self.__debugging:  # Pools after the pool limit are not calculated in debugging mode
+                rates[np.asarray(self.__pool_df.index > self.__POOL_LIMIT)] = 0
+            self.__pool_df = self.__set_columns(self.__pool_df, {
+                str(balance) + '_daily_basic_earning_in_%': rates[:, i] for i, balance in enumerate(self.__balance)})
+            earnings = daily_reward_in_dollars(rates, self.__balance)
+            columns = {str(balance) + '_daily_basic_earning_in_$': earnings[:, i]
+                       for i, balance in enumerate(self.__balance)}
+            columns.update({str(balance) + '_daily_basic_earning_in_BPS': rates[:, i] * 100
+                            for i, balance in enumerate(self.__balance)})
+            self.__average_df = self.__set_columns(self.__average_df, columns)
+            for balance in self.__balance:
+                self.__format_on_export(
+                    str(balance) + '_daily_basic_earning_in_$')
+                self.__format_on_export(
+                    str(balance) + '_daily_basic_earning_in_BPS')
             self.__save_average_df()
         except Exception as e:
             print(
@@ -372,81 +402,36 @@ class ROI:
             self.__log.info(
                 'Error in calculate_daily_exchange_fee_rate_per_USD_of_pair {e}'.format(e=e))
 
-    def __calculate_average(self, address, column_header):
-        try:
-            # This function finds the average from previous_days_df
-            # This Function reads the file upto last 7 days from storage
-            # The function call _read_last_file, read the previous file available in storage
-            # Address Paramert tells about the pool to look info files
-            # this function goes through previous_days_df and find the information give in column_header
-            # parameter and find the average of it.
-            self.__save_pool_info()
-            self.__get_previous_days_information_from_stored_file()
-            total_7d = 0.0
-            for i in range(len(self.__previous_days_information)):
-                row = self.__previous_days_information[i].loc[
-                    (self.__previous_days_information[i]['lpToken'] == address)]
-                if row.empty:
-                    if i == 0:
-                        return total_7d
-                    else:
-                        total_7d = total_7d / i
-                        return total_7d
-
-                value = str(row[column_header].values[0])
-                if "%" in value:
-                    value = value.replace("%", "")
-                total_7d = total_7d + float(value)
-            total_7d = total_7d / len(
-                self.__previous_days_information)  # This average over the number of files which were available
-            return total_7d
-        except Exception as e:
-            print('Error In Finding Values From dataframes {e}'.format(e=e))
-            self.__log.info(
-                'Error In Finding Values From dataframes {e}'.format(e=e))
-            return 0
-
-    def __read_csv_file_using_index(self, index: int) -> pd.DataFrame:
-        try:
-            date_string = f"pool_information 0{date.today().month}.{date.today().day - index}.{date.today().year}.csv"
-            # Check if the file with specific date exist
-            if exists('./Data Set/' + date_string):
-                file = pd.read_csv(
-                    './Data Set/' + date_string).set_index('index')  # Read the pool information for specifc date
-                file.fillna(0)  # Replace the empty values with 0
-                return file
-            else:
-                return pd.DataFrame([])
-        except Exception as e:
-            print('Error in __read_csv_file_using_index {e}'.format(e=e))
-            self.__log.info(
-                'Error in __read_csv_file_using_index {e}'.format(e=e))
-
-    def __get_previous_days_information_from_stored_file(self):
-        # This Function Read the Pool Information File From the Storage
-        # It looks for previous 7 files in total. Included of today
-        try:
-            self.__previous_days_information = {}
-            # Loop till Past 7 Days Including Today
-            for index in range(0, AVERAGE_DAYS):
-                file = self.__read_csv_file_using_index(index)
-                if file.empty:
-                    break
-                self.__previous_days_information[len(
-                    self.__previous_days_information)] = file
-        except Exception as error:
-            print(
-                'Error in get_previous_days_information_from_stored_file {e}'.format(e=error))
-            self.__log.info(
-                'Error in get_previous_days_information_from_stored_file {e}'.format(e=error))
+    def __get_average_values(self, column_headers: list) -> np.ndarray:
+        # Average over today and the past days of every column in column_headers, pools (rows of average_df) x
+        # columns, 0 for the pools without a value. The past days are read from storage by the first call only.
+        if self.__history is None:
+            self.__history = PoolHistoryStore(self.__log, archive=self.__archive)
+            self.__history.load(AVERAGE_DAYS - 1)
+        averages = self.__history.get_averages(self.__get_today_values(column_headers), column_headers)
+        return averages.reindex(self.__average_df['lpToken']).fillna(0).to_numpy(dtype=float)
+
+    def __get_today_values(self, column_headers: list) -> pd.DataFrame:
+        # Today's pool information, with the values sampled since midnight averaged over time when there are any
+        fields = [column for column in column_headers if column in SNAPSHOT_FIELDS and column in self.__pool_df.columns]
+        if self.__snapshots is None or not fields:
+            return self.__pool_df
+        midnight = datetime.combine(date.today(), time.min).timestamp()
+        averages = self.__snapshots.get_time_weighted_averages(list(self.__pool_df['lpToken']), fields,
+                                                               int(midnight), int(datetime.now().timestamp()) + 1)
+        today_values = self.__pool_df.copy()
+        for field in fields:
+            today_values[field] = averages[field].fillna(pd.Series(today_values[field].to_numpy(),
+                                                                   index=averages.index)).to_numpy()
+        return today_values
 
     def __initialize_average_df(self):  # Initialization of Average Dataframe
         try:
             self.__average_df = self.__pool_df.copy(deep=True)
-            self.convert_values('Farm_Liquidity')
-            self.convert_values('TVL')
-            self.convert_values('lp_reward_fee_24h')
-            self.convert_values('volume_24h')
+            self.__format_on_export('Farm_Liquidity')
+            self.__format_on_export('TVL')
+            self.__format_on_export('lp_reward_fee_24h')
+            self.__format_on_export('volume_24h')
         except Exception as e:
             print('Error initialize_average_df {e}'.format(e=e))
             self.__log.info('Error initialize_average_df {e}'.format(e=e))
@@ -463,24 +448,9 @@ class ROI:
     def __calculate_avg_trading_balance(self):
         # Finds Out the Average of Trading Volume For the Last 7 Days
         try:
-            self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df,
-                                                                          'average_daily_trading_volume_of_pool_in_$',
-                                                                          'float')
-            for x, row in self.__average_df.iterrows():
-                try:
-                    # Finding the average value of the
-                    value = self.__calculate_average(
-                        row['lpToken'], 'volume_24h')
-                    # volume from past 7 days
-                    self.__average_df['average_daily_trading_volume_of_pool_in_$'][
-                        x] = value  # Storing The avg daily\
-                    # volume to dataframe
-                except Exception as e:
-                    print(
-                        'Error in forloop calculate_avg_trading_balance {e}'.format(e=e))
-                    self.__log.info(
-                        'Error in forloop calculate_avg_trading_balance {e}'.format(e=e))
-            self.convert_values('average_daily_trading_volume_of_pool_in_$')
+            self.__average_df['average_daily_trading_volume_of_pool_in_$'] = \
+                self.__get_average_values(['volume_24h'])[:, 0]  # Storing The avg daily volume to dataframe
+            self.__format_on_export('average_daily_trading_volume_of_pool_in_$')
             self.__save_average_df()
         except Exception as e:
             print('Error in calculate_avg_trading_balance {e}'.format(e=e))
@@ -493,89 +463,63 @@ class ROI:
             # Loop Through All The Pools
             cake_price = self.__pancake_Blockchain.get_platform_token_price()
             master_chef_contract_information = self.__pancake_Blockchain.get_master_chef_information()
-            for i in range(len(self.__balance)):
-                balance_using = str(self.__balance[i])
-                self.__pool_df = self.__initialize_new_column_in_dataframe(self.__pool_df, balance_using +
-                                                                           '_Mining_Reward', 'float')
-                self.__pool_df = self.__initialize_new_column_in_dataframe(self.__pool_df, balance_using +
-                                                                           '_Mining_Reward_Annually', 'float')
-                for index, row in self.__pool_df.iterrows():
-                    try:
-                        if row['isRegular']:
-                            pool_reward = master_chef_contract_information['regular_cake_per_block']
-                            total_point = master_chef_contract_information['total_regular_allocation']
-                        else:
-                            pool_reward = master_chef_contract_information['special_cake_per_block']
-                            total_point = master_chef_contract_information['total_special_allocation']
-                        liquidity = float(
-                            row['Farm_Liquidity']) + self.__balance[i]
-                        allocated_point = row['allocPoint']
-                        mining_reward_of_pool_yearly = self.__calculate_mining_reward(cake_price, pool_reward,
-                                                                                      liquidity,
-                                                                                      allocated_point, total_point)
-                        daily_reward = mining_reward_of_pool_yearly / DAYS_IN_YEAR
-                        self.__pool_df[balance_using +
-                                       '_Mining_Reward_Annually'][index] = mining_reward_of_pool_yearly
-                        self.__pool_df[balance_using +
-                                       '_Mining_Reward'][index] = daily_reward
-                    except Exception as e:
-                        print('Error in calculate_current_mining_reward for  {e}'.format(
-                            e=row['lpToken']))
-                        self.__log.info(
-                            'Error in calculate_current_mining_reward for  {e}'.format(e=row['lpToken']))
-                self.__save_pool_info()
+            self.__pool_df = self.__add_mining_rewards(self.__pool_df, cake_price, master_chef_contract_information)
+            self.__save_pool_info()
         except Exception as e:
             print('Error in calculate_current_mining_reward {e}'.format(e=e))
             self.__log.info(
                 'Error in calculate_current_mining_reward {e}'.format(e=e))
 
-    def __calculate_mining_reward(self, cake_price, reward, liquidity, allocation_point,
-                                  total_point):
-        # This Function Perform the calculation for Mining Reward
-        # Formula = ((CAKE PRICE * (ALLOCATED POINT / TOTAL POINT) * REWARD * Daily_Blocks * Days_In_Year) / (Farm
-        # Liquidity + BALANCE)) * 100)
-        # This Function Find APR
-        # If Something goes wrong during calculation it returns 0
+    def __add_mining_rewards(self, pool_df: pd.DataFrame, cake_price: float,
+                             master_chef_contract_information: dict) -> pd.DataFrame:
+        # Adds the daily and annual Mining Reward of every balance to the pool information of a day
         try:
-            if liquidity == 0:
-                return 0
-            number_of_blocks = DAILY_BLOCKS * DAYS_IN_YEAR  # In an Year
-            APR = (cake_price * (allocation_point / total_point) *
-                   reward * number_of_blocks) / float(liquidity) * 100
-            return APR
+            is_regular = pool_df['isRegular'].astype(bool).to_numpy()
+            apr = mining_apr(cake_price,
+                             np.where(is_regular, master_chef_contract_information['regular_cake_per_block'],
+                                      master_chef_contract_information['special_cake_per_block']),
+                             pd.to_numeric(pool_df['allocPoint'], errors='coerce'),
+                             np.where(is_regular, master_chef_contract_information['total_regular_allocation'],
+                                      master_chef_contract_information['total_special_allocation']),
+                             pd.to_numeric(pool_df['Farm_Liquidity'], errors='coerce').fillna(0), self.__balance)
         except Exception as e:
-            print('Error in __calculate_mining_reward {e}'.format(e=e))
-            self.__log.info(
-                'Error in __calculate_mining_reward {e}'.format(e=e))
-            return 0
+            print('Error in calculate_current_mining_reward {e}'.format(e=e))
+            self.__log.info('Error in calculate_current_mining_reward {e}'.format(e=e))
+            apr = np.zeros((len(pool_df), len(self.__balance)))
+        columns = {}
+        for i, balance in enumerate(self.__balance):
+            columns[str(balance) + '_Mining_Reward'] = apr[:, i] / DAYS_IN_YEAR
+            columns[str(balance) + '_Mining_Reward_Annually'] = apr[:, i]
+        return self.__set_columns(pool_df, columns)
 
     def __calculate_average_mining_reward(
             self):
         # It finds the Average Mining Reward, and Mining Reward Annually using history data
         try:
-            for i in range(len(self.__balance)):
-                balance_using = str(self.__balance[i])
-                self.__average_df = self.__initialize_new_column_in_dataframe(self.__average_df, balance_using +
-                                                                              '_daily_mining_reward_in_BPS', 'float')
-                for x, row in self.__average_df.iterrows():
-                    try:
-                        value = self.__calculate_average(
-                            row['lpToken'], balance_using + '_Mining_Reward')
-                        self.__average_df[balance_using +
-                                          '_daily_mining_reward_in_BPS'][x] = value * 100
-                    except Exception as e:
-                        print(
-                            'Error in forloop calculate_average_mining_reward {e}'.format(e=e))
-                        self.__log.info(
-                            'Error in forloop calculate_average_mining_reward {e}'.format(e=e))
-                self.convert_values(
-                    balance_using + '_daily_mining_reward_in_BPS')
+            self.__average_mining_reward = self.__get_average_values(
+                [str(balance) + '_Mining_Reward' for balance in self.__balance])
+            self.__average_df = self.__set_columns(self.__average_df, {
+                str(balance) + '_daily_mining_reward_in_BPS': self.__average_mining_reward[:, i] * 100
+                for i, balance in enumerate(self.__balance)})
+            for balance in self.__balance:
+                self.__format_on_export(
+                    str(balance) + '_daily_mining_reward_in_BPS')
             self.__save_average_df()
         except Exception as e:
             print('Error in calculate_average_mining_reward {e}'.format(e=e))
             self.__log.info(
                 'Error in calculate_average_mining_reward {e}'.format(e=e))
 
+    def __set_columns(self, dataframe: pd.DataFrame, columns: dict) -> pd.DataFrame:
+        # Sets many columns at once, one insert per column fragments the frame when there are hundreds of balances
+        # The columns the frame already has are replaced where they are, so the saved CSV keeps its column order
+        new_columns = pd.DataFrame(columns, index=dataframe.index)
+        existing_columns = [column for column in columns if column in dataframe.columns]
+        dataframe = dataframe.copy()
+        for column in existing_columns:
+            dataframe[column] = new_columns[column]
+        return pd.concat([dataframe, new_columns.drop(columns=existing_columns)], axis=1)
+
     def __initialize_new_column_in_dataframe(self, dataframe, columnheader, columntype):
         try:
             dataframe[columnheader] = pd.Series(dtype=columntype)
@@ -589,39 +533,20 @@ class ROI:
 
     def __save_pool_info(self):  # Stores the Average Value Dataframe
         try:
-            date_string = f"pool_information 0{date.today().month}.{date.today().day}.{date.today().year}.csv"
             # Storing The Pool Information TO CSV FIle
-            self.__pool_df.to_csv('./Data Set/' + date_string)
+            PoolHistoryStore(self.__log, archive=self.__archive).save(date.today(), self.__pool_df)
         except Exception as e:
             print('Error in __save_pool_info {e}'.format(e=e))
             self.__log.info('Error in __save_pool_info {e}'.format(e=e))
 
     def __save_average_df(self):
         try:
-
-            self.__average_df.to_csv('./Data Set/Average.csv')
+            format_columns(self.__average_df, self.__formatted_columns).to_csv('./Data Set/Average.csv')
         except Exception as e:
             print('Error in __save_average_df {e}'.format(e=e))
             self.__log.info('Error in __save_average_df {e}'.format(e=e))
 
-    def convert_values(self, header: str):
-        try:
-            #
-            for index, row in self.__average_df.iterrows():
-                value_in_df = self.__average_df[header][index]
-
-                if value_in_df > 1000:
-                    updated_value = str(round(value_in_df / 1000, 2)) + 'K'
-                elif value_in_df > 1000000:
-                    updated_value = str(round(value_in_df / 1000000, 2)) + 'M'
-                elif value_in_df > 1000000000:
-                    updated_value = str(
-                        round(value_in_df / 1000000000, 2)) + 'B'
-                else:
-                    updated_value = str(round(value_in_df, 2))
-                self.__average_df[header][index] = updated_value
-
-            self.__average_df[header] = self.__average_df[header].astype(str)
-            self.__average_df.style.set_properties(**{'text-align': 'right'})
-        except Exception as e:
-            print('Error In convert_value {e}'.format(e=e))
+    def __format_on_export(self, header: str):
+        # The column stays float64 in average_df and is shown in K, M or B in Average.csv only
+        if header not in self.__formatted_columns:
+            self.__formatted_columns.append(header)
@@ -0,0 +1,161 @@
+import os
+import threading
+from contextlib import contextmanager
+from logging import Logger
+import numpy as np
+import pandas as pd
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+SNAPSHOT_DIRECTORY = './Data Set/snapshots'
+SNAPSHOT_FIELDS = ['TVL', 'Farm_Liquidity', 'volume_24h', 'reserve0', 'reserve1', 'cake_price']
+ADDRESS_TYPE = 'S42'  # 0x + 40 hex characters
+LOCK_FILE = 'ring.lock'
+
+
+@contextmanager
+def _locked(path: str):
+    # Exclusive lock of the file at path shared by every process, held while the block runs
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)  # Gives up after 10 seconds
+                    break
+                except OSError:
+                    continue
+        else:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class SnapshotRing:
+    # Intraday samples of the pools in fixed size NumPy memmap files, so averages can be weighted by time
+    # metrics.f8 is buckets x slots x SNAPSHOT_FIELDS float64 values. A sample taken at time t is stored in the row
+    # of bucket t // bucket_seconds, row = bucket % buckets, so a later sample of the same bucket replaces it and the
+    # oldest bucket is overwritten once the ring is full. times.i8 holds the start time of the bucket stored in each
+    # row, -1 while the row is being written or was never written, and pools.S42 the pool address of each slot,
+    # a pool keeps its slot. A reader in another process maps the files read only, get_field returns a view of the
+    # file and the averages only copy the rows and pools they use. Writers in several processes (a run and
+    # main.py --sample) take turns through the ring.lock file and see the slots added by the others.
+
+    def __init__(self, logger: Logger, directory: str = SNAPSHOT_DIRECTORY, slots: int = 1024,
+                 buckets: int = 1008, bucket_seconds: int = 600, read_only: bool = False):
+        self.__log = logger
+        self.__buckets = buckets
+        self.__slots = slots
+        self.__bucket_seconds = bucket_seconds
+        self.__read_only = read_only
+        self.__lock = threading.Lock()
+        shapes = {'metrics.f8': ((buckets, slots, len(SNAPSHOT_FIELDS)), np.float64),
+                  'times.i8': ((buckets,), np.int64),
+                  'pools.S42': ((slots,), np.dtype(ADDRESS_TYPE))}
+        paths = {name: os.path.join(directory, name) for name in shapes}
+        sizes = {name: int(np.prod(shape)) * np.dtype(dtype).itemsize for name, (shape, dtype) in shapes.items()}
+        self.__lock_path = os.path.join(directory, LOCK_FILE)
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+            with _locked(self.__lock_path):
+                if not all(os.path.exists(paths[name]) and os.path.getsize(paths[name]) == sizes[name]
+                           for name in shapes):
+                    # New ring, or the shape in config.ini changed and the old samples can not be placed in it
+                    self.__log.info('Creating the snapshot ring in {directory}'.format(directory=directory))
+                    for name, (shape, dtype) in shapes.items():
+                        np.memmap(paths[name] + '.tmp', dtype=dtype, mode='w+', shape=shape).flush()
+                    np.memmap(paths['times.i8'] + '.tmp', dtype=np.int64, mode='r+', shape=(buckets,))[:] = -1
+                    for name in shapes:
+                        os.replace(paths[name] + '.tmp', paths[name])
+        mode = 'r' if read_only else 'r+'
+        self.__metrics = np.memmap(paths['metrics.f8'], dtype=np.float64, mode=mode, shape=shapes['metrics.f8'][0])
+        self.__times = np.memmap(paths['times.i8'], dtype=np.int64, mode=mode, shape=(buckets,))
+        self.__pools = np.memmap(paths['pools.S42'], dtype=ADDRESS_TYPE, mode=mode, shape=(slots,))
+        self.__slot_of_pool = {pool.decode(): slot for slot, pool in enumerate(self.__pools) if pool}
+
+    def append(self, timestamp: int, values: pd.DataFrame):
+        # Stores a sample of the pools, values is indexed by pool address with some of the SNAPSHOT_FIELDS columns,
+        # the other fields of the sample are NaN. Pools without a free slot are left out.
+        with self.__lock, _locked(self.__lock_path):
+            bucket = int(timestamp) // self.__bucket_seconds
+            row = bucket % self.__buckets
+            bucket_start = bucket * self.__bucket_seconds
+            slots = self.__get_or_add_slots(list(values.index))
+            stored = slots >= 0
+            if not stored.all():
+                print('No free snapshot slot for {n} pools, increase [snapshots] slots'.format(n=(~stored).sum()))
+                self.__log.info('No free snapshot slot for {n} pools, increase [snapshots] slots'.format(
+                    n=(~stored).sum()))
+            new_bucket = self.__times[row] != bucket_start
+            self.__times[row] = -1  # Readers skip the row until all its values are written
+            self.__times.flush()
+            if new_bucket:
+                self.__metrics[row] = np.nan
+            for field_index, field in enumerate(SNAPSHOT_FIELDS):
+                if field in values.columns:
+                    self.__metrics[row, slots[stored], field_index] = \
+                        pd.to_numeric(values[field], errors='coerce').to_numpy(dtype=float)[stored]
+            self.__metrics.flush()
+            self.__times[row] = bucket_start
+            self.__times.flush()
+
+    def get_slots(self, pool_addresses: list) -> np.ndarray:
+        # Slot of every pool, -1 for the pools never sampled
+        return np.array([self.__slot_of_pool.get(pool_address, -1) for pool_address in pool_addresses],
+                        dtype=np.int64)
+
+    def get_times(self) -> np.ndarray:
+        # Start time of the bucket of every row, -1 for the rows without a sample
+        return np.array(self.__times)
+
+    def get_field(self, field: str) -> np.ndarray:
+        # buckets x slots view of one field, no copy
+        return self.__metrics[:, :, SNAPSHOT_FIELDS.index(field)]
+
+    def get_time_weighted_averages(self, pool_addresses: list, fields: list, start: int, end: int) -> pd.DataFrame:
+        # Average of every field of every pool over the samples from start to end, each sample weighted by the time
+        # until the next sample. NaN for the pools or fields without a sample in the window.
+        if self.__read_only:
+            # Pools added by the writer since the files were mapped
+            self.__slot_of_pool = {pool.decode(): slot for slot, pool in enumerate(self.__pools) if pool}
+        times = self.get_times()
+        rows = np.flatnonzero((times >= 0) & (times >= start // self.__bucket_seconds * self.__bucket_seconds) &
+                              (times < end))
+        rows = rows[np.argsort(times[rows])]
+        averages = pd.DataFrame(np.nan, index=pool_addresses, columns=fields)
+        if len(rows) == 0:
+            return averages
+        weights = np.diff(np.append(np.maximum(times[rows], start), end)).astype(float)
+        slots = self.get_slots(pool_addresses)
+        known = slots >= 0
+        for field in fields:
+            values = self.get_field(field)[rows][:, slots[known]]  # Only the asked rows and pools are copied
+            present = ~np.isnan(values)
+            total_weight = (weights[:, None] * present).sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                average = (np.where(present, values, 0) * weights[:, None]).sum(axis=0) / total_weight
+            averages.loc[known, field] = np.where(total_weight > 0, average, np.nan)
+        return averages
+
+    def __get_or_add_slots(self, pool_addresses: list) -> np.ndarray:
+        # Called with ring.lock held, another writer may have added pools since the last append
+        self.__slot_of_pool = {pool.decode(): slot for slot, pool in enumerate(self.__pools) if pool}
+        slots = self.get_slots(pool_addresses)
+        free_slot = len(self.__slot_of_pool)
+        for position, pool_address in enumerate(pool_addresses):
+            if slots[position] >= 0 or free_slot >= self.__slots:
+                continue
+            self.__pools[free_slot] = pool_address.encode()
+            self.__slot_of_pool[pool_address] = free_slot
+            slots[position] = free_slot
+            free_slot += 1
+        self.__pools.flush()
+        return slots
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+from logging import Logger
+from web3 import Web3
+from python.metadata_cache import METADATA_CACHE_FILE
+
+SWAP_EVENT_TOPIC = Web3.keccak(text='Swap(address,uint256,uint256,uint256,uint256,address)').hex()
+LOG_ADDRESS_LIMIT = 500  # Pairs per eth_getLogs filter
+
+
+class SwapVolumeTracker:
+    # Trading volume of pairs summed from their Swap events, kept per bucket of bucket_blocks blocks
+    # Swap(sender, amount0In, amount1In, amount0Out, amount1Out, to) is emitted for every trade, the token amounts
+    # in and out of every pair are added to the bucket of the block the swap is in. Every pair remembers the last
+    # block it was scanned to, so a refresh only asks for the logs of the new blocks, and a pair seen for the first
+    # time is scanned from the start of the kept window. Blocks newer than reorg_depth are never scanned.
+    # The block range of eth_getLogs is halved when the node refuses it (too many logs) and doubled after a success.
+
+    def __init__(self, w3: Web3, logger: Logger, reorg_depth: int, bucket_blocks: int, window_blocks: int,
+                 log_block_range: int, max_log_block_range: int, path: str = METADATA_CACHE_FILE):
+        self.__w3 = w3
+        self.__log = logger
+        self.__reorg_depth = reorg_depth
+        self.__bucket_blocks = bucket_blocks
+        self.__window_blocks = window_blocks  # Buckets older than this are dropped
+        self.__log_block_range = log_block_range
+        self.__max_log_block_range = max_log_block_range
+        self.__lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS swap_volume (address TEXT NOT NULL, '
+                                  'bucket INTEGER NOT NULL, amount0 TEXT NOT NULL, amount1 TEXT NOT NULL, '
+                                  'PRIMARY KEY (address, bucket))')  # uint256 sums do not fit INTEGER
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS swap_pairs (address TEXT PRIMARY KEY, '
+                                  'scanned_to INTEGER NOT NULL)')
+        self.__connection.commit()
+        self.__scanned_to = {address: scanned_to for address, scanned_to in
+                             self.__connection.execute('SELECT address, scanned_to FROM swap_pairs')}
+
+    def get_safe_block(self, block_number: int) -> int:
+        return max(block_number - self.__reorg_depth, 0)
+
+    def sync(self, addresses: list, block_number: int) -> bool:
+        # Scans the Swap events of the pairs up to the safe block of block_number, False if some logs could not
+        # be fetched, the buckets scanned before the failure are kept
+        safe_block = self.get_safe_block(block_number)
+        window_start = max(safe_block - self.__window_blocks + 1, 0) // self.__bucket_blocks * self.__bucket_blocks
+        groups = {}
+        for address in addresses:
+            scanned_to = max(self.__scanned_to.get(address, window_start - 1), window_start - 1)
+            if scanned_to < safe_block:
+                groups.setdefault(scanned_to, []).append(address)
+        for scanned_to, group in sorted(groups.items()):
+            for start in range(0, len(group), LOG_ADDRESS_LIMIT):
+                if not self.__scan(group[start:start + LOG_ADDRESS_LIMIT], scanned_to + 1, safe_block):
+                    return False
+        self.__prune(window_start // self.__bucket_blocks)
+        return True
+
+    def get_volumes(self, addresses: list, block_number: int, blocks: int) -> dict:
+        # [amount0, amount1] traded by every pair in the last blocks blocks before the safe block of block_number,
+        # whole buckets only so the range is rounded down to the bucket
+        safe_block = self.get_safe_block(block_number)
+        first_bucket = max(safe_block - blocks + 1, 0) // self.__bucket_blocks
+        volumes = {address: [0, 0] for address in addresses}
+        with self.__lock:
+            rows = self.__connection.execute('SELECT address, amount0, amount1 FROM swap_volume WHERE bucket >= ?',
+                                             (first_bucket,)).fetchall()
+        for address, amount0, amount1 in rows:
+            if address in volumes:
+                volumes[address][0] += int(amount0)
+                volumes[address][1] += int(amount1)
+        return volumes
+
+    def __scan(self, addresses: list, from_block: int, to_block: int) -> bool:
+        block = from_block
+        while block <= to_block:
+            end = min(block + self.__log_block_range - 1, to_block)
+            try:
+                events = self.__w3.eth.get_logs({'fromBlock': block, 'toBlock': end, 'address': addresses,
+                                                 'topics': [SWAP_EVENT_TOPIC]})
+            except Exception as e:
+                if self.__log_block_range == 1:
+                    print('Error fetching Swap events from {start} to {end} {e}'.format(start=block, end=end, e=e))
+                    self.__log.info('Error fetching Swap events from {start} to {end} {e}'.format(start=block,
+                                                                                                 end=end, e=e))
+                    return False
+                self.__log_block_range = max(self.__log_block_range // 2, 1)
+                continue
+            self.__save(addresses, self.__aggregate(events), end)
+            self.__log_block_range = min(self.__log_block_range * 2, self.__max_log_block_range)
+            block = end + 1
+        return True
+
+    def __aggregate(self, events: list) -> dict:
+        # (address, bucket) -> [amount0 in + out, amount1 in + out]
+        buckets = {}
+        for event in events:
+            data = Web3.toBytes(hexstr=event['data']) if isinstance(event['data'], str) else event['data']
+            amount0In, amount1In, amount0Out, amount1Out = [int.from_bytes(data[position:position + 32], 'big')
+                                                            for position in range(0, 128, 32)]
+            key = (Web3.toChecksumAddress(event['address']), event['blockNumber'] // self.__bucket_blocks)
+            bucket = buckets.setdefault(key, [0, 0])
+            bucket[0] += amount0In + amount0Out
+            bucket[1] += amount1In + amount1Out
+        return buckets
+
+    def __save(self, addresses: list, buckets: dict, scanned_to: int):
+        # Buckets and scanned block are stored in one transaction, so a bucket is never counted twice
+        with self.__lock:
+            stored = {}
+            for address, bucket in buckets:
+                row = self.__connection.execute('SELECT amount0, amount1 FROM swap_volume WHERE address = ? AND '
+                                                'bucket = ?', (address, bucket)).fetchone()
+                stored[(address, bucket)] = [int(row[0]), int(row[1])] if row else [0, 0]
+            self.__connection.executemany('INSERT OR REPLACE INTO swap_volume VALUES (?, ?, ?, ?)',
+                                          [(address, bucket, str(stored[(address, bucket)][0] + amount0),
+                                            str(stored[(address, bucket)][1] + amount1))
+                                           for (address, bucket), (amount0, amount1) in buckets.items()])
+            self.__connection.executemany('INSERT OR REPLACE INTO swap_pairs VALUES (?, ?)',
+                                          [(address, scanned_to) for address in addresses])
+            self.__connection.commit()
+            self.__scanned_to.update({address: scanned_to for address in addresses})
+
+    def __prune(self, first_bucket: int):
+        with self.__lock:
+            self.__connection.execute('DELETE FROM swap_volume WHERE bucket < ?', (first_bucket,))
+            self.__connection.commit()
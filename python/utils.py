@@ -1,22 +1,41 @@
 import json
 import configparser
+import os
+import threading
+import time
 from logging import Logger
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from web3 import Web3
+from web3.providers import BaseProvider
+from web3.exceptions import BadFunctionCallOutput
 import pandas as pd
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as ec
+from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
+from python.multicall import Multicall
+from python.codec import ContractCodec
+from python.lens import PoolLens
+from python.batch_provider import BatchHTTPProvider
+from python.endpoint_pool import EndpointPool, PooledHTTPProvider
+from python.rate_limiter import AdaptiveRateLimiter
+from python.cassette import get_cassette_node_address
+from python.metadata_cache import MetadataCache
+from python.pool_registry import PoolRegistry
+from python.block_cache import BlockCallCache
+from python.price_graph import PriceGraph
+from python.pair_address import PairAddressResolver
+from python.reserve_tracker import ReserveTracker
+from python.pool_rows import PoolRowBuffer, get_latest_partial_path, get_partial_path
+from python.swap_volume import SwapVolumeTracker
 
 config = configparser.ConfigParser()
 config.read('config.ini')
 
 DAILY_BLOCKS = 28800
 DAYS_IN_YEAR = 365
-DECIMAL_PLACES = 18
+DECIMAL_PLACES = 18  # Used when the decimals of a token can not be fetched
 EXCHANGE_FEE = 0.17
 
 def read_json(filename: str) -> dict:
@@ -27,36 +46,163 @@ def read_json(filename: str) -> dict:
         print(traceback.format_exc())
         return {}
 
+
+def token_price_from_usdt_reserves(token_address: str, usdt_address: str, reserves: list,
+                                   token_decimals: int, usdt_decimals: int) -> float:
+    # Price of a token in USDT from the reserves of its USDT pair
+    # Pair tokens are sorted by address, so if the token address is bigger USDT is token0 of the pair
+    if token_address.lower() > usdt_address.lower():
+        usdt_reserve, token_reserve = reserves[0], reserves[1]
+    else:
+        token_reserve, usdt_reserve = reserves[0], reserves[1]
+    return (usdt_reserve / 10 ** usdt_decimals) / (token_reserve / 10 ** token_decimals)
+
+
 class PancakeSwapBlockchain:
 
-    def __init__(self, logger:Logger, debug:bool):
+    def __init__(self, logger:Logger, debug:bool, metadata_cache: MetadataCache = None,
+                 pool_registry: PoolRegistry = None, endpoint_pool: EndpointPool = None,
+                 provider: BaseProvider = None, rate_limiter: AdaptiveRateLimiter = None,
+                 follow_chain_head: bool = True):
+        # metadata_cache and pool_registry are shared by the clients of one process, e.g. the backfill threads,
+        # so the SQLite file has a single writer for them. endpoint_pool, provider and rate_limiter are shared the
+        # same way so the node sees the [rate_limit] concurrency whatever the number of clients.
+        # A client which only reads past blocks (follow_chain_head False) does not open the reserve and Swap trackers
         self.__debugging = debug
         self.__log = logger
         self.pair_abi = read_json('ABI/pairABI.json')
         self.token_abi = read_json('ABI/bep20.json')
-        self.__node_address = config.get('settings', 'node_address')
-        self.__w3 = Web3(Web3.HTTPProvider(self.__node_address))
+        # token0/token1 of pairs, symbol/decimals of tokens
+        self.metadata_cache = metadata_cache if metadata_cache is not None else MetadataCache(logger)
+        self.node_addresses = [address.strip() for address in config.get('settings', 'node_address').split(',')]
+        if config.get('cassette', 'mode') in ('record', 'replay'):
+            # Every request goes through the local cassette server, which records or replays the node answers
+            self.node_addresses = [get_cassette_node_address(logger, config.get('cassette', 'mode'),
+                                                             config.get('cassette', 'path'), self.node_addresses[0],
+                                                             float(config.get('cassette', 'latency')))]
+        self.__rpc_workers = int(config.get('rpc', 'workers'))
+        self.endpoint_pool = endpoint_pool  # Shared by all the requests when more than one node_address is set
+        if self.endpoint_pool is None and provider is None and len(self.node_addresses) > 1:
+            self.endpoint_pool = EndpointPool(self.node_addresses, logger,
+                                              float(config.get('rpc', 'hedge_percentile')),
+                                              int(config.get('rpc', 'hedge_min_samples')),
+                                              float(config.get('rpc', 'hedge_delay')),
+                                              float(config.get('rpc', 'failure_cooldown')),
+                                              2 * self.__rpc_workers)
+        self.__w3 = Web3(provider if provider is not None else self.__create_provider())
+        self.block_identifier = 'latest'  # Block number every call is made against once pin_block is called
+        self.__pinned_latest = False  # True when pin_block picked the block, False when it was given
+        self.__rate_limiter = rate_limiter if rate_limiter is not None else \
+            self._create_rate_limiter(int(config.get('rate_limit', 'max_concurrency')))
+        if self.__rate_limiter is not None:
+            # Added before the cache so calls served from the cache do not wait for a slot
+            self.__w3.middleware_onion.add(self.__rate_limiter.middleware, 'rate_limiter')
+        self.block_call_cache = BlockCallCache()
+        self.__w3.middleware_onion.add(self.block_call_cache.middleware, 'block_call_cache')
         self.__pancake_factory = self.__w3.toChecksumAddress(config.get('settings', 'pancake_factory'))
         self.__usdt_address = self.__w3.toChecksumAddress(config.get('settings', 'usdt_address'))
         self.__pancake_masterChef = self.__w3.toChecksumAddress(config.get('settings', 'pancake_masterChef'))
         self.__cake_address = self.__w3.toChecksumAddress(config.get('settings', 'CAKE'))
-        self.__factory_contract = self.__w3.eth.contract(abi=read_json('ABI/pancakeswap_factory.json'), address=self.__pancake_factory)
+        self.__pair_address_resolver = PairAddressResolver(self.__pancake_factory,
+                                                           config.get('settings', 'init_code_hash'))
         self.__master_chef_contract = self.__w3.eth.contract(abi=read_json('ABI/master_chef_v2.json'), address=self.__pancake_masterChef)
+        # Calls made for every pool or token go through precompiled codecs instead of web3 contract objects
+        self.__pair_codec = ContractCodec(self.__w3, self.pair_abi)
+        self.__token_codec = ContractCodec(self.__w3, self.token_abi)
+        self.__master_chef_codec = ContractCodec(self.__w3, read_json('ABI/master_chef_v2.json'))
+        self.__pool_lens = None  # Set to None as well when the node turns out not to support state overrides
+        if config.getboolean('lens', 'enabled'):
+            self.__pool_lens = PoolLens(self.__w3, logger, self.__w3.toChecksumAddress(config.get('lens', 'address')),
+                                        self.__pancake_masterChef, self.__master_chef_codec, self.__pair_codec,
+                                        self.__token_codec, self.block_call_cache)
+        self.__lens_batch_size = int(config.get('lens', 'batch_size'))
         self.__pool_df = pd.DataFrame()
+        self.__pool_rows = PoolRowBuffer(logger)  # Rows of the pools being fetched
+        self.__pool_rows_flush = int(config.get('pool_rows', 'flush_rows'))
+        self.__pool_rows_resume_blocks = int(config.get('pool_rows', 'resume_blocks'))
         self.__POOL_LIMIT = int(config.get('debug', 'POOL_LIMIT'))
+        self.__use_multicall = config.getboolean('multicall', 'enabled')
+        self.__multicall_batch_size = int(config.get('multicall', 'batch_size'))
+        self.__multicall = Multicall(self.__w3, logger, self.__w3.eth.contract(
+            abi=read_json('ABI/multicall.json'), address=self.__w3.toChecksumAddress(config.get('multicall', 'address'))))
+        self.__hub_tokens = [self.__w3.toChecksumAddress(address.strip())
+                             for address in config.get('price_graph', 'hub_tokens').split(',')]
+        self.__price_graph = None  # Built once per run by build_price_graph
+        self.__use_registry = config.getboolean('registry', 'enabled')
+        self.__log_block_range = int(config.get('registry', 'log_block_range'))
+        self.__pool_registry = pool_registry if pool_registry is not None else PoolRegistry(logger)
+        self.__reserve_tracker = None  # Reserves are read with getReserves when the tracker is disabled
+        if follow_chain_head and config.getboolean('reserves', 'enabled'):
+            self.__reserve_tracker = ReserveTracker(self.__w3, logger, int(config.get('reserves', 'reorg_depth')),
+                                                    int(config.get('reserves', 'log_block_range')),
+                                                    int(config.get('reserves', 'missing_recheck_blocks')))
+        self.__max_catch_up_blocks = int(config.get('reserves', 'max_catch_up_blocks'))
+        self.__swap_volume_tracker = None  # Only used when the volume comes from the chain
+        if follow_chain_head and config.get('volume', 'source') == 'chain':
+            self.__swap_volume_tracker = SwapVolumeTracker(
+                self.__w3, logger, int(config.get('swap_volume', 'reorg_depth')),
+                int(config.get('swap_volume', 'bucket_blocks')), 7 * DAILY_BLOCKS,
+                int(config.get('swap_volume', 'log_block_range')), int(config.get('swap_volume', 'max_log_block_range')))
         # self.fetch_all_pool_information_from_master_chef()
 
+    def __create_provider(self):
+        if config.getboolean('rpc', 'batch_requests'):
+            # Calls made at the same time from the worker threads are sent to the node as one JSON-RPC batch
+            return BatchHTTPProvider(self.node_addresses[0], int(config.get('rpc', 'max_batch_size')),
+                                     float(config.get('rpc', 'flush_interval')), endpoint_pool=self.endpoint_pool,
+                                     max_in_flight=int(config.get('rpc', 'max_batches_in_flight')))
+        if self.endpoint_pool is not None:
+            return PooledHTTPProvider(self.endpoint_pool)
+        return Web3.HTTPProvider(self.node_addresses[0])
+
+    def _create_rate_limiter(self, max_limit: int) -> AdaptiveRateLimiter:
+        # None when [rate_limit] is disabled
+        if not config.getboolean('rate_limit', 'enabled'):
+            return None
+        return AdaptiveRateLimiter(self.__log, min(int(config.get('rate_limit', 'initial_concurrency')), max_limit),
+                                   int(config.get('rate_limit', 'min_concurrency')), max_limit,
+                                   float(config.get('rate_limit', 'backoff_factor')),
+                                   float(config.get('rate_limit', 'latency_tolerance')),
+                                   int(config.get('rate_limit', 'retries')),
+                                   float(config.get('rate_limit', 'retry_base_delay')),
+                                   float(config.get('rate_limit', 'retry_max_delay')))
+
+    def get_pool_registry(self) -> PoolRegistry:
+        return self.__pool_registry
+
+    def get_provider(self) -> BaseProvider:
+        return self.__w3.provider
+
+    def get_rate_limiter(self) -> AdaptiveRateLimiter:
+        return self.__rate_limiter
+
+    def pin_block(self, block_number: int = None) -> int:
+        # Pins every following read to one block so TVL, Farm_Liquidity and CAKE price come from the same chain
+        # state, and repeated reads are served from the block call cache
+        try:
+            self.__pinned_latest = block_number is None
+            if block_number is None:
+                block_number = self.__w3.eth.block_number
+            self.block_identifier = block_number
+            self.__log.info('Reading chain state at block {block}'.format(block=block_number))
+            return block_number
+        except Exception as e:
+            print('Error in pin_block, reading latest state {e}'.format(e=e))
+            self.__log.info('Error in pin_block, reading latest state {e}'.format(e=e))
+            self.block_identifier = 'latest'
+            return None
+
     def fetch_all_pool_information_from_master_chef(self) -> pd.DataFrame:
         try:
-            total_pair = self.__master_chef_contract.functions.poolLength().call()  # Total Pools in master chef
+            total_pair = self.__master_chef_contract.functions.poolLength().call(
+                block_identifier=self.block_identifier)  # Total Pools in master chef
             if self.__debugging:
                 total_pair = self.__POOL_LIMIT
-            
-            for index in range(0, total_pair):
-                self.__get_pool_information_from_blockchain_using_index(
-                    index)  # Passing The Index Number To MasterChef Contract
 
-            self.__pool_df = self.__pool_df.reset_index(drop=True)
+            if self.__use_registry:
+                self.__pool_df = self.__sync_pool_registry(total_pair)
+            else:
+                self.__pool_df = self._fetch_pool_information_using_indices(list(range(0, total_pair)))
             self.__pool_df = self.__pool_df.set_index('index')
 
             return self.__pool_df
@@ -68,6 +214,125 @@ class PancakeSwapBlockchain:
                             format(e=error))
         self.__pool_df.to_csv('./Data Set/master_chef_v2.csv')  # Storing Information To csv file
 
+    def fetch_pool_information_at_block(self, block_number: int) -> pd.DataFrame:
+        # Pool information with TVL and Farm_Liquidity as they were at a past block, needs an archive node
+        # The pool registry is not used, it only knows the current allocation points, and the reserve tracker
+        # follows the head of the chain, so the reserves are read with getReserves. Backfill clients are created
+        # without the tracker, it is only dropped here when a client of the head reads a past block.
+        try:
+            self.__reserve_tracker = None
+            self.pin_block(block_number)
+            total_pair = self.__master_chef_contract.functions.poolLength().call(
+                block_identifier=self.block_identifier)
+            if self.__debugging:
+                total_pair = min(total_pair, self.__POOL_LIMIT)
+            pool_information = self._fetch_pool_information_using_indices(list(range(0, total_pair)))
+            if pool_information.empty:
+                return pool_information
+            return self.calculate_current_liquidity_balance(pool_information.set_index('index'))
+        except Exception as e:
+            print('Error in fetch_pool_information_at_block {block} {e}'.format(block=block_number, e=e))
+            self.__log.info('Error in fetch_pool_information_at_block {block} {e}'.format(block=block_number, e=e))
+            return pd.DataFrame()
+
+    def get_block_number_at(self, timestamp: int) -> int:
+        # Number of the last block mined at or before the unix timestamp, binary search over the block timestamps
+        low, high = 0, self.__w3.eth.block_number
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.__w3.eth.get_block(middle)['timestamp'] <= timestamp:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _fetch_pool_information_using_indices(self, indices: list) -> pd.DataFrame:
+        # Fetches the pool information for the given MasterChef indices, pools which are not pairs are left out
+        # At a pinned block the rows are also written to a partial file as they come, the next run after a crash
+        # only fetches the pools which are not in it
+        self.__pool_rows = self._create_pool_row_buffer()
+        requested_indices = indices
+        if self.__pool_rows.load():
+            fetched_indices = self.__pool_rows.get_indices()
+            indices = [index for index in indices if index not in fetched_indices]
+        if self.__pool_lens is not None:
+            indices = self.__get_pool_information_using_lens(indices)  # Only the indices left if the lens failed
+        if self.__use_multicall:
+            for start in range(0, len(indices), self.__multicall_batch_size):
+                self.__get_pool_information_from_blockchain_using_multicall(
+                    indices[start:start + self.__multicall_batch_size])
+        else:
+            for index in indices:
+                self.__get_pool_information_from_blockchain_using_index(
+                    index)  # Passing The Index Number To MasterChef Contract
+        pool_information = self.__pool_rows.to_dataframe()
+        self.__pool_rows.remove()
+        return pool_information[pool_information['index'].isin(requested_indices)].reset_index(drop=True)
+
+    def _create_pool_row_buffer(self) -> PoolRowBuffer:
+        # Partial file of the pinned block, a rerun of an explicit block (a backfilled day) pins the same block again,
+        # a rerun of the latest block takes over the file of the crashed run when it is recent enough
+        if not isinstance(self.block_identifier, int):
+            return PoolRowBuffer(self.__log)
+        if self.__pinned_latest:
+            path = get_latest_partial_path(self.__log, self.block_identifier, self.__pool_rows_resume_blocks)
+        else:
+            path = get_partial_path(self.block_identifier)
+        return PoolRowBuffer(self.__log, path, self.__pool_rows_flush)
+
+    def __sync_pool_registry(self, total_pair: int) -> pd.DataFrame:
+        # Brings the pool registry up to date and returns the pool information of all its pools
+        # Only the pools added since the last sync are fetched, allocation points of the
+        # known pools are updated from the SetPool events since the last synced block
+        if self.block_identifier == 'latest':
+            current_block = self.__w3.eth.block_number
+        else:
+            current_block = self.block_identifier
+        synced_pool_length = self.__pool_registry.get_pool_length()
+        last_block = self.__pool_registry.get_last_block()
+        if synced_pool_length and last_block:
+            self.__update_allocation_points_from_events(last_block + 1, current_block)
+
+        indices = self.__pool_registry.get_skipped_pools() + list(range(synced_pool_length, total_pair))
+        new_pools = self._fetch_pool_information_using_indices(indices)
+        fetched_indices = set()
+        if not new_pools.empty:
+            self.__pool_registry.save_pools(new_pools[['index', 'lpToken', 'allocPoint', 'isRegular']].to_dict('records'))
+            fetched_indices = set(new_pools['index'].astype(int))
+        self.__pool_registry.set_synced(max(total_pair, synced_pool_length), current_block,
+                                        [index for index in indices if index not in fetched_indices])
+
+        rows = []
+        for pool in self.__pool_registry.get_pools():
+            if pool['index'] >= total_pair:  # In case of debugging only the pools up to pool_limit
+                continue
+            tokens_address_and_symbol_information = self.__get_tokens_information_from_pool_address(pool['lpToken'])
+            if tokens_address_and_symbol_information:
+                pool.update(tokens_address_and_symbol_information)
+                rows.append(pool)
+        return pd.DataFrame(rows)
+
+    def __update_allocation_points_from_events(self, from_block: int, to_block: int):
+        # isRegular can not be changed after a pool is added, only allocPoint is changed by MasterChef set()
+        try:
+            for start in range(from_block, to_block + 1, self.__log_block_range):
+                end = min(start + self.__log_block_range - 1, to_block)
+                for event in self.__master_chef_contract.events.SetPool.getLogs(fromBlock=start, toBlock=end):
+                    self.__pool_registry.update_allocation_point(event['args']['pid'], event['args']['allocPoint'])
+        except Exception as e:
+            # Without the events the allocation points of all the known pools are read again
+            print('Error reading SetPool events, refreshing all allocation points {e}'.format(e=e))
+            self.__log.info('Error reading SetPool events, refreshing all allocation points {e}'.format(e=e))
+            self.__refresh_allocation_points()
+
+    def __refresh_allocation_points(self):
+        indices = [pool['index'] for pool in self.__pool_registry.get_pools()]
+        pool_informations = self.__read_all([self.__master_chef_codec.prepare(self.__pancake_masterChef, 'poolInfo', index)
+                                             for index in indices])
+        for index, pool_information in zip(indices, pool_informations):
+            if pool_information is not None:
+                self.__pool_registry.update_allocation_point(index, pool_information[2])  # ALLOCATED POINTS
+
     def __get_pool_information_from_blockchain_using_index(self, index: int, debug: bool = False,verbose:bool=False):
         try:
             pool_address = self.__w3.toChecksumAddress(self.__get_pool_address_from_masterchef_using_index(index))
@@ -80,15 +345,135 @@ class PancakeSwapBlockchain:
                 pool_information.update(tokens_address_and_symbol_information)
                 if verbose:
                     print(pool_information)
-                self.__pool_df = self.__pool_df.append(pool_information, ignore_index=True)
+                self.__pool_rows.append(pool_information)
         except Exception as e:
             print('Error in function fetch_pool_information_from_blockchain: {e}'.format(e=e))
             self.__log.info('Error in function fetch_pool_information_from_blockchain: {e}'.format(e=e))
 
+    def __get_pool_information_from_blockchain_using_multicall(self, indices: list, verbose: bool = False):
+        # Same information as __get_pool_information_from_blockchain_using_index but for a batch of indices
+        # Three aggregated calls per batch: lpToken + poolInfo, token0 + token1, symbol of every new token
+        try:
+            functions = []
+            for index in indices:
+                functions.append(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'lpToken', index))
+                functions.append(self.__master_chef_codec.prepare(self.__pancake_masterChef, 'poolInfo', index))
+            results = self.__multicall.aggregate(functions, self.block_identifier)
+            pools = []
+            for position, index in enumerate(indices):
+                pool_address, pool_information = results[2 * position], results[2 * position + 1]
+                if pool_address is None or pool_information is None:
+                    print('Error in function __get_pool_information_from_blockchain_using_multicall: '
+                          'could not read pool {index}'.format(index=index))
+                    self.__log.info('Error in function __get_pool_information_from_blockchain_using_multicall: '
+                                    'could not read pool {index}'.format(index=index))
+                    continue
+                pools.append({
+                    'index': index,
+                    'lpToken': pool_address,
+                    'allocPoint': pool_information[2],  # ALLOCATED POINTS
+                    'isRegular': pool_information[4]  # TYPE OF POOL
+                })
+
+            uncached_pools = [pool for pool in pools if self.metadata_cache.get_pair_tokens(pool['lpToken']) is None]
+            functions = []
+            for pool in uncached_pools:
+                functions.append(self.__pair_codec.prepare(pool['lpToken'], 'token0'))
+                functions.append(self.__pair_codec.prepare(pool['lpToken'], 'token1'))
+            results = self.__multicall.aggregate(functions, self.block_identifier)
+            for position, pool in enumerate(uncached_pools):
+                token0, token1 = results[2 * position], results[2 * position + 1]
+                if token0 is not None and token1 is not None:
+                    self.metadata_cache.set_pair_tokens(pool['lpToken'], token0, token1)
+            valid_pools = []
+            for pool in pools:
+                tokens_list = self.metadata_cache.get_pair_tokens(pool['lpToken'])
+                if tokens_list is None:  # Not a pair contract, same as __validate_pool failing
+                    continue
+                pool['token0'], pool['token1'] = tokens_list
+                valid_pools.append(pool)
+
+            tokens = list(dict.fromkeys([pool['token0'] for pool in valid_pools] +
+                                        [pool['token1'] for pool in valid_pools]))
+            uncached_tokens = [token for token in tokens if self.metadata_cache.get_token(token) is None]
+            functions = []
+            for token in uncached_tokens:
+                functions.append(self.__token_codec.prepare(token, 'symbol'))
+                functions.append(self.__token_codec.prepare(token, 'decimals'))
+            results = self.__multicall.aggregate(functions, self.block_identifier)
+            symbols = {}
+            for position, token in enumerate(uncached_tokens):
+                symbol, decimals = results[2 * position], results[2 * position + 1]
+                if symbol is not None and decimals is not None:
+                    self.metadata_cache.set_token(token, symbol, decimals)
+                symbols[token] = symbol
+            for token in tokens:
+                if self.metadata_cache.get_token(token) is not None:
+                    symbols[token] = self.metadata_cache.get_token(token)['symbol']
+
+            rows = []
+            for pool in valid_pools:
+                row = {
+                    'index': pool['index'],
+                    'lpToken': pool['lpToken'],
+                    'allocPoint': pool['allocPoint'],
+                    'isRegular': pool['isRegular'],
+                    'token0': pool['token0'],
+                    'token0_name': symbols[pool['token0']],
+                    'token1': pool['token1'],
+                    'token1_name': symbols[pool['token1']],
+                }
+                if verbose:
+                    print(row)
+                rows.append(row)
+            self.__pool_rows.extend(rows)
+        except Exception as e:
+            print('Error in function __get_pool_information_from_blockchain_using_multicall: {e}'.format(e=e))
+            self.__log.info('Error in function __get_pool_information_from_blockchain_using_multicall: {e}'.format(e=e))
+
+    def __get_pool_information_using_lens(self, indices: list) -> list:
+        # Reads the pools in batches with one lens eth_call each, returns the indices which are still to be read
+        # when the node does not support the state override of the lens
+        for start in range(0, len(indices), self.__lens_batch_size):
+            try:
+                pools = self.__pool_lens.read_pools(indices[start:start + self.__lens_batch_size],
+                                                    self.block_identifier)
+            except Exception as e:
+                print('Lens call failed, reading pools without the lens {e}'.format(e=e))
+                self.__log.info('Lens call failed, reading pools without the lens {e}'.format(e=e))
+                self.__pool_lens = None
+                return indices[start:]
+            rows = []
+            for pool in pools:
+                if pool['lpToken'] is None or pool['poolInfo'] is None:
+                    print('Error in function __get_pool_information_using_lens: could not read pool {index}'.format(
+                        index=pool['index']))
+                    self.__log.info('Error in function __get_pool_information_using_lens: could not read pool '
+                                    '{index}'.format(index=pool['index']))
+                    continue
+                if pool['token0'] is None or pool['token1'] is None:  # Not a pair contract
+                    continue
+                self.metadata_cache.set_pair_tokens(pool['lpToken'], pool['token0'], pool['token1'])
+                for token in ('token0', 'token1'):
+                    if pool[token + '_symbol'] is not None and pool[token + '_decimals'] is not None:
+                        self.metadata_cache.set_token(pool[token], pool[token + '_symbol'], pool[token + '_decimals'])
+                rows.append({
+                    'index': pool['index'],
+                    'lpToken': pool['lpToken'],
+                    'allocPoint': pool['poolInfo'][2],  # ALLOCATED POINTS
+                    'isRegular': pool['poolInfo'][4],  # TYPE OF POOL
+                    'token0': pool['token0'],
+                    'token0_name': pool['token0_symbol'],
+                    'token1': pool['token1'],
+                    'token1_name': pool['token1_symbol'],
+                })
+            self.__pool_rows.extend(rows)
+        return []
+
     def __get_pool_allocation_point_and_type_from_master_chef_using_index(self, index: int) -> dict:
         try:
-            pool_information = self.__master_chef_contract.functions.poolInfo(
-                index).call()
+            pool_information = self.__master_chef_codec.prepare(self.__pancake_masterChef, 'poolInfo', index).call(
+                block_identifier=self.block_identifier)
             row = {
                 'index': int(index),
                 'allocPoint': pool_information[2],  # ALLOCATED POINTS
@@ -103,9 +488,14 @@ class PancakeSwapBlockchain:
 
     def __get_tokens_addresses_from_pool_address(self, address: str) -> list:
         try:
-            pair_contract = self.__w3.eth.contract(address=address, abi=self.pair_abi)
-            token0 = pair_contract.functions.token0().call()  # Address of Token 0 in Pool
-            token1 = pair_contract.functions.token1().call()  # Address of Token 1 in Pool
+            tokens_list = self.metadata_cache.get_pair_tokens(address)  # Tokens of a pair never change
+            if tokens_list is not None:
+                return tokens_list
+            token0 = self.__pair_codec.prepare(address, 'token0').call(
+                block_identifier=self.block_identifier)  # Address of Token 0 in Pool
+            token1 = self.__pair_codec.prepare(address, 'token1').call(
+                block_identifier=self.block_identifier)  # Address of Token 1 in Pool
+            self.metadata_cache.set_pair_tokens(address, token0, token1)
             return [token0, token1]
         except Exception as e:
             print('Error in function __get_tokens_addresses_from_pool_address: {e}'.format(e=e))
@@ -114,8 +504,8 @@ class PancakeSwapBlockchain:
 
     def __get_pool_address_from_masterchef_using_index(self, index: int) -> str:
         try:
-            pool_address = self.__master_chef_contract.functions.lpToken(
-                index).call()
+            pool_address = self.__master_chef_codec.prepare(self.__pancake_masterChef, 'lpToken', index).call(
+                block_identifier=self.block_identifier)
             return pool_address
         except Exception as e:
             print('Error in function __get_pool_address_from_masterchef_using_index: {e}'.format(e=e))
@@ -155,28 +545,47 @@ class PancakeSwapBlockchain:
 
     def __get_token_symbol_from_address(self, address: str) -> str:
         try:
-            token_contract = self.__w3.eth.contract(address=address, abi=self.token_abi)
-            token_symbol = token_contract.functions.symbol().call()  # Address of Token 0 in Pool
-            return token_symbol
+            return self.__get_token_metadata(address)['symbol']
         except Exception as e:
             print('Error in function __get_token_name_and_symbol_from_address: {e}'.format(e=e))
             self.__log.info('Error in function __get_token_name_and_symbol_from_address: {e}'.format(e=e))
 
+    def __get_token_decimals(self, address: str) -> int:
+        try:
+            return self.__get_token_metadata(address)['decimals']
+        except Exception as e:
+            print('Error in function __get_token_decimals, using {d}: {e}'.format(d=DECIMAL_PLACES, e=e))
+            self.__log.info('Error in function __get_token_decimals, using {d}: {e}'.format(d=DECIMAL_PLACES, e=e))
+            return DECIMAL_PLACES
+
+    def __get_token_metadata(self, address: str) -> dict:
+        # Symbol and decimals of a token never change, they are fetched once and kept in the metadata cache
+        token_metadata = self.metadata_cache.get_token(address)
+        if token_metadata is None:
+            token_symbol = self.__token_codec.prepare(address, 'symbol').call(block_identifier=self.block_identifier)
+            token_decimals = self.__token_codec.prepare(address, 'decimals').call(block_identifier=self.block_identifier)
+            self.metadata_cache.set_token(address, token_symbol, token_decimals)
+            token_metadata = {'symbol': token_symbol, 'decimals': token_decimals}
+        return token_metadata
+
     def get_master_chef_information(
             self) -> dict:  # it Get Basic Information From Pancake Masterchef v2 For Calculation
         try:
-            total_regular_allocation = self.__master_chef_contract.functions.totalRegularAllocPoint().call()
+            total_regular_allocation = self.__master_chef_contract.functions.totalRegularAllocPoint().call(
+                block_identifier=self.block_identifier)
             # Regular Allocated Point
-            total_special_allocation = self.__master_chef_contract.functions.totalSpecialAllocPoint().call()
+            total_special_allocation = self.__master_chef_contract.functions.totalSpecialAllocPoint().call(
+                block_identifier=self.block_identifier)
             # Special Allocated Point
             regular_cake_per_block = self.__master_chef_contract.functions.cakePerBlock(
-                True).call()  # Number Of Cake Per Block For Regular Pools
+                True).call(block_identifier=self.block_identifier)  # Number Of Cake Per Block For Regular Pools
+            cake_decimals = self.__get_token_decimals(self.__cake_address)
             regular_cake_per_block = regular_cake_per_block / (
-                    10 ** DECIMAL_PLACES)  # Converting the CAKE Quantity From WEI TO CAKE
+                    10 ** cake_decimals)  # Converting the CAKE Quantity From WEI TO CAKE
             special_cake_per_block = self.__master_chef_contract.functions.cakePerBlock(
-                False).call()  # Number Of Cake Per Block For Special Pools
+                False).call(block_identifier=self.block_identifier)  # Number Of Cake Per Block For Special Pools
             special_cake_per_block = special_cake_per_block / (
-                    10 ** DECIMAL_PLACES)  # Converting the Cake Quanity FROM WEI TO CAKE
+                    10 ** cake_decimals)  # Converting the Cake Quanity FROM WEI TO CAKE
             row = {
                 'total_regular_allocation': total_regular_allocation,
                 'total_special_allocation': total_special_allocation,
@@ -197,41 +606,33 @@ class PancakeSwapBlockchain:
             self.__log.info('Error get_platform_token_price {e}'.format(e=e))
             return 0
 
+    def get_pair_amounts(self, pair_address: str) -> list:
+        # Reserves of a pool in token units as loaded by the last build_price_graph, None if not loaded
+        if self.__price_graph is None:
+            return None
+        return self.__price_graph.get_pair_amounts(pair_address)
+
     def __get_reserves(self, pair_address: str) -> tuple:
         try:
-            usdt_pair_contract = self.__w3.eth.contract(abi=self.pair_abi, address=pair_address)
-            reserves = usdt_pair_contract.functions.getReserves().call()
+            reserves = self.__pair_codec.prepare(pair_address, 'getReserves').call(
+                block_identifier=self.block_identifier)
             return reserves
         except Exception as e:
             print('Error Fetching Reserves: {e}'.format(e=e))
             self.__log.info('Error Fetching Reserves: {e}'.format(e=e))
 
-    def __find_pair(self, token0: str, token1: str) -> str:
-        # Check the token0 & Token1 and Try to find it any of them exist with USDT and if so,
-        # then what is the usdt price of that token
-        try:
-            pair_address = self.__factory_contract.functions.getPair(token0,
-                                                                     self.__usdt_address).call()  # calling pancake
-            # factory getPair function
-            if pair_address == '0x0000000000000000000000000000000000000000':  # Checking if Pair Address is valid or not
-                pair_address = self.__factory_contract.functions.getPair(token1, self.__usdt_address).call()
-            return pair_address
-        except Exception as e:
-            print('Error Finding Pair: {e}'.format(e=e))
-            self.__log.info('Error Finding Pair: {e}'.format(e=e))
-            return '0'
-
     def get_token_usdt_price(self, token_address: str) -> float:  # Fetches the price of token in terms of USDT
         try:
-            # Check if Pair Exist With USDT FIRST
-            pair_address = self.__factory_contract.functions.getPair(token_address, self.__usdt_address).call()
-            if pair_address != '0x0000000000000000000000000000000000000000':  # Get Reserves
-                pair_contract = self.__w3.eth.contract(address=pair_address, abi=self.pair_abi)
-                reserves = pair_contract.functions.getReserves().call()
-                if token_address > self.__usdt_address:
-                    return reserves[0] / reserves[1]
-                else:
-                    return reserves[1] / reserves[0]
+            if self.__price_graph is not None and self.__price_graph.get_price(token_address):
+                return self.__price_graph.get_price(token_address)  # Already priced in this run
+            # Check if Pair Exist With USDT FIRST, the pair address is computed locally and the pair
+            # exists if it answers getReserves
+            pair_address = self.__pair_address_resolver.get_pair_address(token_address, self.__usdt_address)
+            reserves = self.__call_or_none(self.__pair_codec.prepare(pair_address, 'getReserves'))
+            if reserves is not None:
+                return token_price_from_usdt_reserves(token_address, self.__usdt_address, reserves,
+                                                      self.__get_token_decimals(token_address),
+                                                      self.__get_token_decimals(self.__usdt_address))
             else:
                 print('Pair With USDT doenst exist {token}'.format(token=token_address))
                 return 0
@@ -240,6 +641,111 @@ class PancakeSwapBlockchain:
             self.__log.info('Error in __get_token_usdt_price {e}'.format(e=e))
             return 0
 
+    def build_price_graph(self, pool_information: pd.DataFrame) -> PriceGraph:
+        # Loads the reserves of every pool and of every pair between a pool token and a hub token
+        # (USDT, WBNB, BUSD, CAKE ...) once, and prices all the tokens through their best liquidity route
+        try:
+            hub_tokens = [self.__usdt_address] + [token for token in self.__hub_tokens if token != self.__usdt_address]
+            tokens = list(dict.fromkeys(list(pool_information['token0']) + list(pool_information['token1']) +
+                                        hub_tokens + [self.__cake_address]))
+            candidates = list({frozenset([token, hub_token]): (token, hub_token) for token in tokens
+                               for hub_token in hub_tokens if token != hub_token}.values())
+            # Hub pair addresses are computed locally, pairs which were never deployed have no code so their
+            # getReserves fails and they are left out of the graph
+            pairs = {}
+            for token, hub_token in candidates:
+                pairs[self.__pair_address_resolver.get_pair_address(token, hub_token)] = \
+                    PairAddressResolver.sort_tokens(token, hub_token)
+            pairs.update({row['lpToken']: (row['token0'], row['token1'])
+                          for index, row in pool_information.iterrows()})
+
+            pair_addresses = list(pairs.keys())
+            reserves = self.__read_reserves(pair_addresses)
+            price_graph = PriceGraph(self.__usdt_address)
+            for pair_address, pair_reserves in zip(pair_addresses, reserves):
+                if pair_reserves is not None:
+                    price_graph.add_pair(pair_address, pairs[pair_address][0], pairs[pair_address][1], pair_reserves)
+            for token in tokens:
+                price_graph.set_decimals(token, self.__get_token_decimals(token))
+            price_graph.calculate_prices()
+            self.__price_graph = price_graph
+            return price_graph
+        except Exception as e:
+            print('Error in build_price_graph {e}'.format(e=e))
+            self.__log.info('Error in build_price_graph {e}'.format(e=e))
+
+    def __read_reserves(self, pair_addresses: list) -> list:
+        # Reserves of the pairs at the block of the run, None for the pairs which do not exist
+        # With the reserve tracker only the pairs seen for the first time are read with getReserves,
+        # the others are brought up to date from their Sync events
+        if self.__reserve_tracker is not None:
+            try:
+                block_number = self.block_identifier
+                if not isinstance(block_number, int):
+                    block_number = self.__w3.eth.block_number
+                safe_block = self.__reserve_tracker.get_safe_block(block_number)
+                checkpoint = self.__reserve_tracker.get_checkpoint()
+                if checkpoint and safe_block - checkpoint > self.__max_catch_up_blocks:
+                    self.__reserve_tracker.reset()  # Reading every pair again is cheaper than the logs
+                if block_number >= self.__reserve_tracker.get_checkpoint() and self.__reserve_tracker.sync(safe_block):
+                    checkpoint = self.__reserve_tracker.get_checkpoint()
+                    untracked = self.__reserve_tracker.get_untracked(pair_addresses, checkpoint)
+                    backfill = self.__read_all([self.__pair_codec.prepare(pair_address, 'getReserves')
+                                                for pair_address in untracked], checkpoint)
+                    self.__reserve_tracker.add_pairs({pair_address: pair_reserves for pair_address, pair_reserves
+                                                      in zip(untracked, backfill) if pair_reserves is not None},
+                                                     checkpoint)
+                    # A failed getReserves can also be a throttled call, only the pairs without code are missing
+                    self.__reserve_tracker.add_missing(self.__get_addresses_without_code(
+                        [pair_address for pair_address, pair_reserves in zip(untracked, backfill)
+                         if pair_reserves is None], checkpoint), checkpoint)
+                    reserves = self.__reserve_tracker.get_reserves(pair_addresses, block_number)
+                    if reserves is not None:
+                        return reserves
+            except Exception as e:
+                print('Error in reserve tracker, reading reserves with getReserves {e}'.format(e=e))
+                self.__log.info('Error in reserve tracker, reading reserves with getReserves {e}'.format(e=e))
+        return self.__read_all([self.__pair_codec.prepare(pair_address, 'getReserves')
+                                for pair_address in pair_addresses])
+
+    def __get_addresses_without_code(self, addresses: list, block_number: int) -> list:
+        def has_code(address: str):
+            try:
+                return len(self.__w3.eth.get_code(address, block_number)) > 0
+            except Exception as e:
+                print('Error in get_code {e}'.format(e=e))
+                self.__log.info('Error in get_code {e}'.format(e=e))
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.__rpc_workers) as executor:
+            codes = list(executor.map(has_code, addresses))
+        return [address for address, code in zip(addresses, codes) if code is False]
+
+    def __read_all(self, functions: list, block_identifier=None) -> list:
+        # Calls all the functions and returns their results in order, None for the calls which failed
+        if block_identifier is None:
+            block_identifier = self.block_identifier
+        if self.__use_multicall:
+            results = []
+            for start in range(0, len(functions), self.__multicall_batch_size):
+                results += self.__multicall.aggregate(functions[start:start + self.__multicall_batch_size],
+                                                      block_identifier)
+            return results
+        with ThreadPoolExecutor(max_workers=self.__rpc_workers) as executor:
+            return list(executor.map(self.__call_or_none, functions, [block_identifier] * len(functions)))
+
+    def __call_or_none(self, function, block_identifier=None):
+        try:
+            if block_identifier is None:
+                block_identifier = self.block_identifier
+            return function.call(block_identifier=block_identifier)
+        except BadFunctionCallOutput:
+            return None  # No contract at the address e.g. a pair which was never created
+        except Exception as e:
+            print('Error calling {fn}: {e}'.format(fn=function.fn_name, e=e))
+            self.__log.info('Error calling {fn}: {e}'.format(fn=function.fn_name, e=e))
+            return None
+
     def calculate_current_liquidity_balance(self, pool_information: pd.DataFrame) -> pd.DataFrame:
         # This Fetches the The Reserves From the blockchain and Find out
         # 1. The TVL In the pool
@@ -249,116 +755,209 @@ class PancakeSwapBlockchain:
             pool_information['Farm_Liquidity'] = pd.Series(
                 dtype='float')  # This creates a column in the pool_df to store Farm_Liquidity
             pool_information = pool_information.fillna(0)  # Initialize The NA Value with 0
-            for index, row in pool_information.iterrows():
-                try:
-                    if index > self.__POOL_LIMIT and self.__debugging:  # in case of debugging the
-                        # breaks the loop after pool_limit
-                        break
-                    pool_contract = self.__w3.eth.contract(abi=self.pair_abi, address=row['lpToken'])
-                    # Checking For USDT Pair on pancake tokens
-                    pair_address = self.__find_pair(row['token0'], row['token1'])
-                    # print('Token0 + USDT PAIR, {pair}'.format(pair=pair_address))
-                    reserves = self.__get_reserves(pair_address)  # Fetching Reserves
-                    if row['token0'] > self.__usdt_address:  # Finding the Price of Token0 and Token1 with USDT
-                        # print("usdt address smaller")
-                        dollar_value = reserves[0] / reserves[1]
-                    else:
-                        dollar_value = reserves[1] / reserves[0]
-                    pool_reserves = self.__get_reserves(pool_contract.address)
-                    # Find Total Supply Of LP
-                    TVL = (dollar_value * (pool_reserves[
-                                               0] / 10 ** DECIMAL_PLACES) * 2)  # WEI TO BNB Conversion
-                    max_supply = pool_contract.functions.totalSupply().call()
-                    masterchef_balance = pool_contract.functions.balanceOf(
-                        self.__pancake_masterChef).call() # BALANCE INPUT
-                    Farm_Liquidity = (TVL / max_supply) * masterchef_balance  # Farming Pool Liquidity
-                    pool_information['TVL'][index] = TVL  # Storing TVL In pool_df
-                    pool_information['Farm_Liquidity'][index] = Farm_Liquidity # BALANCE INPUT
-                except Exception as e:
-                    print('Error finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
-                    self.__log.info(
-                        'Error  finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
+            rows = [(index, row) for index, row in pool_information.iterrows()
+                    if not (index > self.__POOL_LIMIT and self.__debugging)]  # in case of debugging the
+            # pools after pool_limit are skipped
+            price_graph = self.build_price_graph(pd.DataFrame([row for index, row in rows]))  # Token prices and
+            # pool reserves
+            liquidity_balances = self._calculate_liquidity_balances([row for index, row in rows], price_graph)
+            # Pools which failed e.g. while the node was throttling are read once more one at a time
+            liquidity_balances = [liquidity_balance or self.__calculate_liquidity_balance_of_pool(row)
+                                  for (index, row), liquidity_balance in zip(rows, liquidity_balances)]
+            missing_pools = [index for (index, row), liquidity_balance in zip(rows, liquidity_balances)
+                             if not liquidity_balance]
+            if missing_pools:
+                print('TVL and Farm_Liquidity could not be calculated for pools {pools}'.format(pools=missing_pools))
+                self.__log.info('TVL and Farm_Liquidity could not be calculated for pools {pools}'.format(
+                    pools=missing_pools))
+            for (index, row), liquidity_balance in zip(rows, liquidity_balances):
+                if liquidity_balance:
+                    pool_information['TVL'][index] = liquidity_balance['TVL']  # Storing TVL In pool_df
+                    pool_information['Farm_Liquidity'][index] = liquidity_balance['Farm_Liquidity']  # BALANCE INPUT
             return pool_information
         except Exception as e:
             print('Error calculate_current_liquidity_balance {e}'.format(e=e))
             self.__log.info('Error calculate_current_liquidity_balance {e}'.format(e=e))
 
+    def _calculate_liquidity_balances(self, rows: list, price_graph: PriceGraph) -> list:
+        # TVL and Farm_Liquidity of every row, an empty dict for the pools which failed
+        # Each pool is calculated in its own worker thread so the provider can batch their calls together
+        with ThreadPoolExecutor(max_workers=self.__rpc_workers) as executor:
+            return list(executor.map(self.__calculate_liquidity_balance_of_pool, rows))
+
+    def fetch_current_trading_balance_for_all_pool(self, pool_information: pd.DataFrame) -> pd.DataFrame:
+        # Volume of the last 24h and 7d of every pool from its Swap events, valued with the token prices of
+        # the run. Same volume_24h and lp_reward_fee_24h columns as WebScraper, and volume_7d / lp_reward_fee_7d
+        try:
+            for column in ['volume_24h', 'lp_reward_fee_24h', 'volume_7d', 'lp_reward_fee_7d']:
+                pool_information[column] = pd.Series(dtype='float')
+            pool_information = pool_information.fillna(0)
+            rows = [(index, row) for index, row in pool_information.iterrows()
+                    if not (index > self.__POOL_LIMIT and self.__debugging)]
+            if self.__price_graph is None:
+                self.build_price_graph(pd.DataFrame([row for index, row in rows]))
+            block_number = self.block_identifier
+            if not isinstance(block_number, int):
+                block_number = self.__w3.eth.block_number
+            pool_addresses = [row['lpToken'] for index, row in rows]
+            if not self.__swap_volume_tracker.sync(pool_addresses, block_number):
+                print('Swap events could not all be fetched, the volume of some pools is incomplete')
+                self.__log.info('Swap events could not all be fetched, the volume of some pools is incomplete')
+            for column, blocks in [('24h', DAILY_BLOCKS), ('7d', 7 * DAILY_BLOCKS)]:
+                volumes = self.__swap_volume_tracker.get_volumes(pool_addresses, block_number, blocks)
+                for index, row in rows:
+                    amount0, amount1 = volumes[row['lpToken']]
+                    # Every swap adds the amount in on one side and out on the other, so the sum counts it twice
+                    volume = (amount0 / 10 ** self.__get_token_decimals(row['token0']) *
+                              self.__price_graph.get_price(row['token0']) +
+                              amount1 / 10 ** self.__get_token_decimals(row['token1']) *
+                              self.__price_graph.get_price(row['token1'])) / 2
+                    pool_information['volume_' + column][index] = volume
+                    pool_information['lp_reward_fee_' + column][index] = volume * EXCHANGE_FEE / 100
+            return pool_information
+        except Exception as e:
+            print('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
+            self.__log.info('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
+
+    def __calculate_liquidity_balance_of_pool(self, row: pd.Series) -> dict:
+        try:
+            pool_address = row['lpToken']
+            # Pool reserves valued with the token prices of the price graph
+            TVL = self.__price_graph.get_pair_value(pool_address)
+            if TVL is None:
+                raise ValueError('reserves of pool {pool} could not be fetched'.format(pool=pool_address))
+            # Find Total Supply Of LP
+            max_supply = self.__pair_codec.prepare(pool_address, 'totalSupply').call(
+                block_identifier=self.block_identifier)
+            masterchef_balance = self.__pair_codec.prepare(pool_address, 'balanceOf', self.__pancake_masterChef).call(
+                block_identifier=self.block_identifier)  # BALANCE INPUT
+            Farm_Liquidity = (TVL / max_supply) * masterchef_balance  # Farming Pool Liquidity
+            return {'TVL': TVL, 'Farm_Liquidity': Farm_Liquidity}
+        except Exception as e:
+            print('Error finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
+            self.__log.info(
+                'Error  finding TVL & Farm Liquidity in calculate_current_liquidity_balance {e}'.format(e=e))
+            return {}
+
 
 class WebScraper:
+    # Reads the volume of every pool from its pancakeswap.finance page with a pool of Chrome workers
+    # The pools are split over [scraper] workers browsers which each keep their session for all their pools.
+    # Images, fonts and style sheets are blocked and pages are used as soon as the DOM is ready (eager).
+
+    BLOCKED_URLS = ['*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg',
+                    '*.webp', '*.ico']
+    __driver_path = None  # chromedriver is looked up or downloaded once per process
+    __driver_path_lock = threading.Lock()
 
     def __init__(self, logger:Logger, debug:bool):
         self.__debugging = debug
         self.__log = logger
         self.__url = config.get('settings', 'url')
         self.__POOL_LIMIT = int(config.get('debug', 'POOL_LIMIT'))
-    
+        self.__workers = int(config.get('scraper', 'workers'))
+        self.__headless = config.getboolean('scraper', 'headless')
+        self.__timeout = float(config.get('scraper', 'timeout'))
+        self.__days = int(config.get('volume', 'days'))
+
     def fetch_current_trading_balance_for_all_pool(self, pool_information: pd.DataFrame) -> pd.DataFrame:
         # Fetches Today Traded Volume For Each Pool
         try:
             pool_information['volume_24h'] = pd.Series(dtype='float')
             pool_information['lp_reward_fee_24h'] = pd.Series(dtype='float')
             pool_information = pool_information.fillna(0)
-            driver = webdriver.Chrome(ChromeDriverManager().install())  # Selecting Browser to Open
-            driver.minimize_window() 
-            # driver.get(url) # Open the url on web browser
-            try:
-                # We Loop through all the Pools Available in the File and repeat the process for each Pool
-                for index, row in pool_information.iterrows():
-                    try:
-                        if index > self.__POOL_LIMIT and self.__debugging:
-                            break
-                        pool_website_information = self.__get_pool_information_from_address(driver, row['lpToken'])
-                        pool_information['volume_24h'][index] = pool_website_information['volume_24h']
-                        pool_information['lp_reward_fee_24h'][index] = pool_website_information['lp_reward_fee_24h']
-                        # We Store this information in our Computer Memory
-                        print(pool_information.loc[(pool_information['lpToken'] == row['lpToken'])].to_string())
-                    except Exception as error:
-                        # If the Pool is not Found on pankcake, We ignore it
-                        print('Pool Not Found, ignoring pool {pool}'.format(pool=row['lpToken']))
-                        self.__log.info('Pool Not Found, ignoring pool {pool}'.format(pool=row['lpToken']))
-                return pool_information
-            except Exception as error:
-                print('Error in fetch_pool_information_from_web {e}'.format(e=error))
-                self.__log.info('Error in fetch_pool_information_from_web {e}'.format(e=error))
-
+            pools = [(index, row['lpToken']) for index, row in pool_information.iterrows()
+                     if not (index > self.__POOL_LIMIT and self.__debugging)]
+            workers = max(1, min(self.__workers, len(pools)))
+            # Every worker gets every workers-th pool, so slow and fast pages are spread evenly
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self.__fetch_pools, [pools[worker::workers]
+                                                                 for worker in range(workers)]))
+            for worker_results in results:
+                for index, pool_website_information in worker_results:
+                    pool_information['volume_24h'][index] = pool_website_information['volume_24h']
+                    pool_information['lp_reward_fee_24h'][index] = pool_website_information['lp_reward_fee_24h']
+            return pool_information
         except Exception as e:
             print('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
             self.__log.info('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
 
+    def __fetch_pools(self, pools: list) -> list:
+        # Runs in its own thread with its own browser, returns (index, information) of the pools found
+        results = []
+        try:
+            driver = self.__create_driver()
+        except Exception as error:
+            print('Error in fetch_pool_information_from_web {e}'.format(e=error))
+            self.__log.info('Error in fetch_pool_information_from_web {e}'.format(e=error))
+            return results
+        try:
+            # We Loop through the Pools of this worker and repeat the process for each Pool
+            for index, pool_address in pools:
+                try:
+                    pool_website_information = self.__get_pool_information_from_address(driver, pool_address)
+                    results.append((index, pool_website_information))
+                    print('{pool} {information}'.format(pool=pool_address, information=pool_website_information))
+                except Exception as error:
+                    # If the Pool is not Found on pankcake, We ignore it
+                    print('Pool Not Found, ignoring pool {pool}'.format(pool=pool_address))
+                    self.__log.info('Pool Not Found, ignoring pool {pool}'.format(pool=pool_address))
+        finally:
+            driver.quit()
+        return results
+
+    def __create_driver(self):
+        options = webdriver.ChromeOptions()
+        if self.__headless:
+            options.add_argument('--headless=new')
+        options.page_load_strategy = 'eager'  # The values come from the network responses, not the page
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})  # Network events of the pages
+        driver = webdriver.Chrome(service=Service(self.__get_driver_path()), options=options)
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.BLOCKED_URLS})
+        if not self.__headless:
+            driver.minimize_window()
+        return driver
+
+    @classmethod
+    def __get_driver_path(cls) -> str:
+        # The driver of config.ini when the file is there, otherwise the one of webdriver-manager
+        with cls.__driver_path_lock:
+            if cls.__driver_path is None:
+                driver_path = config.get('settings', 'windows_driver' if os.name == 'nt' else 'driver')
+                if not os.path.exists(driver_path):
+                    driver_path = ChromeDriverManager().install()
+                cls.__driver_path = driver_path
+            return cls.__driver_path
+
     def __get_pool_information_from_address(self, driver,
-                                            token_address: str) -> dict:  # This Function Scrap the values
+                                            token_address: str) -> dict:  # This Function Reads the values
         # from pancake.finance including daily volume
+        # The page loads the daily volume of the pool as JSON, its network responses are read through the
+        # DevTools performance log as soon as they arrive instead of waiting for the page to render them
         try:
+            driver.get_log('performance')  # Drops the responses of the previous page
             url = self.__url + token_address
             driver.get(url)  # Open the url on web browser
-            timeouts = 15
-            # Once the Pool link is opened , we Open it up and Get the Values
-            #time.sleep(timeouts)
-            Button_7d = WebDriverWait(driver, timeouts).until(ec.presence_of_element_located(
-                (By.XPATH,
-                 "/html/body/div[1]/div[1]/div[3]/div/div[2]/div[3]/div[1]/div[2]/div/div/div[1]/button[2]")))
-            Button_7d.click()
-            lp_reward = WebDriverWait(driver, timeouts).until(ec.presence_of_element_located(
-                (By.XPATH,
-                 "/html/body/div[1]/div[1]/div[3]/div/div[2]/div[3]/div[1]/div[1]/div/div/div[1]/div[2]/div[2]")))
-            volume_7d = WebDriverWait(driver, timeouts).until(ec.presence_of_element_located(
-                (By.XPATH,
-                 "/html/body/div[1]/div[1]/div[3]/div/div[2]/div[3]/div[1]/div[2]/div/div/div[2]/div[1]/div[2]")))
-            lp_reward_fee_7d = WebDriverWait(driver, timeouts).until(ec.presence_of_element_located(
-                (By.XPATH,
-                 "/html/body/div[1]/div[1]/div[3]/div/div[2]/div[3]/div[1]/div[2]/div/div/div[2]/div[2]/div[2]")))
-            if '%' in lp_reward.text:
-                lp_reward = float(lp_reward.text.replace('%', ''))
-            if '$' in volume_7d.text:
-                volume_24h = self.__convert_value(volume_7d.text.replace('$', '')) / 7
-            if '$' in lp_reward_fee_7d.text:
-                lp_reward_fee_24h = self.__convert_value(lp_reward_fee_7d.text.replace('$', '')) / 7
-            row = {
-                'lp_reward': lp_reward,
-                'volume_24h': volume_24h,
-                'lp_reward_fee_24h': lp_reward_fee_24h
-            }
-            return row
+            deadline = time.monotonic() + self.__timeout
+            json_requests = set()
+            while time.monotonic() < deadline:
+                for entry in driver.get_log('performance'):
+                    message = json.loads(entry['message'])['message']
+                    if message['method'] == 'Network.responseReceived' and \
+                            'json' in message['params']['response'].get('mimeType', ''):
+                        json_requests.add(message['params']['requestId'])
+                    elif message['method'] == 'Network.loadingFinished' and \
+                            message['params']['requestId'] in json_requests:
+                        body = driver.execute_cdp_cmd('Network.getResponseBody',
+                                                      {'requestId': message['params']['requestId']})
+                        row = self.__get_pool_information_from_response(json.loads(body['body']), token_address)
+                        if row is not None:
+                            return row
+                time.sleep(0.1)
+            raise TimeoutError('no daily volume of {pool} received in {timeout}s'.format(
+                pool=token_address, timeout=self.__timeout))
         except Exception as e:
             print('Error in Pool Information: {e}'.format(e=e))
             self.__log.info('Error in Pool Information: {e}'.format(e=e))
@@ -370,20 +969,46 @@ class WebScraper:
             }
             return row
 
-    def __convert_value(self, value: str) -> float:
-        # This Function Conver values to float/integar. It removes M (Million)  and K (Thousands) and add 0 Accordingly
-        # This is done for proper calculation
-        try:
-            if 'M' in value:
-                value = value.replace('M', '')
-                value = float(value) * 1000000
-            elif 'K' in value:
-                value = value.replace('K', '')
-                value = float(value) * 1000
-            return float(value)
-        except Exception as e:
-            print("Error in cleaning_data  {e}".format(e=e))
-            self.__log.info("Error in cleaning_data  {e}".format(e=e))
-            print(traceback.format_exc())
-            return 0
+    def __get_pool_information_from_response(self, response, token_address: str) -> dict:
+        # Average volume of the last complete days of the pool from the pairDayDatas of a subgraph response,
+        # None if the response has none for this pool
+        day_datas = []
+        pending = [response]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, list):
+                pending += value
+            elif isinstance(value, dict):
+                if 'dailyVolumeUSD' in value and 'date' in value:
+                    day_datas.append(value)
+                else:
+                    pending += list(value.values())
+        today = int(time.time()) // 86400 * 86400
+        day_datas = sorted([day_data for day_data in day_datas
+                            if self.__get_day_data_pair(day_data) == token_address.lower()
+                            and int(day_data['date']) < today], key=lambda day_data: int(day_data['date']))
+        if not day_datas:
+            return None
+        last_days = day_datas[-self.__days:]
+        # Averaged over the days received, a young pool or a short response has fewer than [volume] days
+        volume_24h = sum(float(day_data['dailyVolumeUSD']) for day_data in last_days) / len(last_days)
+        lp_reward_fee_24h = volume_24h * EXCHANGE_FEE / 100
+        reserve = float(last_days[-1].get('reserveUSD', 0))
+        return {
+            'lp_reward': lp_reward_fee_24h * DAYS_IN_YEAR / reserve * 100 if reserve else 0,  # LP fee APR in %
+            'volume_24h': volume_24h,
+            'lp_reward_fee_24h': lp_reward_fee_24h
+        }
 
+    @staticmethod
+    def __get_day_data_pair(day_data: dict) -> str:
+        # Lower case pair address of a PairDayData, from its pairAddress or pair field or its {pair}-{day} id
+        for field in ['pairAddress', 'pair']:
+            pair = day_data.get(field)
+            if isinstance(pair, dict):
+                pair = pair.get('id')
+            if isinstance(pair, str):
+                return pair.lower()
+        if isinstance(day_data.get('id'), str) and '-' in day_data['id']:
+            return day_data['id'].split('-')[0].lower()
+        return None
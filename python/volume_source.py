@@ -0,0 +1,83 @@
+import configparser
+import time
+from logging import Logger
+import pandas as pd
+import requests
+
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+EXCHANGE_FEE = 0.17  # Part of the volume paid to liquidity providers in %
+SECONDS_PER_DAY = 86400
+MAX_RESULTS = 1000  # Most entities a subgraph returns for one query
+
+
+class SubgraphVolumeSource:
+    # Daily volume of every pool from a PancakeSwap exchange subgraph, in place of the WebScraper
+    # The PairDayData entities are named {pair address}-{day number}, so the last days of a batch of pools are
+    # read with one GraphQL query by id. volume_24h is the average over the days of the last [volume] days complete
+    # days which have day data, the same rule as the WebScraper, and lp_reward_fee_24h is the EXCHANGE_FEE part of it.
+
+    def __init__(self, logger: Logger, debug: bool):
+        self.__debugging = debug
+        self.__log = logger
+        self.__endpoint = config.get('volume', 'endpoint')
+        self.__days = int(config.get('volume', 'days'))
+        self.__batch_size = max(1, MAX_RESULTS // self.__days)
+        self.__timeout = float(config.get('volume', 'timeout'))
+        self.__POOL_LIMIT = int(config.get('debug', 'POOL_LIMIT'))
+        self.__session = requests.Session()
+
+    def fetch_current_trading_balance_for_all_pool(self, pool_information: pd.DataFrame) -> pd.DataFrame:
+        # Same columns as WebScraper.fetch_current_trading_balance_for_all_pool, 0 for the pools the subgraph
+        # does not know
+        try:
+            pool_information['volume_24h'] = pd.Series(dtype='float')
+            pool_information['lp_reward_fee_24h'] = pd.Series(dtype='float')
+            pool_information = pool_information.fillna(0)
+            pool_addresses = [row['lpToken'] for index, row in pool_information.iterrows()
+                              if not (index > self.__POOL_LIMIT and self.__debugging)]
+            volumes = self.get_daily_volumes(pool_addresses)
+            for index, row in pool_information.iterrows():
+                volume_24h = volumes.get(row['lpToken'].lower())
+                if volume_24h is None:
+                    continue
+                pool_information['volume_24h'][index] = volume_24h
+                pool_information['lp_reward_fee_24h'][index] = volume_24h * EXCHANGE_FEE / 100
+            return pool_information
+        except Exception as e:
+            print('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
+            self.__log.info('Error in fetch_current_trading_balance_for_all_pool {e}'.format(e=e))
+
+    def get_daily_volumes(self, pool_addresses: list) -> dict:
+        # Average daily volume in USD over the days with day data by lower case pool address, so a pool younger than
+        # [volume] days is not averaged with the days before it existed. Pools without day data have 0
+        today = int(time.time()) // SECONDS_PER_DAY
+        days = list(range(today - self.__days, today))
+        volumes = {}
+        for start in range(0, len(pool_addresses), self.__batch_size):
+            batch = [pool_address.lower() for pool_address in pool_addresses[start:start + self.__batch_size]]
+            try:
+                day_counts = {}
+                for day_data in self.__query_day_data(['{pool}-{day}'.format(pool=pool_address, day=day)
+                                                       for pool_address in batch for day in days]):
+                    pool_address = day_data['id'].split('-')[0]
+                    volumes[pool_address] = volumes.get(pool_address, 0.0) + float(day_data['dailyVolumeUSD'])
+                    day_counts[pool_address] = day_counts.get(pool_address, 0) + 1
+                for pool_address in batch:
+                    volumes[pool_address] = volumes.get(pool_address, 0.0) / max(1, day_counts.get(pool_address, 0))
+            except Exception as e:
+                print('Error reading volumes from the subgraph {e}'.format(e=e))
+                self.__log.info('Error reading volumes from the subgraph {e}'.format(e=e))
+        return volumes
+
+    def __query_day_data(self, ids: list) -> list:
+        query = 'query days($ids: [ID!]) { pairDayDatas(first: %d, where: {id_in: $ids}) { id dailyVolumeUSD } }' \
+                % MAX_RESULTS
+        response = self.__session.post(self.__endpoint, json={'query': query, 'variables': {'ids': ids}},
+                                       timeout=self.__timeout)
+        response.raise_for_status()
+        body = response.json()
+        if body.get('errors'):
+            raise ValueError(body['errors'])
+        return body['data']['pairDayDatas']
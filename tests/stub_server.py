@@ -0,0 +1,43 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+
+class StubServer:
+    # Local HTTP server for the tests, every POST body is decoded from JSON, kept in requests and answered with
+    # respond(body) -> (status code, JSON body). Used as a context manager, url is known once it is started.
+
+    def __init__(self, respond: Callable[[object], tuple]):
+        self.requests = []
+        self.respond = respond
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append(body)
+                status, response = stub.respond(body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{port}'.format(port=self.__server.server_address[1])
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.__server.shutdown()
+        self.__server.server_close()
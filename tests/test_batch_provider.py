@@ -0,0 +1,126 @@
+import threading
+import time
+import unittest
+from python.batch_provider import BatchHTTPProvider
+from tests.stub_server import StubServer
+
+
+def answer_with_id(body):
+    # Each request is answered with its own id as result, the batch answers in reverse order
+    if isinstance(body, list):
+        return 200, [{'jsonrpc': '2.0', 'id': request['id'], 'result': hex(request['id'])}
+                     for request in reversed(body)]
+    return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': hex(body['id'])}
+
+
+def slow_first(respond, delay: float = 0.3):
+    # Keeps the first request in flight for delay seconds, the requests made meanwhile arrive at the same time
+    calls = []
+
+    def slow_respond(body):
+        calls.append(body)
+        if len(calls) == 1:
+            time.sleep(delay)
+        return respond(body)
+    return slow_respond
+
+
+class BatchHTTPProviderTest(unittest.TestCase):
+
+    def make_requests(self, provider: BatchHTTPProvider, count: int) -> list:
+        # One request, then count - 1 requests at the same time while it is in flight
+        responses = [None] * count
+
+        def make_request(position):
+            responses[position] = provider.make_request('eth_blockNumber', [])
+
+        threads = [threading.Thread(target=make_request, args=(position,)) for position in range(count)]
+        threads[0].start()
+        time.sleep(0.1)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        return responses
+
+    def test_lone_request_is_sent_right_away(self):
+        with StubServer(answer_with_id) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=10, flush_interval=1.0)
+            start = time.monotonic()
+            response = provider.make_request('eth_chainId', [])
+            elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(server.requests[0]['method'], 'eth_chainId')  # Not a batch array
+        self.assertEqual(response['result'], hex(response['id']))
+
+    def test_requests_made_at_the_same_time_are_sent_as_one_batch(self):
+        with StubServer(slow_first(answer_with_id)) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=10, flush_interval=0.2)
+            responses = self.make_requests(provider, 5)
+        self.assertEqual(len(server.requests), 2)
+        self.assertIsInstance(server.requests[0], dict)
+        self.assertEqual(len(server.requests[1]), 4)
+        for response in responses:
+            self.assertEqual(response['result'], hex(response['id']))
+
+    def test_batches_are_split_at_max_batch_size(self):
+        with StubServer(slow_first(answer_with_id)) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=2, flush_interval=0.2)
+            responses = self.make_requests(provider, 5)
+        self.assertEqual([len(request) for request in server.requests[1:]], [2, 2])
+        self.assertEqual(len({response['id'] for response in responses}), 5)
+
+    def test_batches_are_sent_at_the_same_time(self):
+        in_flight, most_in_flight, lock = [0], [0], threading.Lock()
+
+        def answer_slowly(body):
+            with lock:
+                in_flight[0] += 1
+                most_in_flight[0] = max(most_in_flight[0], in_flight[0])
+            time.sleep(0.3)
+            with lock:
+                in_flight[0] -= 1
+            return answer_with_id(body)
+
+        with StubServer(answer_slowly) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=2, flush_interval=0.01, max_in_flight=4)
+            start = time.monotonic()
+            self.make_requests(provider, 7)
+            elapsed = time.monotonic() - start
+        self.assertEqual(len(server.requests), 4)
+        self.assertGreater(most_in_flight[0], 1)
+        self.assertLess(elapsed, 0.1 + 4 * 0.3)
+
+    def test_request_without_response_gets_an_error(self):
+        def answer_first_only(body):
+            if isinstance(body, dict):
+                return answer_with_id(body)
+            return 200, [{'jsonrpc': '2.0', 'id': body[0]['id'], 'result': '0x1'}]
+
+        with StubServer(slow_first(answer_first_only)) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=10, flush_interval=0.2)
+            responses = self.make_requests(provider, 4)
+        self.assertEqual(sum('result' in response for response in responses), 2)
+        self.assertEqual(sum(response.get('error', {}).get('code') == -32603 for response in responses), 2)
+
+    def test_batch_error_is_given_to_every_request(self):
+        def answer_with_error(body):
+            return 200, {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'batch not supported'}}
+
+        with StubServer(slow_first(answer_with_error)) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=10, flush_interval=0.2)
+            responses = self.make_requests(provider, 4)
+        self.assertEqual(len(server.requests[1]), 3)
+        self.assertEqual(len({response['id'] for response in responses}), 4)
+        for response in responses:
+            self.assertEqual(response['error']['message'], 'batch not supported')
+
+    def test_http_error_is_raised_to_every_caller(self):
+        with StubServer(lambda body: (500, {})) as server:
+            provider = BatchHTTPProvider(server.url, max_batch_size=1, flush_interval=0.01)
+            with self.assertRaises(Exception):
+                provider.make_request('eth_blockNumber', [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import itertools
+import logging
+import os
+import tempfile
+import time
+import unittest
+import requests
+from python.cassette import REPLAY_MISS_CODE, Cassette, CassetteServer, get_cassette_node_address
+from tests.stub_server import StubServer
+
+LOGGER = logging.getLogger(__name__)
+BLOCKS = itertools.count(100)
+
+
+def answer_upstream(body):
+    # eth_blockNumber goes up by one on every call, eth_call answers with its data
+    def answer(request):
+        if request['method'] == 'eth_blockNumber':
+            return {'jsonrpc': '2.0', 'id': request['id'], 'result': hex(next(BLOCKS))}
+        return {'jsonrpc': '2.0', 'id': request['id'], 'result': request['params'][0]['data']}
+    if isinstance(body, list):
+        return 200, [answer(request) for request in body]
+    return 200, answer(body)
+
+
+def call(data: str, request_id: int) -> dict:
+    return {'jsonrpc': '2.0', 'id': request_id, 'method': 'eth_call',
+            'params': [{'to': '0x01', 'data': data}, 'latest']}
+
+
+BLOCK_NUMBER = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []}
+BATCH = [call('0xaa', 2), call('0xbb', 3)]
+
+
+class CassetteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'rpc_cassette.json.gz')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self) -> list:
+        with StubServer(answer_upstream) as upstream:
+            cassette = Cassette(LOGGER, self.path)
+            server = CassetteServer(LOGGER, cassette, 'record', upstream.url)
+            uri = server.start()
+            responses = [requests.post(uri, json=request).json() for request in (BLOCK_NUMBER, BLOCK_NUMBER, BATCH)]
+            server.stop()
+            cassette.save()
+        self.assertEqual(len(upstream.requests), 3)
+        return responses
+
+    def replay(self, latency: float = 0.0) -> str:
+        cassette = Cassette(LOGGER, self.path)
+        cassette.load()
+        server = CassetteServer(LOGGER, cassette, 'replay', latency=latency)
+        self.addCleanup(server.stop)
+        return server.start()
+
+    def test_replay_returns_the_recorded_responses(self):
+        recorded = self.record()  # The upstream is stopped from here on
+        uri = self.replay()
+        replayed = [requests.post(uri, json=request).json() for request in (BLOCK_NUMBER, BLOCK_NUMBER, BATCH)]
+        self.assertEqual(replayed, recorded)
+        self.assertNotEqual(replayed[0]['result'], replayed[1]['result'])  # Answers of a request in order
+        self.assertEqual(requests.post(uri, json=BLOCK_NUMBER).json(), recorded[1])  # Then the last one again
+
+    def test_replay_applies_the_latency(self):
+        self.record()
+        uri = self.replay(latency=0.2)
+        start = time.monotonic()
+        requests.post(uri, json=BLOCK_NUMBER)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_unrecorded_request_fails(self):
+        self.record()
+        response = requests.post(self.replay(), json=call('0xcc', 4)).json()
+        self.assertEqual(response['id'], 4)
+        self.assertEqual(response['error']['code'], REPLAY_MISS_CODE)
+        self.assertNotIn('result', response)
+
+    def test_node_address_is_shared_by_the_clients_of_a_process(self):
+        self.record()
+        uri = get_cassette_node_address(LOGGER, 'replay', self.path, None, 0.0)
+        self.assertEqual(get_cassette_node_address(LOGGER, 'replay', self.path, None, 0.0), uri)
+        self.assertEqual(requests.post(uri, json=call('0xaa', 5)).json()['result'], '0xaa')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import logging
+import os
+import tempfile
+import threading
+import unittest
+import pandas as pd
+from eth_abi import encode_abi
+from web3 import Web3
+from python import utils
+from python.metadata_cache import MetadataCache
+from python.pool_registry import PoolRegistry
+from python.utils import PancakeSwapBlockchain
+from tests.stub_server import StubServer
+
+LOGGER = logging.getLogger(__name__)
+TOKENS = [Web3.toChecksumAddress('0x' + '1' * 39 + str(n)) for n in range(3)]
+POOLS = [Web3.toChecksumAddress('0x' + 'a' * 39 + str(n)) for n in range(3)]
+SELECTORS = {'0x0902f1ac': 'getReserves', '0x18160ddd': 'totalSupply', '0x70a08231': 'balanceOf',
+             '0x313ce567': 'decimals', '0x95d89b41': 'symbol'}
+CONFIG = {('rpc', 'batch_requests'): 'False', ('rate_limit', 'enabled'): 'False', ('reserves', 'enabled'): 'False',
+          ('multicall', 'enabled'): 'False', ('lens', 'enabled'): 'False', ('volume', 'source'): 'web',
+          ('cassette', 'mode'): 'off'}
+
+
+class StubNode:
+    # Every pool has 1000 USDT and 10 of its token, so 2000 USD of TVL and 1000 in the MasterChef.
+    # totalSupply of the second pool is throttled the first time, the one of the third pool always fails.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_supply_calls = {}
+
+    def __call__(self, body):
+        if body['method'] == 'eth_chainId':
+            return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': '0x38'}
+        transaction = body['params'][0]
+        address, function = transaction['to'].lower(), SELECTORS.get(transaction['data'][:10])
+        if function == 'totalSupply':
+            with self.lock:
+                calls = self.total_supply_calls[address] = self.total_supply_calls.get(address, 0) + 1
+            if address == POOLS[2].lower() or (address == POOLS[1].lower() and calls == 1):
+                return 429, {}
+        if address in [pool.lower() for pool in POOLS] and function == 'getReserves':
+            result = encode_abi(['uint112', 'uint112', 'uint32'], [1000 * 10 ** 18, 10 * 10 ** 18, 0])
+        elif function in ('totalSupply', 'balanceOf'):
+            result = encode_abi(['uint256'], [(1000 if function == 'totalSupply' else 500) * 10 ** 18])
+        elif function == 'decimals':
+            result = encode_abi(['uint8'], [18])
+        elif function == 'symbol':
+            result = encode_abi(['string'], ['T'])
+        else:  # Hub pairs which were never deployed
+            return 200, {'jsonrpc': '2.0', 'id': body['id'], 'error': {'code': -32000, 'message': 'execution reverted'}}
+        return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': '0x' + result.hex()}
+
+
+class LiquidityBalanceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.saved_config = {key: utils.config.get(*key) for key in CONFIG}
+        self.saved_node_address = utils.config.get('settings', 'node_address')
+        for (section, key), value in CONFIG.items():
+            utils.config.set(section, key, value)
+
+    def tearDown(self):
+        for (section, key), value in self.saved_config.items():
+            utils.config.set(section, key, value)
+        self.directory.cleanup()
+
+    def test_failed_pools_are_read_again_and_reported(self):
+        usdt = utils.config.get('settings', 'usdt_address')
+        pool_information = pd.DataFrame({'lpToken': POOLS, 'token0': [usdt] * 3, 'token1': TOKENS})
+        path = os.path.join(self.directory.name, 'metadata.sqlite')
+        node = StubNode()
+        with StubServer(node) as server:
+            utils.config.set('settings', 'node_address', server.url)
+            try:
+                blockchain = PancakeSwapBlockchain(LOGGER, False, MetadataCache(LOGGER, path),
+                                                   PoolRegistry(LOGGER, path))
+                blockchain.pin_block(100)
+                with self.assertLogs(LOGGER, level='INFO') as logs:
+                    pool_information = blockchain.calculate_current_liquidity_balance(pool_information)
+            finally:
+                utils.config.set('settings', 'node_address', self.saved_node_address)
+        for TVL, Farm_Liquidity, expected_TVL, expected_Farm_Liquidity in zip(
+                pool_information['TVL'], pool_information['Farm_Liquidity'], [2000, 2000, 0], [1000, 1000, 0]):
+            self.assertAlmostEqual(TVL, expected_TVL)
+            self.assertAlmostEqual(Farm_Liquidity, expected_Farm_Liquidity)
+        self.assertEqual(node.total_supply_calls[POOLS[1].lower()], 2)  # Throttled, then read again
+        self.assertIn('TVL and Farm_Liquidity could not be calculated for pools [2]', '\n'.join(logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import logging
+import unittest
+import requests
+from web3 import HTTPProvider
+from python.rate_limiter import AdaptiveRateLimiter
+from tests.stub_server import StubServer
+
+
+def throttle_first(count: int, status: int = 429, error: dict = None):
+    # Throttles the first count requests with status, or with a JSON-RPC error in a 200 response, then answers
+    answered = []
+
+    def respond(body):
+        answered.append(body)
+        if len(answered) <= count:
+            if error is not None:
+                return 200, {'jsonrpc': '2.0', 'id': body['id'], 'error': error}
+            return status, {}
+        return 200, {'jsonrpc': '2.0', 'id': body['id'], 'result': '0x10'}
+    return respond
+
+
+class AdaptiveRateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = AdaptiveRateLimiter(logging.getLogger(__name__), initial_limit=8, min_limit=1, max_limit=16,
+                                           backoff_factor=0.5, latency_tolerance=10.0, retries=3,
+                                           retry_base_delay=0.01, retry_max_delay=0.05)
+
+    def make_request(self, url: str, method: str):
+        return self.limiter.middleware(HTTPProvider(url).make_request, None)(method, [])
+
+    def test_throttled_read_is_retried(self):
+        with StubServer(throttle_first(2)) as server:
+            response = self.make_request(server.url, 'eth_blockNumber')
+        self.assertEqual(response['result'], '0x10')
+        self.assertEqual(len(server.requests), 3)
+        self.assertLess(self.limiter.get_limit(), 8)
+
+    def test_throttled_rpc_error_is_retried(self):
+        with StubServer(throttle_first(1, error={'code': -32005, 'message': 'limit exceeded'})) as server:
+            response = self.make_request(server.url, 'eth_call')
+        self.assertEqual(response['result'], '0x10')
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(self.limiter.get_limit(), 4)
+
+    def test_retries_stop_after_the_last_attempt(self):
+        with StubServer(throttle_first(10)) as server:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.make_request(server.url, 'eth_blockNumber')
+        self.assertEqual(len(server.requests), 4)  # The first attempt and 3 retries
+
+    def test_write_is_not_retried(self):
+        with StubServer(throttle_first(1)) as server:
+            with self.assertRaises(requests.exceptions.HTTPError):
+                self.make_request(server.url, 'eth_sendRawTransaction')
+        self.assertEqual(len(server.requests), 1)
+
+    def test_log_range_error_is_not_retried(self):
+        error = {'code': -32005, 'message': 'query returned more than 10000 results'}
+        with StubServer(throttle_first(1, error=error)) as server:
+            response = self.make_request(server.url, 'eth_getLogs')
+        self.assertEqual(response['error'], error)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(self.limiter.get_limit(), 8)
+
+    def test_answered_requests_raise_the_limit(self):
+        with StubServer(throttle_first(0)) as server:
+            for _ in range(12):
+                self.make_request(server.url, 'eth_blockNumber')
+        self.assertGreater(self.limiter.get_limit(), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
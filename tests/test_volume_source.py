@@ -0,0 +1,71 @@
+import logging
+import time
+import unittest
+import pandas as pd
+from python import volume_source
+from python.volume_source import SECONDS_PER_DAY, SubgraphVolumeSource
+from tests.stub_server import StubServer
+
+POOL = '0x0eD7e52944161450477ee417DE9Cd3a859b14fD0'
+OTHER_POOL = '0xA527a61703D82139F8a06Bc30097cC9CAA2df5A6'
+DAILY_VOLUMES = {POOL.lower(): [700.0, 1400.0, 2100.0]}  # Only 3 of the 7 days have day data
+
+
+def answer_day_data(body):
+    # pairDayDatas of the asked ids which have a volume, the subgraph leaves out the unknown ids
+    day_datas = []
+    for pair_day_id in body['variables']['ids']:
+        pool_address, day = pair_day_id.split('-')
+        volumes = DAILY_VOLUMES.get(pool_address, [])
+        position = int(time.time()) // SECONDS_PER_DAY - int(day) - 1
+        if position < len(volumes):
+            day_datas.append({'id': pair_day_id, 'dailyVolumeUSD': str(volumes[position])})
+    return 200, {'data': {'pairDayDatas': day_datas}}
+
+
+class SubgraphVolumeSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        for section, key, value in (('volume', 'days', '7'), ('volume', 'timeout', '5'),
+                                    ('debug', 'POOL_LIMIT', '1000')):
+            if not volume_source.config.has_section(section):
+                volume_source.config.add_section(section)
+            volume_source.config.set(section, key, value)
+
+    def make_source(self, url: str) -> SubgraphVolumeSource:
+        volume_source.config.set('volume', 'endpoint', url)
+        return SubgraphVolumeSource(logging.getLogger(__name__), False)
+
+    def test_daily_volume_is_the_average_over_the_days(self):
+        with StubServer(answer_day_data) as server:
+            volumes = self.make_source(server.url).get_daily_volumes([POOL, OTHER_POOL])
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(len(server.requests[0]['variables']['ids']), 14)
+        self.assertAlmostEqual(volumes[POOL.lower()], 4200.0 / 3)  # Over the days with day data
+        self.assertEqual(volumes[OTHER_POOL.lower()], 0.0)
+
+    def test_pools_are_queried_in_batches(self):
+        pools = ['0x{n:040x}'.format(n=n) for n in range(300)]
+        with StubServer(answer_day_data) as server:
+            volumes = self.make_source(server.url).get_daily_volumes(pools)
+        self.assertEqual(len(server.requests), 3)  # 1000 results // 7 days = 142 pools per query
+        self.assertTrue(all(len(request['variables']['ids']) <= 1000 for request in server.requests))
+        self.assertEqual(len(volumes), 300)
+
+    def test_graphql_errors_leave_the_batch_out(self):
+        with StubServer(lambda body: (200, {'errors': [{'message': 'indexing error'}]})) as server:
+            volumes = self.make_source(server.url).get_daily_volumes([POOL])
+        self.assertEqual(volumes, {})
+
+    def test_trading_balance_columns(self):
+        pool_information = pd.DataFrame({'lpToken': [POOL, OTHER_POOL]})
+        with StubServer(answer_day_data) as server:
+            pool_information = self.make_source(server.url).fetch_current_trading_balance_for_all_pool(
+                pool_information)
+        self.assertAlmostEqual(pool_information['volume_24h'][0], 1400.0)
+        self.assertAlmostEqual(pool_information['lp_reward_fee_24h'][0], 1400.0 * volume_source.EXCHANGE_FEE / 100)
+        self.assertEqual(pool_information['volume_24h'][1], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()